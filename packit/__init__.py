@@ -1,7 +1,18 @@
-from pkg_resources import get_distribution, DistributionNotFound
+try:
+    from importlib.metadata import version, PackageNotFoundError
+except ImportError:
+    # python < 3.8, pkg_resources is much slower to import
+    from pkg_resources import (  # type: ignore
+        get_distribution,
+        DistributionNotFound as PackageNotFoundError,
+    )
+
+    def version(distribution_name):  # type: ignore
+        return get_distribution(distribution_name).version
+
 
 try:
-    __version__ = get_distribution(__name__).version
-except DistributionNotFound:
+    __version__ = version(__name__)
+except PackageNotFoundError:
     # package is not installed
     pass
@@ -3,15 +3,21 @@ This is the official python interface for packit.
 """
 
 import logging
+import os
+import shutil
+import tempfile
+import threading
+from functools import partial
 from pathlib import Path
-from typing import Sequence
+from typing import Callable, Dict, List, Sequence, Tuple
 
 from packit.config import Config, PackageConfig
 from packit.distgit import DistGit
 from packit.exceptions import PackitException
 from packit.status import Status
 from packit.upstream import Upstream
-from packit.utils import assert_existence
+from packit.tracing import span
+from packit.utils import assert_existence, run_in_parallel
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +29,7 @@ class PackitAPI:
 
         self._up = None
         self._dg = None
+        self._upstream_branch_to_restore = None
 
     @property
     def up(self):
@@ -36,28 +43,31 @@ class PackitAPI:
             self._dg = DistGit(config=self.config, package_config=self.package_config)
         return self._dg
 
+    @span("sync_pr")
     def sync_pr(self, pr_id, dist_git_branch: str, upstream_version: str = None):
-        self.package_config.run_action(action_name="pre-sync")
-
-        self.up.checkout_pr(pr_id=pr_id)
-        local_pr_branch = f"pull-request-{pr_id}-sync"
-        # fetch and reset --hard upstream/$branch?
-        self.dg.create_branch(
-            dist_git_branch,
-            base=f"remotes/origin/{dist_git_branch}",
-            setup_tracking=True,
+        def prepare_upstream():
+            with span("clone", repo="upstream"):
+                assert_existence(self.up.local_project)
+            self.package_config.run_action(action_name="pre-sync")
+            with span("checkout", pr_id=pr_id):
+                self.up.checkout_pr(pr_id=pr_id)
+
+        # the repositories are independent until we sync the files
+        run_in_parallel(
+            prepare_upstream, lambda: self._prepare_dist_git(dist_git_branch)
         )
-        self.dg.update_branch(dist_git_branch)
-        self.dg.checkout_branch(dist_git_branch)
 
+        local_pr_branch = f"pull-request-{pr_id}-sync"
         self.dg.create_branch(local_pr_branch)
         self.dg.checkout_branch(local_pr_branch)
 
         if self.package_config.with_action(action_name="patch"):
-            patches = self.up.create_patches(
-                upstream=upstream_version, destination=self.dg.local_project.working_dir
-            )
-            self.dg.add_patches_to_specfile(patches)
+            with span("create_patches"):
+                patches = self.up.create_patches(
+                    upstream=upstream_version,
+                    destination=self.dg.local_project.working_dir,
+                )
+                self.dg.add_patches_to_specfile(patches)
 
         description = (
             f"Upstream pr: {pr_id}\n"
@@ -66,15 +76,18 @@ class PackitAPI:
 
         self._handle_sources(add_new_sources=True, force_new_sources=False)
 
-        self.dg.sync_files(upstream_project=self.up.local_project)
-        self.dg.commit(title=f"Sync upstream pr: {pr_id}", msg=description)
+        with span("sync_files"):
+            self.dg.sync_files(upstream_project=self.up.local_project)
+        with span("commit"):
+            self.dg.commit(title=f"Sync upstream pr: {pr_id}", msg=description)
 
         self.push_and_create_pr(
             pr_title=f"Upstream pr: {pr_id}",
             pr_description=description,
-            dist_git_branch="master",
+            dist_git_branch=dist_git_branch,
         )
 
+    @span("sync_release")
     def sync_release(
         self,
         dist_git_branch: str,
@@ -86,38 +99,15 @@ class PackitAPI:
         """
         Update given package in Fedora
         """
-        assert_existence(self.up.local_project)
-        assert_existence(self.dg.local_project)
-
-        self.package_config.run_action(action_name="pre-sync")
-
-        full_version = version or self.up.get_version()
-        if not full_version:
-            raise PackitException(
-                "Could not figure out version of latest upstream release."
-            )
-        current_up_branch = self.up.active_branch
+        logger.info(f"Using {dist_git_branch!r} dist-git branch")
         try:
-            # TODO: this is problematic, since we may overwrite stuff in the repo
-            #       but the thing is that we need to do it
-            #       I feel like the ideal thing to do would be to clone the repo and work in tmpdir
-            # TODO: this is also naive, upstream may use different tagging scheme, e.g.
-            #       release = 232, tag = v232
-            if not use_local_content:
-                self.up.checkout_release(full_version)
-
-            local_pr_branch = f"{full_version}-{dist_git_branch}-update"
-            # fetch and reset --hard upstream/$branch?
-            logger.info(f"Using {dist_git_branch!r} dist-git branch")
-
-            self.dg.create_branch(
-                dist_git_branch,
-                base=f"remotes/origin/{dist_git_branch}",
-                setup_tracking=True,
+            # the repositories are independent until we sync the files
+            full_version, _ = run_in_parallel(
+                lambda: self._prepare_upstream_release(version, use_local_content),
+                lambda: self._prepare_dist_git(dist_git_branch),
             )
-            self.dg.update_branch(dist_git_branch)
-            self.dg.checkout_branch(dist_git_branch)
 
+            local_pr_branch = f"{full_version}-{dist_git_branch}-update"
             self.dg.create_branch(local_pr_branch)
             self.dg.checkout_branch(local_pr_branch)
 
@@ -127,23 +117,29 @@ class PackitAPI:
             )
 
             if self.package_config.with_action(action_name="prepare-files"):
-                self.dg.sync_files(self.up.local_project)
+                with span("sync_files"):
+                    self.dg.sync_files(self.up.local_project)
                 if upstream_ref:
                     if self.package_config.with_action(action_name="patch"):
-                        patches = self.up.create_patches(
-                            upstream=upstream_ref,
-                            destination=self.dg.local_project.working_dir,
-                        )
-                        self.dg.add_patches_to_specfile(patches)
+                        with span("create_patches"):
+                            patches = self.up.create_patches(
+                                upstream=upstream_ref,
+                                destination=self.dg.local_project.working_dir,
+                            )
+                            self.dg.add_patches_to_specfile(patches)
 
                 self._handle_sources(
                     add_new_sources=True, force_new_sources=force_new_sources
                 )
 
             if self.package_config.has_action("prepare-files"):
-                self.dg.sync_files(self.up.local_project)
+                with span("sync_files"):
+                    self.dg.sync_files(self.up.local_project)
 
-            self.dg.commit(title=f"{full_version} upstream release", msg=description)
+            with span("commit"):
+                self.dg.commit(
+                    title=f"{full_version} upstream release", msg=description
+                )
 
             self.push_and_create_pr(
                 pr_title=f"Update to upstream release {full_version}",
@@ -151,11 +147,115 @@ class PackitAPI:
                 dist_git_branch=dist_git_branch,
             )
         finally:
-            if not use_local_content:
-                self.up.local_project.git_repo.git.checkout(
-                    current_up_branch.checkout()
+            self._restore_upstream_branch()
+
+    @span("sync_release_to_branches")
+    def sync_release_to_branches(
+        self,
+        dist_git_branches: Sequence[str],
+        use_local_content=False,
+        version: str = None,
+        force_new_sources=False,
+        upstream_ref: str = None,
+    ):
+        """
+        Update given package in several dist-git branches at once
+
+        The upstream checkout, the patches and the upstream archive are shared,
+        every branch is updated in its own worktree of the dist-git repo in parallel.
+        """
+        kwargs = dict(
+            use_local_content=use_local_content,
+            version=version,
+            force_new_sources=force_new_sources,
+            upstream_ref=upstream_ref,
+        )
+        custom_actions = [
+            action
+            for action in ("prepare-files", "patch", "sync-up-to-down")
+            if self.package_config.has_action(action)
+        ]
+        if len(dist_git_branches) == 1 or custom_actions:
+            if len(dist_git_branches) > 1:
+                logger.info(
+                    f"Custom actions {custom_actions} work in the dist-git checkout, "
+                    "updating the branches one by one."
+                )
+            for dist_git_branch in dist_git_branches:
+                self.sync_release(dist_git_branch, **kwargs)
+            return
+
+        logger.info(f"Using dist-git branches {', '.join(dist_git_branches)}")
+        try:
+            full_version, _ = run_in_parallel(
+                lambda: self._prepare_upstream_release(version, use_local_content),
+                self._fetch_dist_git,
+            )
+            description = (
+                f"Upstream tag: {full_version}\n"
+                f"Upstream commit: {self.up.local_project.git_repo.head.commit}\n"
+            )
+
+            with tempfile.TemporaryDirectory() as shared_dir:
+                patches: List[Tuple[str, str]] = []
+                if upstream_ref:
+                    with span("create_patches"):
+                        patches = self.up.create_patches(
+                            upstream=upstream_ref, destination=shared_dir
+                        )
+
+                archives: Dict[str, str] = {}
+                archive_lock = threading.Lock()
+
+                def get_archive(dg: DistGit) -> str:
+                    # all the branches need the same archive, download it only once
+                    with archive_lock:
+                        name = dg.upstream_archive_name
+                        if name not in archives:
+                            archive = dg.download_upstream_archive()
+                            archives[name] = shutil.move(archive, shared_dir)
+                        return archives[name]
+
+                def sync_branch(dist_git_branch: str) -> None:
+                    local_pr_branch = f"{full_version}-{dist_git_branch}-update"
+                    with span("sync_branch", branch=dist_git_branch), self.dg.worktree(
+                        local_pr_branch, base=f"origin/{dist_git_branch}"
+                    ) as dg:
+                        with span("sync_files"):
+                            dg.sync_files(self.up.local_project)
+                        for patch, _ in patches:
+                            shutil.copy2(
+                                os.path.join(shared_dir, patch),
+                                dg.local_project.working_dir,
+                            )
+                        dg.add_patches_to_specfile(patches)
+
+                        self._handle_sources(
+                            add_new_sources=True,
+                            force_new_sources=force_new_sources,
+                            dg=dg,
+                            download_archive=get_archive,
+                        )
+
+                        with span("commit"):
+                            dg.commit(
+                                title=f"{full_version} upstream release",
+                                msg=description,
+                            )
+                        self.push_and_create_pr(
+                            pr_title=f"Update to upstream release {full_version}",
+                            pr_description=description,
+                            dist_git_branch=dist_git_branch,
+                            dg=dg,
+                        )
+
+                run_in_parallel(
+                    *(partial(sync_branch, branch) for branch in dist_git_branches)
                 )
+        finally:
+            self._restore_upstream_branch()
 
+    @span("sync_from_downstream")
     def sync_from_downstream(
         self,
         dist_git_branch: str,
@@ -173,10 +273,13 @@ class PackitAPI:
         :param fork: forks the project if set to True
         :param remote_name: name of remote where we should push; if None, try to find a ssh_url
         """
-        logger.info(f"upstream active branch {self.up.active_branch}")
+        with span("clone"):
+            logger.info(f"upstream active branch {self.up.active_branch}")
+            assert_existence(self.dg.local_project)
 
-        self.dg.update_branch(dist_git_branch)
-        self.dg.checkout_branch(dist_git_branch)
+        with span("fetch", branch=dist_git_branch):
+            self.dg.update_branch(dist_git_branch)
+            self.dg.checkout_branch(dist_git_branch)
 
         local_pr_branch = f"{dist_git_branch}-downstream-sync"
         logger.info(f'using "{dist_git_branch}" dist-git branch')
@@ -184,7 +287,8 @@ class PackitAPI:
         self.up.create_branch(local_pr_branch)
         self.up.checkout_branch(local_pr_branch)
 
-        self.up.sync_files(self.dg.local_project)
+        with span("sync_files"):
+            self.up.sync_files(self.dg.local_project)
 
         if not no_pr:
             description = (
@@ -194,51 +298,139 @@ class PackitAPI:
             commit_msg = f"sync from downstream branch {dist_git_branch!r}"
             pr_title = f"Update from downstream branch {dist_git_branch!r}"
 
-            self.up.commit(title=commit_msg, msg=description)
+            with span("commit"):
+                self.up.commit(title=commit_msg, msg=description)
+
+            with span("push"):
+                # the branch may already be up, let's push forcefully
+                source_branch = self.up.push(
+                    self.up.local_project.ref,
+                    fork=fork,
+                    force=True,
+                    remote_name=remote_name,
+                )
+            with span("create_pull"):
+                self.up.create_pull(
+                    pr_title,
+                    description,
+                    source_branch=source_branch,
+                    target_branch=upstream_branch,
+                )
 
+    def push_and_create_pr(
+        self,
+        pr_title: str,
+        pr_description: str,
+        dist_git_branch: str,
+        dg: DistGit = None,
+    ):
+        """
+        :param dg: dist-git (worktree) to push from, defaults to self.dg
+        """
+        dg = dg or self.dg
+        with span("push"):
             # the branch may already be up, let's push forcefully
-            source_branch = self.up.push(
-                self.up.local_project.ref,
-                fork=fork,
-                force=True,
-                remote_name=remote_name,
-            )
-            self.up.create_pull(
+            dg.push_to_fork(dg.local_project.ref, force=True)
+        with span("create_pull"):
+            dg.create_pull(
                 pr_title,
-                description,
-                source_branch=source_branch,
-                target_branch=upstream_branch,
+                pr_description,
+                source_branch=str(dg.local_project.ref),
+                target_branch=dist_git_branch,
             )
 
-    def push_and_create_pr(
-        self, pr_title: str, pr_description: str, dist_git_branch: str
-    ):
-        # the branch may already be up, let's push forcefully
-        self.dg.push_to_fork(self.dg.local_project.ref, force=True)
-        self.dg.create_pull(
-            pr_title,
-            pr_description,
-            source_branch=str(self.dg.local_project.ref),
-            target_branch=dist_git_branch,
-        )
+    def _prepare_upstream_release(self, version: str, use_local_content: bool) -> str:
+        """
+        clone upstream and check out the release
+
+        :return: the version of the release
+        """
+        with span("clone", repo="upstream"):
+            assert_existence(self.up.local_project)
 
-    def _handle_sources(self, add_new_sources, force_new_sources):
+        self.package_config.run_action(action_name="pre-sync")
+
+        with span("get_version"):
+            full_version = version or self.up.get_version()
+        if not full_version:
+            raise PackitException(
+                "Could not figure out version of latest upstream release."
+            )
+        # TODO: this is problematic, since we may overwrite stuff in the repo
+        #       but the thing is that we need to do it
+        #       I feel like the ideal thing to do would be to clone the repo and work in tmpdir
+        # TODO: this is also naive, upstream may use different tagging scheme, e.g.
+        #       release = 232, tag = v232
+        if not use_local_content:
+            # go back to it once we are done, see _restore_upstream_branch
+            self._upstream_branch_to_restore = self.up.active_branch
+            with span("checkout", version=full_version):
+                self.up.checkout_release(full_version)
+        return full_version
+
+    def _restore_upstream_branch(self) -> None:
+        if self._upstream_branch_to_restore is not None:
+            self.up.local_project.git_repo.git.checkout(
+                self._upstream_branch_to_restore.checkout()
+            )
+            self._upstream_branch_to_restore = None
+
+    def _prepare_dist_git(self, dist_git_branch: str) -> None:
+        """ clone dist-git and check out the up to date dist-git branch """
+        with span("clone", repo="dist-git"):
+            assert_existence(self.dg.local_project)
+        self._checkout_dist_git_branch(dist_git_branch)
+
+    def _fetch_dist_git(self) -> None:
+        """ clone dist-git and fetch all its branches """
+        with span("clone", repo="dist-git"):
+            assert_existence(self.dg.local_project)
+        with span("fetch"):
+            self.dg.fetch()
+
+    def _checkout_dist_git_branch(self, dist_git_branch: str) -> None:
+        """ fetch the dist-git branch and check it out """
+        with span("fetch", branch=dist_git_branch):
+            self.dg.create_branch(
+                dist_git_branch,
+                base=f"remotes/origin/{dist_git_branch}",
+                setup_tracking=True,
+            )
+            self.dg.update_branch(dist_git_branch)
+            self.dg.checkout_branch(dist_git_branch)
+
+    @span("handle_sources")
+    def _handle_sources(
+        self,
+        add_new_sources,
+        force_new_sources,
+        dg: DistGit = None,
+        download_archive: Callable[[DistGit], str] = None,
+    ):
+        """
+        :param dg: dist-git (worktree) to work in, defaults to self.dg
+        :param download_archive: returns path to the upstream archive,
+                                 defaults to downloading it in the dist-git repo
+        """
+        dg = dg or self.dg
+        download_archive = download_archive or DistGit.download_upstream_archive
         if add_new_sources or force_new_sources:
             make_new_sources = False
             # btw this is really naive: the name could be the same but the hash can be different
             # TODO: we should do something when such situation happens
-            if force_new_sources or not self.dg.is_archive_in_lookaside_cache(
-                self.dg.upstream_archive_name
+            if force_new_sources or not dg.is_archive_in_lookaside_cache(
+                dg.upstream_archive_name
             ):
                 make_new_sources = True
             else:
-                sources_file = Path(self.dg.local_project.working_dir) / "sources"
-                if self.dg.upstream_archive_name not in sources_file.read_text():
+                sources_file = Path(dg.local_project.working_dir) / "sources"
+                if dg.upstream_archive_name not in sources_file.read_text():
                     make_new_sources = True
             if make_new_sources:
-                archive = self.dg.download_upstream_archive()
-                self.dg.upload_to_lookaside_cache(archive)
+                archive = download_archive(dg)
+                dg.upload_to_lookaside_cache(archive)
 
+    @span("build")
     def build(self, dist_git_branch: str, scratch: bool = False):
         """
         Build component in koji
@@ -247,15 +439,10 @@ class PackitAPI:
         :param scratch: should the build be a scratch build?
         """
         logger.info(f"Using {dist_git_branch!r} dist-git branch")
-        self.dg.create_branch(
-            dist_git_branch,
-            base=f"remotes/origin/{dist_git_branch}",
-            setup_tracking=True,
-        )
-        self.dg.update_branch(dist_git_branch)
-        self.dg.checkout_branch(dist_git_branch)
+        self._checkout_dist_git_branch(dist_git_branch)
 
-        self.dg.build(scratch=scratch)
+        with span("koji_build", scratch=scratch):
+            self.dg.build(scratch=scratch)
 
     def create_update(
         self,
@@ -285,6 +472,7 @@ class PackitAPI:
             update_type=update_type,
         )
 
+    @span("create_srpm")
     def create_srpm(self, output_file: str = None) -> Path:
         """
         Create srpm from the upstream repo
@@ -292,19 +480,23 @@ class PackitAPI:
         :param output_file: path + filename where the srpm should be written, defaults to cwd
         :return: a path to the srpm
         """
-        version = self.up.get_current_version()
-        spec_version = self.up.get_specfile_version()
-        self.up.create_archive()
+        with span("get_version"):
+            version = self.up.get_current_version()
+            spec_version = self.up.get_specfile_version()
+        with span("create_archive"):
+            self.up.create_archive()
         if version != spec_version:
-            try:
-                self.up.set_spec_version(
-                    version=version, changelog_entry="- Development snapshot"
-                )
-            except PackitException:
-                self.up.bump_spec(
-                    version=version, changelog_entry="Development snapshot"
-                )
-        srpm_path = self.up.create_srpm(srpm_path=output_file)
+            with span("set_spec_version", version=version):
+                try:
+                    self.up.set_spec_version(
+                        version=version, changelog_entry="- Development snapshot"
+                    )
+                except PackitException:
+                    self.up.bump_spec(
+                        version=version, changelog_entry="Development snapshot"
+                    )
+        with span("rpmbuild"):
+            srpm_path = self.up.create_srpm(srpm_path=output_file)
         return srpm_path
 
     def status(self):
@@ -6,32 +6,133 @@ This API is built on top of the packit.api.
 """
 import logging
 from functools import lru_cache
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Sequence
 
 from ogr.services.github import GithubService
 from ogr.services.pagure import PagureService
 from packit.api import PackitAPI
-from packit.config import Config, PackageConfig, get_packit_config_from_repo
+from packit.config import (
+    Config,
+    PackageConfig,
+    TriggerType,
+    get_packit_config_from_repo,
+)
+from packit.constants import (
+    GH2FED_RELEASE_TOPIC,
+    GH2FED_PR_TOPIC_PREFIX,
+    DG_PR_FLAG_TOPIC,
+)
+from packit.dispatcher import Dispatcher
+from packit.exceptions import PackitException
 from packit.fed_mes_consume import Consumerino
+from packit.github_tokens import get_github_token
+from packit.journal import EventJournal
+from packit.recording import EventRecorder
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_DIST_GIT_BRANCH = "master"
+
+
+def get_dist_git_branches(
+    package_config: PackageConfig, trigger: TriggerType
+) -> List[str]:
+    """
+    dist-git branches the jobs for the trigger release to, master if there is no such job
+    """
+    branches: List[str] = []
+    for job in package_config.jobs:
+        if job.trigger == trigger:
+            branches += [b for b in job.release_to if b not in branches]
+    return branches or [DEFAULT_DIST_GIT_BRANCH]
+
 
 class PackitBotAPI:
     def __init__(self, config: Config) -> None:
         self.config = config
-        self.consumerino = Consumerino()
+        self.consumerino = Consumerino(cache_dir=config.cache_dir)
 
-    @property  # type: ignore
-    @lru_cache()
+    @property
     def _github_service(self):
-        return GithubService(token=self.config.github_token)
+        # not memoized: installation tokens expire, get_github_token caches them
+        return GithubService(token=get_github_token(self.config))
 
     @property  # type: ignore
     @lru_cache()
     def _pagure_service(self):
         return PagureService(token=self.config.pagure_user_token)
 
+    def get_dispatcher(
+        self,
+        events: Sequence[str],
+        workers: int = 4,
+        journal: EventJournal = None,
+        recorder: EventRecorder = None,
+    ) -> Dispatcher:
+        """
+        Create a dispatcher with routes for the selected events
+
+        :param events: list of events to process: release, pull-request, fedora-ci
+        :param workers: number of messages processed in parallel
+        :param journal: journal to record the received events in
+        :param recorder: recorder to capture the received events for a later replay
+        :return: instance of Dispatcher
+        """
+        routes = {
+            "release": (GH2FED_RELEASE_TOPIC, self._handle_release_message),
+            "pull-request": (GH2FED_PR_TOPIC_PREFIX, self._handle_pr_message),
+            "fedora-ci": (DG_PR_FLAG_TOPIC, self._handle_dg_flag_message),
+        }
+        dispatcher = Dispatcher(workers=workers, journal=journal, recorder=recorder)
+        for event in events:
+            try:
+                topic, handler = routes[event]
+            except KeyError:
+                raise PackitException(f"Unknown event to watch: {event}")
+            dispatcher.register(topic, handler)
+        return dispatcher
+
+    def watch(
+        self,
+        events: Sequence[str],
+        workers: int = 4,
+        journal_path: str = None,
+        recording_path: str = None,
+    ):
+        """
+        Listen on fedmsg for all the selected events using a single subscription
+        and process them in a shared pool of workers.
+
+        :param events: list of events to process: release, pull-request, fedora-ci
+        :param workers: number of messages processed in parallel
+        :param journal_path: path to the event journal: events not processed
+                             during the previous run are processed first
+        :param recording_path: append the received events to this file
+        """
+        journal = EventJournal(journal_path) if journal_path else None
+        recorder = EventRecorder(recording_path) if recording_path else None
+        dispatcher = self.get_dispatcher(
+            events=events, workers=workers, journal=journal, recorder=recorder
+        )
+        try:
+            dispatcher.replay()
+            dispatcher.consume(self.consumerino.iterate_topics(dispatcher.topics))
+        finally:
+            dispatcher.shutdown()
+            if journal:
+                journal.close()
+
+    def _handle_release_message(self, topic: str, msg: dict):
+        self.sync_upstream_release_with_fedmsg(fedmsg=msg)
+
+    def _handle_pr_message(self, topic: str, msg: dict):
+        action = topic.rsplit(".", 1)[1]
+        if action in ["opened", "synchronize", "reopened"]:
+            self.sync_upstream_pull_request_with_fedmsg(fedmsg=msg)
+
+    def _handle_dg_flag_message(self, topic: str, msg: dict):
+        self.sync_fedora_ci_with_fedmsg(fedmsg=msg)
+
     def watch_upstream_pull_request(self):
         for topic, action, msg in self.consumerino.iterate_pull_requests():
             if action in ["opened", "synchronize", "reopened"]:
@@ -40,15 +141,16 @@ class PackitBotAPI:
     def sync_upstream_pull_request_with_fedmsg(self, fedmsg: Dict):
         repo_name = fedmsg["msg"]["pull_request"]["head"]["repo"]["name"]
         namespace = fedmsg["msg"]["pull_request"]["head"]["repo"]["owner"]["login"]
-        ref = fedmsg["msg"]["pull_request"]["head"]["ref"]
+        # the config lookup on a commit can be cached, unlike on the branch
+        commit_sha = fedmsg["msg"]["pull_request"]["head"]["sha"]
         pr_id = fedmsg["msg"]["pull_request"]["number"]
 
-        github_repo = self._github_service.get_project(  # type: ignore
+        github_repo = self._github_service.get_project(
             repo=repo_name, namespace=namespace
         )
 
         package_config = get_packit_config_from_repo(
-            sourcegit_project=github_repo, ref=ref
+            sourcegit_project=github_repo, ref=commit_sha
         )
 
         if not package_config:
@@ -56,9 +158,14 @@ class PackitBotAPI:
                 f"No packit config: skipping pull-request {pr_id} for {namespace}/{repo_name}."
             )
             return
-        self.sync_upstream_pull_request(
-            package_config=package_config, pr_id=pr_id, dist_git_branch="master"
-        )
+        for dist_git_branch in get_dist_git_branches(
+            package_config, TriggerType.pull_request
+        ):
+            self.sync_upstream_pull_request(
+                package_config=package_config,
+                pr_id=pr_id,
+                dist_git_branch=dist_git_branch,
+            )
 
     def sync_upstream_pull_request(
         self, package_config: PackageConfig, pr_id: int, dist_git_branch: str
@@ -85,7 +192,7 @@ class PackitBotAPI:
         version = fedmsg["msg"]["release"]["tag_name"]
         https_url = fedmsg["msg"]["repository"]["html_url"]
 
-        github_repo = self._github_service.get_project(  # type: ignore
+        github_repo = self._github_service.get_project(
             repo=repo_name, namespace=namespace
         )
 
@@ -102,27 +209,32 @@ class PackitBotAPI:
         if not package_config.upstream_project_url:
             package_config.upstream_project_url = https_url
 
-        # TODO: https://github.com/packit-service/packit/issues/103
         self.sync_upstream_release(
-            package_config=package_config, version=version, dist_git_branch="master"
+            package_config=package_config,
+            version=version,
+            dist_git_branches=get_dist_git_branches(
+                package_config, TriggerType.release
+            ),
         )
 
     def sync_upstream_release(
         self,
         package_config: PackageConfig,
         version: Optional[str],
-        dist_git_branch: str,
+        dist_git_branches: Sequence[str],
     ):
         """
-        Sync the upstream release to the distgit pull-request.
+        Sync the upstream release to the distgit pull-requests.
 
         :param package_config: PackageConfig
         :param version: not used now, str
-        :param dist_git_branch: str
+        :param dist_git_branches: pull-request is created for each of the branches
         """
         logger.info("syncing the upstream code to downstream")
         packit_api = PackitAPI(config=self.config, package_config=package_config)
-        packit_api.sync_release(dist_git_branch=dist_git_branch, version=version)
+        packit_api.sync_release_to_branches(
+            dist_git_branches=dist_git_branches, version=version
+        )
 
     def watch_fedora_ci(self):
         for topic, msg in self.consumerino.iterate_dg_pr_flags():
@@ -1,27 +1,130 @@
+import importlib
 import logging
+from typing import Dict, List, NamedTuple, Optional
 
 import click
-from pkg_resources import get_distribution
-
-from packit.cli.build import build
-from packit.cli.create_update import create_update
-from packit.cli.srpm import srpm
-from packit.cli.update import update
-from packit.cli.sync_from_downstream import sync_from_downstream
-from packit.cli.watch_upstream_release import watch_releases
-from packit.cli.status import status
+
 from packit.config import Config, get_context_settings
+from packit.metrics import REGISTRY
+from packit import tracing, version as get_version
 from packit.utils import set_logging
 
 logger = logging.getLogger("packit")
 
 
-@click.group("packit", context_settings=get_context_settings())
+class LazyCommand(NamedTuple):
+    # "module:attribute" of the click command
+    import_path: str
+    # shown in `packit --help` without importing the module
+    short_help: str
+
+
+# Importing the subcommands pulls in ogr, GitPython, rebase-helper, fedmsg, ...
+# which takes most of the startup time -- import only the one which is invoked.
+LAZY_SUBCOMMANDS: Dict[str, LazyCommand] = {
+    "watch-releases": LazyCommand(
+        "packit.cli.watch_upstream_release:watch_releases",
+        "Watch for activity on github and for every new upstream release, "
+        "create a downstream pull request",
+    ),
+    "watch": LazyCommand(
+        "packit.cli.watch:watch",
+        "Watch fedmsg for the selected events and process them in a pool of workers",
+    ),
+    "replay-events": LazyCommand(
+        "packit.cli.replay_events:replay_events",
+        "Replay events recorded by `packit watch --record`",
+    ),
+    "propose-update": LazyCommand(
+        "packit.cli.update:update", "Release current upstream release into Fedora"
+    ),
+    "sync-from-downstream": LazyCommand(
+        "packit.cli.sync_from_downstream:sync_from_downstream",
+        "Copy synced files from Fedora dist-git into upstream by opening a pull request.",
+    ),
+    "build": LazyCommand(
+        "packit.cli.build:build", "Build selected upstream project in Fedora."
+    ),
+    "create-update": LazyCommand(
+        "packit.cli.create_update:create_update",
+        "Create a bodhi update for the selected upstream project",
+    ),
+    "srpm": LazyCommand(
+        "packit.cli.srpm:srpm",
+        "Create new SRPM (.src.rpm file) using content of the upstream repository.",
+    ),
+    "status": LazyCommand("packit.cli.status:status", "Display status"),
+}
+
+
+class LazyGroup(click.Group):
+    """
+    Group which imports the module of a subcommand only when the subcommand is used.
+    """
+
+    def __init__(self, *args, lazy_subcommands: Dict[str, LazyCommand] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_subcommands))
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        if cmd_name in self.commands or cmd_name not in self.lazy_subcommands:
+            return super().get_command(ctx, cmd_name)
+        module_name, attribute = self.lazy_subcommands[cmd_name].import_path.split(":")
+        command = getattr(importlib.import_module(module_name), attribute)
+        # cache it, the next lookup doesn't have to go through the import machinery
+        self.add_command(command, cmd_name)
+        return command
+
+    def format_commands(self, ctx: click.Context, formatter: click.HelpFormatter):
+        """ the same as click.MultiCommand.format_commands, but without the imports """
+        commands = []
+        for name in self.list_commands(ctx):
+            command = self.commands.get(name)
+            if command is None:
+                # placeholder, only to shorten the help the same way click does
+                command = click.Command(name, help=self.lazy_subcommands[name].short_help)
+            if not command.hidden:
+                commands.append((name, command))
+        if not commands:
+            return
+        limit = formatter.width - 6 - max(len(name) for name, _ in commands)
+        with formatter.section("Commands"):
+            formatter.write_dl(
+                [(name, command.get_short_help_str(limit)) for name, command in commands]
+            )
+
+
+@click.group(
+    "packit",
+    cls=LazyGroup,
+    lazy_subcommands=LAZY_SUBCOMMANDS,
+    context_settings=get_context_settings(),
+)
 @click.option("-d", "--debug", is_flag=True)
 @click.option("--fas-user", help="Fedora Account System username.")
 @click.option("-k", "--keytab", help="Path to FAS keytab file.")
+@click.option(
+    "--metrics-file",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write metrics (stage durations, API calls, ...) to this file on exit.",
+)
+@click.option(
+    "--trace",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Append timing of the individual steps of the workflow to this file.",
+)
+@click.option(
+    "--trace-format",
+    type=click.Choice(["json", "otlp"]),
+    default="json",
+    show_default=True,
+    help="Format of the --trace file: packit's JSON or OpenTelemetry JSON.",
+)
 @click.pass_context
-def packit_base(ctx, debug, fas_user, keytab):
+def packit_base(ctx, debug, fas_user, keytab, metrics_file, trace, trace_format):
     """Integrate upstream open source projects into Fedora operating system."""
     c = Config.get_user_config()
     c.debug = debug or c.debug
@@ -34,12 +137,25 @@ def packit_base(ctx, debug, fas_user, keytab):
     else:
         set_logging(level=logging.INFO)
         logger.debug("logging set to INFO")
+    if metrics_file:
+        ctx.call_on_close(lambda: REGISTRY.dump(metrics_file))
+    if trace:
+        exporters = [
+            tracing.OtlpJsonExporter(trace)
+            if trace_format == "otlp"
+            else tracing.JsonFileExporter(trace)
+        ]
+        if ctx.obj.debug:
+            exporters.append(tracing.LogSummaryExporter(level=logging.DEBUG))
+        for exporter in exporters:
+            tracing.add_exporter(exporter)
+            ctx.call_on_close(lambda e=exporter: tracing.remove_exporter(e))
 
 
 @click.command("version")
 def version():
     """Display the version."""
-    click.echo(get_distribution("packitos").version)
+    click.echo(get_version("packitos"))
 
 
 # packit_base.add_command(sg2dg)
@@ -47,13 +163,6 @@ def version():
 # packit_base.add_command(watcher)
 packit_base.add_command(version)
 # packit_base.add_command(watch_pr)
-packit_base.add_command(watch_releases)
-packit_base.add_command(update)
-packit_base.add_command(sync_from_downstream)
-packit_base.add_command(build)
-packit_base.add_command(create_update)
-packit_base.add_command(srpm)
-packit_base.add_command(status)
 
 if __name__ == "__main__":
     packit_base()
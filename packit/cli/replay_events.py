@@ -0,0 +1,67 @@
+"""
+Replay recorded events and report how the bot performed.
+"""
+import logging
+from contextlib import ExitStack
+
+import click
+
+from packit.bot_api import PackitBotAPI
+from packit.cli.utils import cover_packit_exception
+from packit.cli.watch import EVENTS
+from packit.config import pass_config, get_context_settings
+from packit.recording import load_recording
+from packit.replay import EventReplayer, check_recording, local_stand_ins
+
+logger = logging.getLogger(__name__)
+
+
+@click.command("replay-events", context_settings=get_context_settings())
+@click.option(
+    "--speedup",
+    type=float,
+    default=1.0,
+    show_default=True,
+    help="Replay the events this many times faster than recorded, "
+    "0 means as fast as possible.",
+)
+@click.option(
+    "--workers",
+    type=int,
+    default=4,
+    show_default=True,
+    help="Number of events processed in parallel.",
+)
+@click.option(
+    "--stand-ins",
+    nargs=2,
+    type=click.Path(exists=True, file_okay=False),
+    metavar="UPSTREAM_PATH DIST_GIT_PATH",
+    help="Use local git repositories instead of GitHub and dist-git, "
+    "and local stand-ins instead of the lookaside cache and Koji.",
+)
+@click.argument("recording", type=click.Path(exists=True, dir_okay=False))
+@pass_config
+@cover_packit_exception
+def replay_events(config, speedup, workers, stand_ins, recording):
+    """
+    Replay events recorded by `packit watch --record`
+
+    Reports throughput, latency percentiles and time spent in the individual stages.
+
+    Without --stand-ins, the events are processed against the real services.
+    """
+    events = load_recording(recording)
+    api = PackitBotAPI(config)
+    dispatcher = api.get_dispatcher(events=EVENTS, workers=workers)
+    check_recording(events, dispatcher)
+
+    with ExitStack() as stack:
+        if stand_ins:
+            # the stand-ins accept any token, but packit requires them
+            config.pagure_user_token = config.pagure_user_token or "stand-in"
+            config.pagure_fork_token = config.pagure_fork_token or "stand-in"
+            stack.enter_context(local_stand_ins(*stand_ins))
+        report = EventReplayer(dispatcher, speedup=speedup).replay(events)
+
+    click.echo(report.format())
@@ -17,7 +17,8 @@ logger = logging.getLogger(__file__)
 @click.command("propose-update", context_settings=get_context_settings())
 @click.option(
     "--dist-git-branch",
-    help="Target branch in dist-git to release into.",
+    help="Target branch in dist-git to release into, "
+    "more branches can be separated by commas (e.g. master,f31).",
     default="master",
 )
 @click.option(
@@ -64,8 +65,8 @@ def update(
     api = get_packit_api(
         config=config, dist_git_path=dist_git_path, local_project=path_or_url
     )
-    api.sync_release(
-        dist_git_branch,
+    api.sync_release_to_branches(
+        dist_git_branch.split(","),
         use_local_content=local_content,
         version=version,
         force_new_sources=force_new_sources,
@@ -0,0 +1,59 @@
+"""
+Watch for all the selected events using a single fedmsg subscription.
+"""
+
+import logging
+
+import click
+
+from packit.bot_api import PackitBotAPI
+from packit.cli.utils import cover_packit_exception
+from packit.config import pass_config, get_context_settings
+
+logger = logging.getLogger(__name__)
+
+EVENTS = ["release", "pull-request", "fedora-ci"]
+
+
+@click.command("watch", context_settings=get_context_settings())
+@click.option(
+    "-e",
+    "--event",
+    "events",
+    type=click.Choice(EVENTS),
+    multiple=True,
+    default=["release", "pull-request"],
+    show_default=True,
+    help="Event to process, can be specified multiple times.",
+)
+@click.option(
+    "--workers",
+    type=int,
+    default=4,
+    show_default=True,
+    help="Number of events processed in parallel.",
+)
+@click.option(
+    "--journal",
+    type=click.Path(dir_okay=False),
+    help="Record received events in this journal (SQLite database) "
+    "and process events left unprocessed by the previous run.",
+)
+@click.option(
+    "--record",
+    type=click.Path(dir_okay=False),
+    help="Append received events to this file, see the replay-events command.",
+)
+@pass_config
+@cover_packit_exception
+def watch(config, events, workers, journal, record):
+    """
+    Watch fedmsg for the selected events and process them in a pool of workers
+
+    All the events are received using a single fedmsg subscription
+    and dispatched to the respective handlers.
+    """
+    api = PackitBotAPI(config)
+    api.watch(
+        events=events, workers=workers, journal_path=journal, recording_path=record
+    )
@@ -26,8 +26,7 @@ def watch_releases(config, message_id):
     """
     api = PackitBotAPI(config)
     if message_id:
-        for msg_id in message_id:
-            fedmsg_dict = api.consumerino.fetch_fedmsg_dict(msg_id)
+        for fedmsg_dict in api.consumerino.fetch_fedmsg_dicts(message_id):
             api.sync_upstream_release_with_fedmsg(fedmsg_dict)
     else:
         api.watch_upstream_release()
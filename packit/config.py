@@ -1,21 +1,34 @@
+import copy
+import hashlib
 import json
 import logging
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
 from enum import IntEnum
 from functools import lru_cache
 from pathlib import Path
-from typing import Optional, List, NamedTuple, Dict, Callable
+from typing import TYPE_CHECKING, Optional, List, NamedTuple, Dict, Callable, Tuple
 
 import click
-import jsonschema
-from jsonschema import Draft4Validator
-from yaml import safe_load
+import yaml
 
-from ogr.abstract import GitProject
-from packit.constants import CONFIG_FILE_NAMES
+from packit import metrics
+from packit.constants import ACTION_TIMEOUT, CONFIG_FILE_NAMES
 from packit.exceptions import PackitConfigException, PackitException
 from packit.utils import exclude_from_dict, run_command
 
+try:
+    # libyaml is many times faster than the pure python implementation
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader  # type: ignore
+
+if TYPE_CHECKING:
+    from ogr.abstract import GitProject
+
 logger = logging.getLogger(__name__)
 
 
@@ -33,8 +46,13 @@ class Config:
         self._pagure_user_token: str = ""
         self._pagure_fork_token: str = ""
 
+        # directory for persistent caches, caching on disk is disabled if not set
+        self.cache_dir: Optional[str] = None
+        # clone dist-git only with the files packit works with
+        self.dist_git_sparse_checkout: bool = False
+
     @classmethod
-    def get_user_config(cls) -> "Config":
+    def get_user_config_path(cls) -> Optional[Path]:
         xdg_config_home = os.getenv("XDG_CONFIG_HOME")
         if xdg_config_home:
             directory = Path(xdg_config_home)
@@ -43,17 +61,23 @@ class Config:
 
         logger.debug(f"Loading user config from directory: {directory}")
 
-        loaded_config: dict = {}
         for config_file_name in CONFIG_FILE_NAMES:
             config_file_name_full = directory / config_file_name
             logger.debug(f"Trying to load user config from: {config_file_name_full}")
             if config_file_name_full.is_file():
-                try:
-                    loaded_config = safe_load(open(config_file_name_full))
-                except Exception as ex:
-                    logger.error(f"Cannot load user config '{config_file_name_full}'.")
-                    raise PackitException(f"Cannot load user config: {ex}.")
-                break
+                return config_file_name_full
+        return None
+
+    @classmethod
+    def get_user_config(cls) -> "Config":
+        loaded_config: dict = {}
+        config_file_name_full = cls.get_user_config_path()
+        if config_file_name_full:
+            try:
+                loaded_config = config_file_cache.load(config_file_name_full)
+            except Exception as ex:
+                logger.error(f"Cannot load user config '{config_file_name_full}'.")
+                raise PackitException(f"Cannot load user config: {ex}.")
         return Config.get_from_dict(raw_dict=loaded_config)
 
     @classmethod
@@ -74,12 +98,16 @@ class Config:
         )
         config.github_app_id = raw_dict.get("github_app_id", "")
         config.github_app_cert_path = raw_dict.get("github_app_cert_path", "")
+        config.cache_dir = raw_dict.get("cache_dir", None)
+        config.dist_git_sparse_checkout = raw_dict.get(
+            "dist_git_sparse_checkout", False
+        )
 
         return config
 
     @classmethod
     def is_dict_valid(cls, raw_dict: dict) -> bool:
-        return Draft4Validator(USER_CONFIG_SCHEMA).is_valid(raw_dict)
+        return _get_validator("user").is_valid(raw_dict)
 
     @property
     def github_token(self) -> str:
@@ -88,6 +116,10 @@ class Config:
             return token
         return self._github_token
 
+    @github_token.setter
+    def github_token(self, token: str) -> None:
+        self._github_token = token
+
     @property
     def pagure_user_token(self) -> str:
         token = os.getenv("PAGURE_USER_TOKEN", "")
@@ -95,6 +127,10 @@ class Config:
             return token
         return self._pagure_user_token
 
+    @pagure_user_token.setter
+    def pagure_user_token(self, token: str) -> None:
+        self._pagure_user_token = token
+
     @property
     def pagure_fork_token(self) -> str:
         """ this is needed to create pull requests """
@@ -103,6 +139,39 @@ class Config:
             return token
         return self._pagure_fork_token
 
+    @pagure_fork_token.setter
+    def pagure_fork_token(self, token: str) -> None:
+        self._pagure_fork_token = token
+
+
+class SharedConfig:
+    """
+    User config shared by more consumers (e.g. the jobs of the service),
+    it's reloaded once the config file changes
+    """
+
+    def __init__(self) -> None:
+        self._config: Optional[Config] = None
+        self._source: Optional[tuple] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_source() -> Optional[tuple]:
+        path = Config.get_user_config_path()
+        if not path:
+            return None
+        stat = path.stat()
+        return path, stat.st_mtime_ns, stat.st_size
+
+    def get(self) -> Config:
+        source = self._get_source()
+        with self._lock:
+            if self._config is None or source != self._source:
+                logger.debug(f"(Re)loading the user config from {source}.")
+                self._config = Config.get_user_config()
+                self._source = source
+            return self._config
+
 
 pass_config = click.make_pass_decorator(Config)
 
@@ -148,7 +217,7 @@ class JobConfig(NamedTuple):
 
     @classmethod
     def is_dict_valid(cls, raw_dict: dict) -> bool:
-        return Draft4Validator(JOB_CONFIG_SCHEMA).is_valid(raw_dict)
+        return _get_validator("job").is_valid(raw_dict)
 
 
 class PackageConfig:
@@ -291,7 +360,12 @@ class PackageConfig:
 
     @classmethod
     def validate_dict(cls, raw_dict: dict) -> None:
-        jsonschema.validate(raw_dict, PACKAGE_CONFIG_SCHEMA)
+        from jsonschema.exceptions import best_match
+
+        # the same as jsonschema.validate but without creating a new validator
+        error = best_match(_get_validator("package").iter_errors(raw_dict))
+        if error is not None:
+            raise error
 
     def run_action(self, action_name: str, method: Callable = None, *args, **kwargs):
         """
@@ -354,7 +428,7 @@ class PackageConfig:
         if action_name in self.actions:
             command = self.actions[action_name]
             logger.info(f"Using user-defined script for {action_name}: {command}")
-            run_command(cmd=command)
+            run_command(cmd=command, timeout=ACTION_TIMEOUT)
             return False
         logger.debug(f"Running default implementation for {action_name}.")
         return True
@@ -367,7 +441,7 @@ class PackageConfig:
         if action_name in self.actions:
             command = self.actions[action_name]
             logger.info(f"Using user-defined script for {action_name}: {command}")
-            return run_command(cmd=command, output=True)
+            return run_command(cmd=command, output=True, timeout=ACTION_TIMEOUT)
         return None
 
 
@@ -391,7 +465,7 @@ def get_local_package_config(
             if config_file_name_full.is_file():
                 logger.debug(f"Local package config found: {config_file_name_full}")
                 try:
-                    loaded_config = safe_load(open(config_file_name_full))
+                    loaded_config = config_file_cache.load(config_file_name_full)
                 except Exception as ex:
                     logger.error(
                         f"Cannot load package config '{config_file_name_full}'."
@@ -404,10 +478,152 @@ def get_local_package_config(
     raise PackitConfigException("No packit config found.")
 
 
+def safe_load(content: str):
+    return yaml.load(content, Loader=SafeLoader)
+
+
+class ConfigFileCache:
+    """
+    Parsed YAML (or JSON) config files by their path, size and modification time
+    """
+
+    def __init__(self) -> None:
+        # path -> (mtime, size, document)
+        self._files: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def load(self, path: Path):
+        """
+        :return: a copy of the parsed document, callers are free to modify it
+        """
+        stat = path.stat()
+        with self._lock:
+            cached = self._files.get(str(path))
+        hit = cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size)
+        metrics.count_cache_lookup("config_file", hit=hit)
+        if hit:
+            document = cached[2]
+        else:
+            document = safe_load(path.read_text())
+            with self._lock:
+                self._files[str(path)] = (stat.st_mtime_ns, stat.st_size, document)
+        return copy.deepcopy(document)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._files.clear()
+
+
+config_file_cache = ConfigFileCache()
+
+
+# RepoConfigCache.get() result if the cache knows nothing about the repo and ref
+NOT_CACHED = object()
+COMMIT_SHA_RE = re.compile(r"[0-9a-f]{40}")
+
+
+class RepoConfigCache:
+    """
+    Package config files (or their absence) found in repositories at given refs
+
+    A commit never changes so the lookups on commit hashes are cached
+    for good (within the size limit), the other refs (branches, tags) can move
+    so only the absence of a config is remembered there, for a short time.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        negative_ttl: float = 300,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_size = max_size
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        # (repo, ref) -> ((file name, content) or None, expiration or None)
+        self._entries: "OrderedDict[Tuple[str, str], tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_commit(ref: str) -> bool:
+        return bool(ref) and COMMIT_SHA_RE.fullmatch(ref) is not None
+
+    def get(self, repo: str, ref: str):
+        """
+        :return: (file name, content), None if there is no config,
+                 NOT_CACHED if we don't know
+        """
+        with self._lock:
+            entry = self._entries.get((repo, ref))
+            if entry is None:
+                return NOT_CACHED
+            found, expiration = entry
+            if expiration is not None and expiration <= self.clock():
+                del self._entries[(repo, ref)]
+                return NOT_CACHED
+            self._entries.move_to_end((repo, ref))
+            return found
+
+    def put(self, repo: str, ref: str, found: Optional[Tuple[str, str]]) -> None:
+        if self.is_commit(ref):
+            expiration = None
+        elif found is None:
+            expiration = self.clock() + self.negative_ttl
+        else:
+            return
+        with self._lock:
+            self._entries[(repo, ref)] = (found, expiration)
+            self._entries.move_to_end((repo, ref))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+repo_config_cache = RepoConfigCache()
+
+
 def get_packit_config_from_repo(
-    sourcegit_project: GitProject, ref: str
+    sourcegit_project: "GitProject", ref: str
 ) -> Optional[PackageConfig]:
-    for config_file_name in CONFIG_FILE_NAMES:
+    """
+    :param ref: preferably a commit hash, lookups on commits are cached
+    :return: PackageConfig from the repository or None if there is no config file
+    """
+    repo = f"{type(sourcegit_project).__name__}:{sourcegit_project.full_repo_name}"
+    found = repo_config_cache.get(repo, ref)
+    metrics.count_cache_lookup("package_config", hit=found is not NOT_CACHED)
+    if found is NOT_CACHED:
+        found = _find_config_file(sourcegit_project, ref)
+        repo_config_cache.put(repo, ref, found)
+    if not found:
+        return None
+
+    config_file_name, config_file_content = found
+    return load_package_config(config_file_content, source=config_file_name)
+
+
+def _find_config_file(
+    sourcegit_project: "GitProject", ref: str
+) -> Optional[Tuple[str, str]]:
+    """
+    List the root of the repository once and get the content of the config file
+
+    :return: (file name, content) or None if there is no config file
+    """
+    try:
+        metrics.count_forge_call(sourcegit_project, "get_files")
+        root_files = set(sourcegit_project.get_files(ref=ref))
+    except NotImplementedError:
+        # not supported by the service: let's try all the names
+        candidates = CONFIG_FILE_NAMES
+    else:
+        candidates = [name for name in CONFIG_FILE_NAMES if name in root_files]
+
+    for config_file_name in candidates:
+        metrics.count_forge_call(sourcegit_project, "get_file_content")
         try:
             config_file_content = sourcegit_project.get_file_content(
                 path=config_file_name, ref=ref
@@ -424,21 +640,85 @@ def get_packit_config_from_repo(
                 f"of the {sourcegit_project.full_repo_name} repository."
             )
             continue
+        return config_file_name, config_file_content
 
-        try:
-            loaded_config = safe_load(config_file_content)
-        except Exception as ex:
-            logger.error(f"Cannot load package config '{config_file_name}'.")
-            raise Exception(f"Cannot load package config: {ex}.")
+    logger.debug(
+        f"No config file found on ref '{ref}' "
+        f"of the {sourcegit_project.full_repo_name} repository."
+    )
+    return None
 
-        return parse_loaded_config(loaded_config=loaded_config)
 
-    return None
+class ParsedConfigCache:
+    """
+    Valid package configs by the hash of the content of the config file
+
+    Many events come from the same repositories with the same config,
+    so we don't need to parse and validate it over and over again.
+    """
+
+    def __init__(self, max_size: int = 256) -> None:
+        self.max_size = max_size
+        # sha256 of the content -> loaded (and valid) config
+        self._configs: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, content_hash: str) -> Optional[dict]:
+        with self._lock:
+            loaded_config = self._configs.get(content_hash)
+            if loaded_config is not None:
+                self._configs.move_to_end(content_hash)
+        metrics.count_cache_lookup(
+            "parsed_package_config", hit=loaded_config is not None
+        )
+        # parsing modifies the dict (and so would the users of the config)
+        return copy.deepcopy(loaded_config)
+
+    def put(self, content_hash: str, loaded_config: dict) -> None:
+        with self._lock:
+            self._configs[content_hash] = copy.deepcopy(loaded_config)
+            while len(self._configs) > self.max_size:
+                self._configs.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._configs.clear()
+
+
+parsed_config_cache = ParsedConfigCache()
+
+
+def load_package_config(content: str, source: str) -> PackageConfig:
+    """
+    Load and parse the content of a package config file
+
+    :param content: YAML (or JSON) content of the config file
+    :param source: where the content comes from, for the logs
+    :return: new PackageConfig
+    """
+    content_hash = hashlib.sha256(content.encode()).hexdigest()
+    loaded_config = parsed_config_cache.get(content_hash)
+    if loaded_config is not None:
+        logger.debug(f"Package config {source} was already parsed.")
+        return PackageConfig.get_from_dict(raw_dict=loaded_config, validate=False)
+
+    try:
+        loaded_config = safe_load(content)
+    except Exception as ex:
+        logger.error(f"Cannot load package config '{source}'.")
+        raise Exception(f"Cannot load package config: {ex}.")
+
+    # keep the original, parsing modifies the dict
+    original = copy.deepcopy(loaded_config)
+    package_config = parse_loaded_config(loaded_config=loaded_config)
+    parsed_config_cache.put(content_hash, original)
+    return package_config
 
 
 def parse_loaded_config(loaded_config: dict) -> PackageConfig:
     """Tries to parse the config to PackageConfig."""
-    logger.debug(f"Package config:\n{json.dumps(loaded_config, indent=4)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Package config:\n{json.dumps(loaded_config, indent=4)}")
 
     try:
         package_config = PackageConfig.get_from_dict(
@@ -486,5 +766,24 @@ USER_CONFIG_SCHEMA = {
         "github_app_installation_id": {"type": "string"},
         "github_app_id": {"type": "string"},
         "github_app_cert_path": {"type": "string"},
+        "cache_dir": {"type": "string"},
+        "dist_git_sparse_checkout": {"type": "boolean"},
     },
 }
+
+SCHEMAS = {
+    "user": USER_CONFIG_SCHEMA,
+    "job": JOB_CONFIG_SCHEMA,
+    "package": PACKAGE_CONFIG_SCHEMA,
+}
+
+
+@lru_cache(maxsize=None)
+def _get_validator(schema_name: str):
+    """
+    Creating a validator (and importing jsonschema) is expensive,
+    create them only once, when they are needed for the first time.
+    """
+    from jsonschema import Draft4Validator
+
+    return Draft4Validator(SCHEMAS[schema_name])
@@ -14,5 +14,14 @@ URM_NEW_RELEASE_TOPIC = "org.release-monitoring.prod.anitya.project.version.upda
 # example:
 # https://apps.fedoraproject.org/datagrepper/id?id=2019-a5034b55-339d-4fa5-a72b-db74579aeb5a
 GH2FED_RELEASE_TOPIC = "org.fedoraproject.prod.github.release"
+# https://github.com/fedora-infra/github2fedmsg/blob/a9c178b93aa6890e6b050e5f1c5e3297ceca463c/github2fedmsg/views/webhooks.py#L120
+GH2FED_PR_TOPIC_PREFIX = "org.fedoraproject.prod.github.pull_request."
+DG_PR_FLAG_TOPIC = "org.fedoraproject.prod.pagure.pull-request.flag.added"
 
 DEFAULT_BODHI_NOTE = "New upstream release: {version}"
+
+# timeouts of external commands [s], a hung command would block a worker forever
+FEDPKG_NEW_SOURCES_TIMEOUT = 60 * 60
+FEDPKG_BUILD_TIMEOUT = 10 * 60
+KINIT_TIMEOUT = 60
+ACTION_TIMEOUT = 60 * 60
@@ -0,0 +1,172 @@
+"""
+Route fedmsg messages to handlers and run them in a shared pool of workers.
+
+One dispatcher replaces a separate `fedmsg.tail_messages()` loop (and process)
+per watched event type.
+"""
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple
+
+from packit.journal import EventJournal
+from packit.utils import submit_in_context
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[str, dict], None]
+
+
+class Route(NamedTuple):
+    # topic prefix, e.g. "org.fedoraproject.prod.github.pull_request."
+    topic: str
+    handler: Handler
+
+
+class Dispatcher:
+    """
+    A routing table of topic prefixes and their handlers;
+    matched messages are processed by a thread pool.
+
+    If a journal is set, every routed message is recorded in it before processing
+    so that it can be replayed after a crash; already seen messages are skipped.
+
+    If a recorder is set, every routed message is appended to the recording.
+
+    At most `workers + backlog` messages are waiting or being processed,
+    dispatching more blocks until a worker is done with one.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        journal: EventJournal = None,
+        recorder=None,
+        backlog: int = None,
+    ) -> None:
+        """
+        :param workers: number of messages processed in parallel
+        :param journal: EventJournal instance
+        :param recorder: packit.recording.EventRecorder instance
+        :param backlog: number of messages waiting for a worker, defaults to `workers`
+        """
+        self.routes: List[Route] = []
+        self.workers = workers
+        self.backlog = workers if backlog is None else backlog
+        self._slots = threading.BoundedSemaphore(self.workers + self.backlog)
+        self.journal = journal
+        self.recorder = recorder
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="packit-worker"
+            )
+        return self._executor
+
+    @property
+    def topics(self) -> List[str]:
+        """topics (prefixes) we need to subscribe to"""
+        return [route.topic for route in self.routes]
+
+    def register(self, topic: str, handler: Handler) -> None:
+        """
+        Process messages with topic starting with `topic` using `handler`
+
+        :param topic: str, topic or its prefix
+        :param handler: callable accepting (topic, message)
+        """
+        logger.debug(f"Registering handler {handler!r} for topic {topic!r}.")
+        self.routes.append(Route(topic=topic, handler=handler))
+
+    def route(self, topic: str) -> Optional[Handler]:
+        """
+        Find a handler for the topic, the most specific (longest) prefix wins
+
+        :return: the handler or None if the topic is not routed
+        """
+        matching = [route for route in self.routes if topic.startswith(route.topic)]
+        if not matching:
+            return None
+        return max(matching, key=lambda r: len(r.topic)).handler
+
+    def dispatch(self, topic: str, msg: dict) -> Optional[Future]:
+        """
+        Submit the message to the pool
+
+        :return: Future of the handler call or None if no handler matched
+        """
+        handler = self.route(topic)
+        if not handler:
+            logger.debug(f"No handler for topic {topic}.")
+            return None
+        msg_id = msg.get("msg_id")
+        if self.journal and msg_id:
+            if not self.journal.record(msg_id=msg_id, topic=topic, msg=msg):
+                logger.info(f"Message {msg_id} was already received, skipping.")
+                return None
+        if self.recorder:
+            self.recorder.record(topic, msg)
+        return self._submit(handler, topic, msg)
+
+    def replay(self, include_failed: bool = False) -> List[Future]:
+        """
+        Process messages from the journal which were received but not processed
+
+        :param include_failed: process also messages which failed previously
+        :return: list of futures of the handler calls
+        """
+        if not self.journal:
+            return []
+        futures = []
+        for entry in self.journal.unfinished(include_failed=include_failed):
+            handler = self.route(entry.topic)
+            if not handler:
+                logger.warning(
+                    f"No handler for topic {entry.topic} of message {entry.msg_id}."
+                )
+                continue
+            logger.info(f"Replaying message {entry.msg_id} ({entry.state}).")
+            futures.append(self._submit(handler, entry.topic, entry.msg))
+        return futures
+
+    def consume(self, messages: Iterable[Tuple[str, dict]]) -> None:
+        """
+        Dispatch all the messages from the iterable
+
+        :param messages: iterable of (topic, message)
+        """
+        for topic, msg in messages:
+            self.dispatch(topic, msg)
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def _submit(self, handler: Handler, topic: str, msg: dict) -> Future:
+        logger.info(f"Processing message: {topic}")
+        # backpressure: don't read more messages than we are able to process
+        self._slots.acquire()
+        try:
+            future = submit_in_context(self.executor, handler, topic, msg)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(
+            lambda f: self._processing_finished(f, msg.get("msg_id"))
+        )
+        return future
+
+    def _processing_finished(self, future: Future, msg_id: Optional[str]) -> None:
+        self._slots.release()
+        ex = future.exception()
+        if ex:
+            logger.error(f"Processing of the message failed: {ex!r}")
+        if self.journal and msg_id:
+            if ex:
+                self.journal.mark_failed(msg_id, error=repr(ex))
+            else:
+                self.journal.mark_done(msg_id)
@@ -1,17 +1,21 @@
 import logging
 import os
 import shutil
-from typing import Optional, List, Tuple, Sequence
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional, List, Tuple, Sequence
 
 import git
 import requests
-from rebasehelper.specfile import SpecFile
 
 from ogr.services.pagure import PagureService
+from packit import metrics
 from packit.config import Config, PackageConfig
 from packit.exceptions import PackitException
 from packit.local_project import LocalProject
 from packit.fedpkg import FedPKG
+from packit.specfile import SpecMetadata, Specfile, get_spec_metadata
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +50,8 @@ class DistGit:
         self.files_to_sync: List[str] = self.package_config.synced_files
         self.dist_git_namespace: str = self.package_config.dist_git_namespace
         self._specfile = None
+        # worktrees share the git config (remotes) and the list of worktrees
+        self._git_config_lock = threading.Lock()
 
     @property
     def local_project(self):
@@ -60,9 +66,19 @@ class DistGit:
                     token=self.pagure_user_token,
                     instance_url=self.package_config.dist_git_base_url,
                 ),
+                sparse_paths=self.sparse_paths
+                if self.config.dist_git_sparse_checkout
+                else None,
             )
         return self._local_project
 
+    @property
+    def sparse_paths(self) -> List[str]:
+        """ patterns of the files packit works with in dist-git """
+        spec = f"/{self.package_name}.spec" if self.package_name else "/*.spec"
+        synced = [f"/{os.path.basename(path)}" for path in self.files_to_sync]
+        return [spec, "/sources", "/.gitignore", "/*.patch"] + synced
+
     @property
     def specfile_path(self) -> Optional[str]:
         if self.package_name:
@@ -72,15 +88,35 @@ class DistGit:
         return None
 
     @property
-    def specfile(self):
+    def specfile(self) -> Specfile:
         if self._specfile is None:
-            self._specfile = SpecFile(
-                path=self.specfile_path,
-                sources_location=self.local_project.working_dir,
-                changelog_entry=None,
-            )
+            self._specfile = Specfile(self.specfile_path)
+        else:
+            # e.g. the spec was synced from upstream
+            self._specfile.refresh()
         return self._specfile
 
+    def get_specfile_metadata(self, ref: str = None) -> SpecMetadata:
+        """
+        Metadata of the spec file, parsed only if the same content wasn't parsed before
+
+        :param ref: read the spec at this ref from git (nothing is checked out),
+                    defaults to the spec in the working tree
+        """
+        if ref is None:
+            return get_spec_metadata(self.specfile_path, cache_dir=self.config.cache_dir)
+        spec_name = os.path.basename(self.specfile_path)
+        try:
+            blob = self.local_project.git_repo.commit(ref).tree / spec_name
+        except (git.BadName, KeyError, ValueError) as ex:
+            raise PackitException(f"Can't find {spec_name} at {ref}: {ex!r}")
+        return get_spec_metadata(
+            self.specfile_path,
+            blob_id=blob.hexsha,
+            read_content=lambda: blob.data_stream.read(),
+            cache_dir=self.config.cache_dir,
+        )
+
     def create_branch(
         self, branch_name: str, base: str = "HEAD", setup_tracking: bool = False
     ) -> git.Head:
@@ -107,6 +143,67 @@ class DistGit:
 
         return head
 
+    @contextmanager
+    def worktree(
+        self, branch_name: Optional[str], base: str = "HEAD"
+    ) -> Iterator["DistGit"]:
+        """
+        Check out the branch in a new worktree of the dist-git repo
+
+        The worktree shares the git objects and remotes with this repo so more
+        branches can be worked on at once without cloning the repo again and
+        without touching the checkout (and the cached specfile) of this repo.
+        The worktree is removed on exit, the branch is kept.
+
+        :param branch_name: branch to check out, it's (re)set to the base;
+                            None to check out the base in a detached HEAD
+        :param base: ref to base the branch on
+        :return: DistGit working in the worktree
+        """
+        repo = self.local_project.git_repo
+        prefix = f"{self.package_name}-{branch_name or 'detached'}-"
+        path = tempfile.mkdtemp(prefix=prefix.replace("/", "-"))
+        logger.debug(f"Checking out {branch_name or base!r} in a worktree {path}")
+        checkout = ["-B", branch_name] if branch_name else ["--detach"]
+        try:
+            with self._git_config_lock:
+                # forget worktrees of processes which didn't clean up after themselves
+                repo.git.worktree("prune")
+                repo.git.worktree("add", *checkout, path, base)
+        except git.GitCommandError as ex:
+            shutil.rmtree(path, ignore_errors=True)
+            raise PackitException(
+                f"Unable to check out {base} as {branch_name} in a worktree: {ex}"
+            )
+        try:
+            dg = DistGit(config=self.config, package_config=self.package_config)
+            dg._local_project = LocalProject(
+                git_repo=git.Repo(path),
+                working_dir=path,
+                git_project=self.local_project.git_project,
+                git_service=self.local_project.git_service,
+                git_url=self.local_project.git_url,
+                namespace=self.local_project.namespace,
+                repo_name=self.local_project.repo_name,
+            )
+            dg._git_config_lock = self._git_config_lock
+            yield dg
+        finally:
+            try:
+                with self._git_config_lock:
+                    repo.git.worktree("remove", "--force", path)
+            except git.GitCommandError as ex:
+                # don't hide the exception from the block, the next prune cleans up
+                logger.warning(f"Unable to remove the worktree {path}: {ex}")
+            shutil.rmtree(path, ignore_errors=True)
+
+    @metrics.timed("fetch")
+    def fetch(self) -> None:
+        """ fetch all the branches from origin """
+        logger.debug("About to fetch the dist-git repo")
+        self.local_project.git_repo.remote("origin").fetch()
+
+    @metrics.timed("fetch")
     def update_branch(self, branch_name: str):
         """
         Fetch latest commits to the selected branch; tracking needs to be set up
@@ -165,6 +262,7 @@ class DistGit:
         # TODO: make -s configurable
         self.local_project.git_repo.git.commit(*commit_args)
 
+    @metrics.timed("push")
     def push_to_fork(
         self, branch_name: str, fork_remote_name: str = "fork", force: bool = False
     ):
@@ -179,13 +277,32 @@ class DistGit:
             f"About to {'force ' if force else ''}push changes to branch {branch_name} "
             f"of a fork {fork_remote_name} of the dist-git repo"
         )
+        with self._git_config_lock:
+            self._add_fork_remote(fork_remote_name)
+
+        try:
+            self.local_project.git_repo.remote(fork_remote_name).push(
+                refspec=branch_name, force=force
+            )
+        except git.GitError as ex:
+            msg = (
+                f"Unable to push to remote {fork_remote_name} using branch {branch_name}, "
+                f"the error is:\n{ex}"
+            )
+            raise PackitException(msg)
+
+    def _add_fork_remote(self, fork_remote_name: str) -> None:
+        """ add a remote pointing to our fork of the dist-git repo if it's not there """
         if fork_remote_name not in [
             remote.name for remote in self.local_project.git_repo.remotes
         ]:
-            fork = self.local_project.git_project.get_fork()
+            project = self.local_project.git_project
+            metrics.count_forge_call(project, "get_fork")
+            fork = project.get_fork()
             if not fork:
-                self.local_project.git_project.fork_create()
-                fork = self.local_project.git_project.get_fork()
+                metrics.count_forge_call(project, "fork_create")
+                project.fork_create()
+                fork = project.get_fork()
             if not fork:
                 raise PackitException(
                     "Unable to create a fork of repository "
@@ -196,17 +313,7 @@ class DistGit:
                 name=fork_remote_name, url=fork_urls["ssh"]
             )
 
-        try:
-            self.local_project.git_repo.remote(fork_remote_name).push(
-                refspec=branch_name, force=force
-            )
-        except git.GitError as ex:
-            msg = (
-                f"Unable to push to remote {fork_remote_name} using branch {branch_name}, "
-                f"the error is:\n{ex}"
-            )
-            raise PackitException(msg)
-
+    @metrics.timed("create_pull")
     def create_pull(
         self, pr_title: str, pr_description: str, source_branch: str, target_branch: str
     ) -> None:
@@ -230,12 +337,15 @@ class DistGit:
 
         project.change_token(self.pagure_user_token)
         # This pagure call requires token from the package's FORK
+        metrics.count_forge_call(project, "get_fork")
         project_fork = project.get_fork()
         if not project_fork:
+            metrics.count_forge_call(project, "fork_create")
             project.fork_create()
             project_fork = project.get_fork()
         project_fork.change_token(self.pagure_fork_token)
 
+        metrics.count_forge_call(project_fork, "pr_create")
         try:
             dist_git_pr = project_fork.pr_create(
                 title=pr_title,
@@ -254,23 +364,27 @@ class DistGit:
         """
         :return: name of the archive, e.g. sen-0.6.1.tar.gz
         """
-        archive_name = self.specfile.get_archive()
+        archive_name = self.get_specfile_metadata().archive
+        if archive_name is None:
+            raise PackitException(f"There is no Source0 in {self.specfile_path}.")
         logger.debug(f"Upstream archive name is {archive_name!r}")
         return archive_name
 
+    @metrics.timed("download_archive")
     def download_upstream_archive(self) -> str:
         """
         Fetch archive for the current upstream release defined in dist-git's spec
 
         :return: str, path to the archive
         """
-        self.specfile.download_remote_sources()
+        self.specfile.download_remote_sources(self.local_project.working_dir)
         archive = os.path.join(
             self.local_project.working_dir, self.upstream_archive_name
         )
         logger.info(f"Downloaded archive: {archive!r}")
         return archive
 
+    @metrics.timed("upload_archive")
     def upload_to_lookaside_cache(self, archive_path: str) -> None:
         """
         Upload files (archive) to the lookaside cache.
@@ -288,6 +402,7 @@ class DistGit:
             )
             raise PackitException(ex)
 
+    @metrics.timed("lookaside_check")
     def is_archive_in_lookaside_cache(self, archive_path: str) -> bool:
         archive_name = os.path.basename(archive_path)
         try:
@@ -339,30 +454,10 @@ class DistGit:
         if not patch_list:
             return
         if not self.specfile_path:
-            raise Exception("No specfile")
-
-        with open(file=self.specfile_path, mode="r+") as spec_file:
-            last_source_position = None
-            line = spec_file.readline()
-            while line:
-                if line.startswith("Source"):
-                    last_source_position = spec_file.tell()
-                line = spec_file.readline()
-
-            if not last_source_position:
-                raise Exception("Cannot found place for patches in specfile.")
+            raise PackitException("No specfile")
 
-            spec_file.seek(last_source_position)
-            rest_of_the_file = spec_file.read()
-            spec_file.seek(last_source_position)
-
-            spec_file.write("\n\n# PATCHES FROM SOURCE GIT:\n")
-            for i, (patch, msg) in enumerate(patch_list):
-                commented_msg = "\n# " + "\n# ".join(msg.split("\n")) + "\n"
-                spec_file.write(commented_msg)
-                spec_file.write(f"Patch{i + 1:04d}: {patch}\n")
-
-            spec_file.write(rest_of_the_file)
+        with self.specfile.transaction() as spec:
+            spec.add_patches(patch_list)
 
         logger.info(
             f"Patches ({len(patch_list)}) added to the specfile ({self.specfile_path})"
@@ -416,7 +511,9 @@ class DistGit:
                 )
         # I was thinking of verifying that the build is valid for a new bodhi update
         # but in the end it's likely a waste of resources since bodhi will tell us
-        rendered_note = update_notes.format(version=self.specfile.get_version())
+        rendered_note = update_notes.format(
+            version=self.get_specfile_metadata().version
+        )
         try:
             result = b.save(builds=koji_builds, notes=rendered_note, type=update_type)
             logger.debug(f"Bodhi response:\n{result}")
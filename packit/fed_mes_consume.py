@@ -3,26 +3,50 @@ The code here handles receiving messages about events and has wrappers to proces
 
 This module is meant to be imported in API and should be independent.
 """
+import hashlib
 import logging
-from typing import Iterable, Tuple, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Tuple, Dict, Any, List, Optional
 
 import fedmsg
+import fedmsg.config
+import fedmsg.crypto
+import fedmsg.encoding
 import requests
+import zmq
 
-from packit.constants import GH2FED_RELEASE_TOPIC
+from packit import metrics
+from packit.constants import (
+    GH2FED_RELEASE_TOPIC,
+    GH2FED_PR_TOPIC_PREFIX,
+    DG_PR_FLAG_TOPIC,
+)
+from packit.exceptions import PackitException
+from packit.utils import (
+    atomic_write_json,
+    make_retrying_session,
+    read_json_cache,
+    submit_in_context,
+)
 
 logger = logging.getLogger(__name__)
 
+DATAGREPPER_URL = (
+    "https://apps.fedoraproject.org/datagrepper/id?id={msg_id}&is_raw=true"
+)
+
 
 class Consumerino:
     """
     A class which provides an interface to consume messages via a callback
     """
 
-    def __init__(self, url: str = None) -> None:
+    def __init__(self, url: str = None, cache_dir: str = None) -> None:
         # TODO: the url template should be configurable
-        self.datagrepper_url = url or (
-            "https://apps.fedoraproject.org/datagrepper/id?id={msg_id}&is_raw=true"
+        self.datagrepper_url = url or DATAGREPPER_URL
+        self.datagrepper = DatagrepperClient(
+            url=self.datagrepper_url, cache_dir=cache_dir
         )
         # timestamp = datetime.datetime.now().strftime("%Y%M%d-%H%M%S")
         # self.binding = {
@@ -46,15 +70,11 @@ class Consumerino:
 
         :return: tuple, (full topic name, pull request action, dict with the message)
         """
-        # https://github.com/fedora-infra/github2fedmsg/blob/a9c178b93aa6890e6b050e5f1c5e3297ceca463c/github2fedmsg/views/webhooks.py#L120
-        topic_pre = "org.fedoraproject.prod.github.pull_request."
-        for name, endpoint, topic, msg in fedmsg.tail_messages():
-            # logger.debug("new message: %s", topic)
-            # average load is about 5 messages a second
-            if topic.startswith(topic_pre):
-                logger.info("process message: %s", topic)
-                action = topic.rsplit(".", 1)[1]
-                yield topic, action, msg
+        # zeromq subscriptions are prefix-based: no need to tail the whole bus
+        for topic, msg in Consumerino._yield_messages(GH2FED_PR_TOPIC_PREFIX):
+            logger.info("process message: %s", topic)
+            action = topic.rsplit(".", 1)[1]
+            yield topic, action, msg
 
     @staticmethod
     def _yield_messages(topic: str) -> Iterable[Tuple[str, dict]]:
@@ -62,6 +82,41 @@ class Consumerino:
         for name, endpoint, topic, msg in fedmsg.tail_messages(topic=topic):
             yield topic, msg
 
+    @staticmethod
+    def iterate_topics(
+        topics: List[str], config: dict = None
+    ) -> Iterable[Tuple[str, dict]]:
+        """
+        Provide messages for all the selected topics using a single subscription
+
+        fedmsg.tail_messages() subscribes to one topic only; a zeromq SUB socket
+        can subscribe to any number of topics, so we create the sockets ourselves
+        and receive exactly the messages we are interested in.
+
+        :param topics: list of topics or topic prefixes
+        :param config: fedmsg config, loaded from the system if not set
+        :return: tuple, (full topic name, dict with the message)
+        """
+        config = config or fedmsg.config.load_config()
+        logger.info(f"listening on fedmsg, topics={topics}")
+        subscribers = create_subscribers(config, topics)
+        poller = zmq.Poller()
+        for subscriber in subscribers:
+            poller.register(subscriber, zmq.POLLIN)
+        validate = config.get("validate_signatures", False)
+        try:
+            while True:
+                for subscriber in dict(poller.poll()):
+                    topic, body = subscriber.recv_multipart()
+                    msg = fedmsg.encoding.loads(body.decode("utf-8"))
+                    if validate and not fedmsg.crypto.validate(msg, **config):
+                        logger.warning(f"Invalid signature of message: {msg!r}")
+                        continue
+                    yield topic.decode("utf-8"), msg
+        finally:
+            for subscriber in subscribers:
+                subscriber.close()
+
     @staticmethod
     def iterate_releases() -> Iterable[Tuple[str, dict]]:
         """
@@ -84,8 +139,7 @@ class Consumerino:
         """
         # we can watch for runs directly:
         # "org.centos.prod.ci.pipeline.allpackages.complete"
-        topic = "org.fedoraproject.prod.pagure.pull-request.flag.added"
-        return Consumerino._yield_messages(topic)
+        return Consumerino._yield_messages(DG_PR_FLAG_TOPIC)
 
     def fetch_fedmsg_dict(self, msg_id: str) -> Dict[str, Any]:
         """
@@ -95,7 +149,133 @@ class Consumerino:
         :return: dict, the fedmsg
         """
         logger.debug(f"Proccessing message: {msg_id}")
-        url = self.datagrepper_url.format(msg_id=msg_id)
-        response = requests.get(url)
+        return self.datagrepper.fetch(msg_id)
+
+    def fetch_fedmsg_dicts(self, msg_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        Fetch selected messages from datagrepper concurrently
+
+        :param msg_ids: message ids
+        :return: list of fedmsg dicts in the same order as the ids
+        """
+        return self.datagrepper.fetch_many(msg_ids)
+
+
+class DatagrepperClient:
+    """
+    Fetch messages from datagrepper
+
+    Connections are pooled and failed requests are retried. If cache_dir is set,
+    messages are cached on disk: a message with a given id never changes.
+    """
+
+    def __init__(
+        self,
+        url: str = None,
+        cache_dir: str = None,
+        timeout: float = 30,
+        retries: int = 3,
+        max_workers: int = 8,
+    ) -> None:
+        """
+        :param url: url template with {msg_id} placeholder
+        :param cache_dir: directory to cache the messages in
+        :param timeout: timeout of a single request in seconds
+        :param retries: how many times a failed request is retried
+        :param max_workers: how many messages are fetched in parallel
+        """
+        self.url = url or DATAGREPPER_URL
+        self.cache_dir = Path(cache_dir) / "datagrepper" if cache_dir else None
+        self.timeout = timeout
+        self.retries = retries
+        self.max_workers = max_workers
+        self._session: Optional[requests.Session] = None
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            self._session = make_retrying_session(
+                retries=self.retries, pool_size=self.max_workers
+            )
+        return self._session
+
+    def fetch(self, msg_id: str) -> Dict[str, Any]:
+        """
+        Fetch a single message, use the cache if possible
+
+        :param msg_id: str
+        :return: dict, the fedmsg
+        """
+        msg_dict = self._load_from_cache(msg_id)
+        if self.cache_dir:
+            metrics.count_cache_lookup("datagrepper", hit=msg_dict is not None)
+        if msg_dict is not None:
+            logger.debug(f"Message {msg_id} found in the cache.")
+            return msg_dict
+
+        url = self.url.format(msg_id=msg_id)
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as ex:
+            raise PackitException(f"Cannot fetch message {msg_id}: {ex}")
         msg_dict = response.json()
+        self._save_to_cache(msg_id, msg_dict)
         return msg_dict
+
+    def fetch_many(self, msg_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        Fetch messages concurrently, at most `max_workers` at once
+
+        :param msg_ids: message ids
+        :return: list of fedmsg dicts in the same order as the ids
+        """
+        msg_ids = list(msg_ids)
+        if len(msg_ids) <= 1:
+            return [self.fetch(msg_id) for msg_id in msg_ids]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                submit_in_context(executor, self.fetch, msg_id) for msg_id in msg_ids
+            ]
+            return [future.result() for future in futures]
+
+    def _cache_path(self, msg_id: str) -> Optional[Path]:
+        if not self.cache_dir:
+            return None
+        # message ids may contain any characters, the hash is a safe file name
+        digest = hashlib.sha256(msg_id.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{digest}.json"
+
+    def _load_from_cache(self, msg_id: str) -> Optional[Dict[str, Any]]:
+        path = self._cache_path(msg_id)
+        return read_json_cache(path) if path else None
+
+    def _save_to_cache(self, msg_id: str, msg_dict: Dict[str, Any]) -> None:
+        path = self._cache_path(msg_id)
+        if path:
+            atomic_write_json(path, msg_dict)
+
+
+def create_subscribers(config: dict, topics: List[str]) -> List[zmq.Socket]:
+    """
+    Connect a zeromq SUB socket to every endpoint from the fedmsg config
+
+    :param config: fedmsg config
+    :param topics: every socket is subscribed to all of these
+    :return: list of sockets
+    """
+    context = zmq.Context.instance()
+    subscribers = []
+    for name, endpoints in config["endpoints"].items():
+        # fedmsg adds its own inbound relay to the endpoints, never subscribe to it
+        if name == "relay_inbound":
+            continue
+        if isinstance(endpoints, str):
+            endpoints = [endpoints]
+        for endpoint in endpoints:
+            subscriber = context.socket(zmq.SUB)
+            for topic in topics:
+                subscriber.setsockopt(zmq.SUBSCRIBE, topic.encode("utf-8"))
+            subscriber.connect(endpoint)
+            subscribers.append(subscriber)
+    return subscribers
@@ -1,5 +1,10 @@
 from pathlib import Path
 
+from packit.constants import (
+    FEDPKG_BUILD_TIMEOUT,
+    FEDPKG_NEW_SOURCES_TIMEOUT,
+    KINIT_TIMEOUT,
+)
 from packit.utils import run_command, logger
 
 
@@ -30,6 +35,7 @@ class FedPKG:
             cwd=self.directory,
             error_message=f"Adding new sources failed:",
             fail=fail,
+            timeout=FEDPKG_NEW_SOURCES_TIMEOUT,
         )
 
     def build(self, scratch: bool = False):
@@ -42,6 +48,7 @@ class FedPKG:
             error_message="Submission of build to koji failed.",
             fail=True,
             output=True,
+            timeout=FEDPKG_BUILD_TIMEOUT,
         )
         logger.info("%s", out)
 
@@ -62,5 +69,8 @@ class FedPKG:
             # there is no keytab, but user still might have active ticket - try to renew it
             cmd = ["kinit", "-R", f"{self.fas_username}@FEDORAPROJECT.ORG"]
         return run_command(
-            cmd=cmd, error_message="Failed to init kerberos ticket:", fail=True
+            cmd=cmd,
+            error_message="Failed to init kerberos ticket:",
+            fail=True,
+            timeout=KINIT_TIMEOUT,
         )
@@ -0,0 +1,278 @@
+"""
+`git describe --tags --match PATTERN` without running git.
+
+The tags are indexed by the commits they point to and the history is walked
+the same way git does it, so the output is the same. The results are memoized
+by HEAD and the tags: a single sync or SRPM build asks for the version many times.
+"""
+import fnmatch
+import heapq
+import itertools
+import logging
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import git
+from gitdb import GitDB
+from gitdb.exc import AmbiguousObjectName, ODBError
+from gitdb.util import hex_to_bin
+
+logger = logging.getLogger(__name__)
+
+# the same as `git describe --candidates`
+MAX_CANDIDATES = 10
+# shortest abbreviated commit hash git uses by default and at all
+DEFAULT_ABBREV = 7
+MINIMUM_ABBREV = 4
+# commit flags, the bits above are used for the candidates
+SEEN = 1
+
+
+class TagName(NamedTuple):
+    name: str
+    # git prefers annotated tags (2) to lightweight ones (1)
+    prio: int
+    # tagger date of annotated tags
+    date: int
+
+
+class Repository:
+    """ reads refs and objects of a git repository directly """
+
+    def __init__(self, path: str):
+        self.repo = git.Repo(path)
+        self.common_dir = self.repo.common_dir
+        self.db = GitDB(os.path.join(self.common_dir, "objects"))
+        # sha -> (committer date, parents)
+        self._commits: Dict[str, Tuple[int, Tuple[str, ...]]] = {}
+
+    def is_supported(self) -> bool:
+        """ git describe sees a different history in shallow clones or with grafts """
+        common_dir = Path(self.common_dir)
+        return not (
+            common_dir.joinpath("shallow").exists()
+            or common_dir.joinpath("info", "grafts").exists()
+            or any(common_dir.joinpath("refs", "replace").glob("*"))
+            or "refs/replace/" in self._read_packed_refs()
+        )
+
+    def _read_packed_refs(self) -> str:
+        try:
+            return Path(self.common_dir, "packed-refs").read_text()
+        except FileNotFoundError:
+            return ""
+
+    def get_head(self) -> str:
+        return self.repo.head.commit.hexsha
+
+    def get_tags(self) -> Dict[str, str]:
+        """ tag name -> sha of the object the tag points to """
+        return {
+            ref.name: git.SymbolicReference.dereference_recursive(self.repo, ref.path)
+            for ref in git.TagReference.list_items(self.repo)
+        }
+
+    def read_object(self, sha: str) -> Tuple[bytes, bytes]:
+        stream = self.db.stream(hex_to_bin(sha))
+        return stream.type, stream.read()
+
+    @staticmethod
+    def _read_headers(data: bytes) -> List[Tuple[bytes, bytes]]:
+        headers = []
+        for line in data.split(b"\n"):
+            if not line:
+                break
+            key, _, value = line.partition(b" ")
+            headers.append((key, value))
+        return headers
+
+    @staticmethod
+    def _get_date(signature: bytes) -> int:
+        # "Name <email> 1551100000 +0100"
+        return int(signature.rsplit(b" ", 2)[-2])
+
+    def get_commit(self, sha: str) -> Tuple[int, Tuple[str, ...]]:
+        """ :return: committer date and parents of the commit """
+        if sha not in self._commits:
+            object_type, data = self.read_object(sha)
+            if object_type != b"commit":
+                raise ValueError(f"{sha} is not a commit")
+            date, parents = 0, []
+            for key, value in self._read_headers(data):
+                if key == b"parent":
+                    parents.append(value.decode())
+                elif key == b"committer":
+                    date = self._get_date(value)
+            self._commits[sha] = date, tuple(parents)
+        return self._commits[sha]
+
+    def peel_tag(self, sha: str) -> Optional[Tuple[str, int, int]]:
+        """
+        :return: commit the tag points to, prio and date of the tag
+                 or None if the tag doesn't point to a commit
+        """
+        prio, date = 1, 0
+        object_type, data = self.read_object(sha)
+        while object_type == b"tag":
+            headers = dict(self._read_headers(data))
+            if prio == 1:
+                prio, date = 2, self._get_date(headers.get(b"tagger", b"0 0"))
+            sha = headers[b"object"].decode()
+            object_type, data = self.read_object(sha)
+        if object_type != b"commit":
+            return None
+        return sha, prio, date
+
+    def get_abbrev_length(self) -> int:
+        """ the same as git: core.abbrev or based on the number of packed objects """
+        configured = self.repo.config_reader().get_value("core", "abbrev", "auto")
+        if str(configured) != "auto":
+            return max(int(configured), MINIMUM_ABBREV)
+        count = 0
+        for index in Path(self.common_dir, "objects", "pack").glob("*.idx"):
+            with index.open("rb") as index_file:
+                header = index_file.read(8)
+                # v2 starts with a header, the last entry of the fan-out table
+                # is the number of objects in the pack
+                offset = 8 if header[:4] == b"\377tOc" else 0
+                index_file.seek(offset + 255 * 4)
+                count += int.from_bytes(index_file.read(4), "big")
+        # 2^bits objects are expected to collide at 2^(bits/2), 4 bits per hex digit
+        return max(DEFAULT_ABBREV, (count.bit_length() + 1) // 2)
+
+    def abbreviate(self, sha: str) -> str:
+        length = self.get_abbrev_length()
+        while length < len(sha):
+            try:
+                self.db.partial_to_complete_sha_hex(sha[:length])
+                break
+            except AmbiguousObjectName:
+                length += 1
+        return sha[:length]
+
+
+def get_names(repository: Repository, match: str) -> Dict[str, TagName]:
+    """ the index of tags: commit -> the tag git would use for it """
+    names: Dict[str, TagName] = {}
+    # git goes through the refs sorted by name, the first one wins a tie
+    for tag, sha in sorted(repository.get_tags().items()):
+        if not fnmatch.fnmatchcase(tag, match):
+            continue
+        peeled = repository.peel_tag(sha)
+        if peeled is None:
+            continue
+        commit, prio, date = peeled
+        current = names.get(commit)
+        if (
+            current is None
+            or current.prio < prio
+            or (current.prio == prio == 2 and current.date < date)
+        ):
+            names[commit] = TagName(tag, prio, date)
+    return names
+
+
+def describe_commit(
+    repository: Repository, names: Dict[str, TagName], head: str
+) -> Optional[Tuple[str, int]]:
+    """
+    The walk of `git describe`: commits are visited from the newest, up to
+    MAX_CANDIDATES tags are collected and the one with the fewest commits
+    between it and head wins.
+
+    :return: tag and the number of commits since the tag, None if there is no tag
+    """
+    if head in names:
+        return names[head].name, 0
+
+    counter = itertools.count()
+    flags = {head: SEEN}
+    # the newest commit first, the same dates in the order of insertion
+    queue = [(-repository.get_commit(head)[0], next(counter), head)]
+
+    def push(commit: str) -> None:
+        date = repository.get_commit(commit)[0]
+        heapq.heappush(queue, (-date, next(counter), commit))
+
+    def push_parents(commit: str) -> None:
+        for parent in repository.get_commit(commit)[1]:
+            if not flags.get(parent, 0) & SEEN:
+                push(parent)
+            flags[parent] = flags.get(parent, 0) | flags[commit]
+
+    # [name, depth, flag, found order]
+    candidates: List[list] = []
+    annotated = 0
+    seen_commits = 0
+    gave_up_on = None
+    while queue:
+        commit = heapq.heappop(queue)[2]
+        seen_commits += 1
+        name = names.get(commit)
+        if name is not None:
+            if len(candidates) < MAX_CANDIDATES:
+                flag = 1 << (len(candidates) + 1)
+                candidates.append([name, seen_commits - 1, flag, len(candidates)])
+                flags[commit] |= flag
+                annotated += name.prio == 2
+            else:
+                gave_up_on = commit
+                break
+        for candidate in candidates:
+            if not flags[commit] & candidate[2]:
+                candidate[1] += 1
+        if annotated and not queue:
+            break
+        push_parents(commit)
+
+    if not candidates:
+        return None
+    candidates.sort(key=lambda candidate: (candidate[1], candidate[3]))
+    best = candidates[0]
+    if gave_up_on is not None:
+        push(gave_up_on)
+
+    # count the commits which are not reachable from the best tag
+    while queue:
+        commit = heapq.heappop(queue)[2]
+        if flags[commit] & best[2]:
+            if all(flags[other] & best[2] for _, _, other in queue):
+                break
+        else:
+            best[1] += 1
+        push_parents(commit)
+    return best[0].name, best[1]
+
+
+@lru_cache(maxsize=128)
+def _describe(
+    path: str, head: str, tags: Tuple[Tuple[str, str], ...], match: str
+) -> Optional[str]:
+    repository = Repository(path)
+    described = describe_commit(repository, get_names(repository, match), head)
+    if described is None:
+        return None
+    tag, depth = described
+    if depth == 0:
+        return tag
+    return f"{tag}-{depth}-g{repository.abbreviate(head)}"
+
+
+def describe(path: str, match: str = "*") -> Optional[str]:
+    """
+    The same as `git describe --tags --match MATCH` in the repository.
+
+    :return: None if the repository can't be described natively (e.g. there are
+             no tags or it's a shallow clone), git itself should be asked then
+    """
+    try:
+        repository = Repository(path)
+        if not repository.is_supported():
+            return None
+        tags = tuple(sorted(repository.get_tags().items()))
+        return _describe(path, repository.get_head(), tags, match)
+    except (git.GitError, ODBError, OSError, ValueError, KeyError) as ex:
+        logger.debug(f"Can't describe {path} natively: {ex!r}")
+        return None
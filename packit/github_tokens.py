@@ -0,0 +1,179 @@
+"""
+Installation access tokens of the GitHub App.
+
+Creating a token means signing a JWT and an API call which counts against
+the rate limits, while a token is valid for an hour. The tokens are therefore
+cached in memory and optionally on the disk (shared by all the workers) until
+shortly before they expire.
+"""
+import datetime
+import hashlib
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from packit.config import Config
+from packit.exceptions import PackitException
+from packit.utils import atomic_write_json, read_json_cache
+
+logger = logging.getLogger(__name__)
+
+# lifetime of the installation tokens, GitHub doesn't always tell us
+TOKEN_LIFETIME = 60 * 60
+# don't hand out tokens which could expire in the middle of a job
+EXPIRY_MARGIN = 5 * 60
+
+
+class InstallationToken(NamedTuple):
+    token: str
+    # seconds since the epoch
+    expires_at: float
+
+
+class GithubAppTokens:
+    """
+    Installation tokens of GitHub Apps, cached until `margin` seconds before they expire
+
+    With cache_dir, the tokens are stored on the disk as well (readable only
+    by the owner), so all the processes share them.
+    """
+
+    def __init__(
+        self, margin: float = EXPIRY_MARGIN, clock: Callable[[], float] = time.time
+    ) -> None:
+        """
+        :param margin: how long before the expiration a new token is requested [s]
+        :param clock: wall clock, the tokens on the disk are shared by processes
+        """
+        self.margin = margin
+        self.clock = clock
+        self._tokens: Dict[Tuple[str, str], InstallationToken] = {}
+        # one token request per installation at a time, the others wait for it
+        self._installation_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get_token(
+        self,
+        app_id: str,
+        installation_id: str,
+        cert_path: str,
+        cache_dir: str = None,
+    ) -> str:
+        """
+        :param app_id: id of the GitHub App
+        :param installation_id: id of the installation of the app
+        :param cert_path: path to the private key of the app
+        :param cache_dir: directory with the persistent cache (Config.cache_dir)
+        :return: installation access token
+        """
+        key = (str(app_id), str(installation_id))
+        with self._lock:
+            installation_lock = self._installation_locks.setdefault(
+                key, threading.Lock()
+            )
+        with installation_lock:
+            token = self._load(key, cache_dir)
+            if token is not None:
+                return token.token
+            token = self._request_token(app_id, installation_id, cert_path)
+            self._store(key, token, cache_dir)
+            return token.token
+
+    def _is_valid(self, token: Optional[InstallationToken]) -> bool:
+        return token is not None and token.expires_at - self.margin > self.clock()
+
+    def _request_token(
+        self, app_id: str, installation_id: str, cert_path: str
+    ) -> InstallationToken:
+        # PyGithub is imported only when a token is really needed
+        import github
+
+        logger.info("Requesting a new installation token of the GitHub app.")
+        try:
+            private_key = Path(cert_path).read_text()
+            authorization = github.GithubIntegration(
+                app_id, private_key
+            ).get_access_token(installation_id)
+        except (OSError, ValueError, github.GithubException) as ex:
+            raise PackitException(
+                f"Cannot get an installation token of the GitHub app: {ex!r}"
+            ) from ex
+        expires_at = authorization.expires_at
+        if expires_at is None:
+            timestamp = self.clock() + TOKEN_LIFETIME
+        else:
+            if expires_at.tzinfo is None:
+                # older PyGithub returns naive datetimes in UTC
+                expires_at = expires_at.replace(tzinfo=datetime.timezone.utc)
+            timestamp = expires_at.timestamp()
+        return InstallationToken(authorization.token, timestamp)
+
+    @staticmethod
+    def _cache_path(key: Tuple[str, str], cache_dir: Optional[str]) -> Optional[Path]:
+        if not cache_dir:
+            return None
+        digest = hashlib.sha256("/".join(key).encode("utf-8")).hexdigest()
+        return Path(cache_dir) / "github-app-tokens" / f"{digest}.json"
+
+    def _load(
+        self, key: Tuple[str, str], cache_dir: Optional[str]
+    ) -> Optional[InstallationToken]:
+        with self._lock:
+            token = self._tokens.get(key)
+        if self._is_valid(token):
+            return token
+        path = self._cache_path(key, cache_dir)
+        data = read_json_cache(path) if path else None
+        if data is None:
+            return None
+        try:
+            token = InstallationToken(**data)
+        except TypeError:
+            logger.warning(f"Corrupted cache entry {path}, ignoring.")
+            return None
+        if not self._is_valid(token):
+            return None
+        # another worker requested the token recently
+        with self._lock:
+            self._tokens[key] = token
+        return token
+
+    def _store(
+        self, key: Tuple[str, str], token: InstallationToken, cache_dir: Optional[str]
+    ) -> None:
+        with self._lock:
+            self._tokens[key] = token
+        path = self._cache_path(key, cache_dir)
+        if path is not None:
+            # the file is readable only by the owner, the token is a secret
+            atomic_write_json(path, token._asdict())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tokens.clear()
+
+
+github_app_tokens = GithubAppTokens()
+
+
+def get_github_token(config: Config) -> str:
+    """
+    :return: installation token of the GitHub App if it's configured,
+             the configured github token otherwise
+    """
+    if (
+        config.github_app_id
+        and config.github_app_cert_path
+        and config.github_app_installation_id
+    ):
+        logger.debug("Authenticating with Github using a Github app.")
+        return github_app_tokens.get_token(
+            config.github_app_id,
+            config.github_app_installation_id,
+            config.github_app_cert_path,
+            cache_dir=config.cache_dir,
+        )
+    logger.debug("Authenticating with Github using a token.")
+    return config.github_token
@@ -0,0 +1,152 @@
+"""
+A durable journal of received events and their processing state.
+
+Events which were received but not processed (e.g. because the process died)
+can be replayed after a restart, processed events are not processed again.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+RECEIVED = "received"
+DONE = "done"
+FAILED = "failed"
+
+# processed events are kept this long [s] to recognize redelivered messages
+DEFAULT_RETENTION = 7 * 24 * 3600
+# prune the journal after this many processed events
+PRUNE_INTERVAL = 1000
+
+
+class JournalEntry(NamedTuple):
+    msg_id: str
+    topic: str
+    msg: dict
+    state: str
+
+
+class EventJournal:
+    """
+    SQLite-backed journal of events, keyed by the message id
+
+    Processed events are pruned once they are older than `retention`,
+    unfinished and failed events are kept until they are processed.
+    """
+
+    def __init__(
+        self, path: Union[str, Path], retention: float = DEFAULT_RETENTION
+    ) -> None:
+        """
+        :param path: the SQLite database file
+        :param retention: how long [s] processed events are kept
+        """
+        self.path = Path(path)
+        self.retention = retention
+        self._done_since_prune = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # the journal is shared by the consumer and the worker threads
+        self._connection = sqlite3.connect(
+            str(self.path), check_same_thread=False, isolation_level=None
+        )
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=FULL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "msg_id TEXT PRIMARY KEY, "
+                "topic TEXT NOT NULL, "
+                "message TEXT NOT NULL, "
+                "state TEXT NOT NULL, "
+                "received REAL NOT NULL, "
+                "updated REAL NOT NULL, "
+                "error TEXT)"
+            )
+        logger.debug(f"Using event journal {self.path}")
+        self.prune()
+
+    def record(self, msg_id: str, topic: str, msg: dict) -> bool:
+        """
+        Store a newly received event
+
+        :return: True if the event is new, False if we've seen it already
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO events "
+                "(msg_id, topic, message, state, received, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (msg_id, topic, json.dumps(msg), RECEIVED, now, now),
+            )
+        return cursor.rowcount == 1
+
+    def mark_done(self, msg_id: str) -> None:
+        self._set_state(msg_id, DONE)
+        with self._lock:
+            self._done_since_prune += 1
+            prune = self._done_since_prune >= PRUNE_INTERVAL
+        if prune:
+            self.prune()
+
+    def prune(self) -> int:
+        """
+        Delete processed events older than the retention period
+
+        :return: number of deleted events
+        """
+        with self._lock:
+            self._done_since_prune = 0
+            cursor = self._connection.execute(
+                "DELETE FROM events WHERE state = ? AND updated < ?",
+                (DONE, time.time() - self.retention),
+            )
+        if cursor.rowcount:
+            logger.debug(f"Pruned {cursor.rowcount} processed events from the journal.")
+        return cursor.rowcount
+
+    def mark_failed(self, msg_id: str, error: str) -> None:
+        self._set_state(msg_id, FAILED, error=error)
+
+    def get_state(self, msg_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT state FROM events WHERE msg_id = ?", (msg_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def unfinished(self, include_failed: bool = False) -> List[JournalEntry]:
+        """
+        Events which were received but not processed, in the order of arrival
+
+        :param include_failed: also provide events which failed to process
+        """
+        states = (RECEIVED, FAILED) if include_failed else (RECEIVED,)
+        placeholders = ", ".join("?" for _ in states)
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT msg_id, topic, message, state FROM events "
+                f"WHERE state IN ({placeholders}) ORDER BY received",
+                states,
+            ).fetchall()
+        return [
+            JournalEntry(msg_id=msg_id, topic=topic, msg=json.loads(msg), state=state)
+            for msg_id, topic, msg, state in rows
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _set_state(self, msg_id: str, state: str, error: str = None) -> None:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE events SET state = ?, updated = ?, error = ? WHERE msg_id = ?",
+                (state, time.time(), error, msg_id),
+            )
@@ -1,6 +1,7 @@
 import logging
 import os
 import shutil
+from typing import List
 
 import git
 import requests
@@ -46,6 +47,7 @@ class LocalProject:
         path_or_url: str = None,
         offline: bool = False,
         refresh=True,
+        sparse_paths: List[str] = None,
     ) -> None:
         """
 
@@ -62,6 +64,7 @@ class LocalProject:
                                 used as git_url if the it is a request-able url)
         :param offline: bool (do not use any network action, defaults to False)
         :param refresh: bool (calculate the missing attributes, defaults to True)
+        :param sparse_paths: list of str (if we clone the repo, check out only these paths)
         """
 
         self.working_dir_temporary = False
@@ -81,6 +84,7 @@ class LocalProject:
         self.repo_name = repo_name
         self.namespace = namespace
         self.offline = offline
+        self.sparse_paths = sparse_paths
 
         if refresh:
             self.refresh_the_arguments()
@@ -169,7 +173,11 @@ class LocalProject:
                 logger.debug(
                     "we just cloned git repo %s to %s", self.git_url, self.working_dir
                 )
-                self.git_repo = get_repo(url=self.git_url, directory=self.working_dir)
+                self.git_repo = get_repo(
+                    url=self.git_url,
+                    directory=self.working_dir,
+                    sparse_paths=self.sparse_paths,
+                )
                 return True
 
         return False
@@ -214,7 +222,7 @@ class LocalProject:
             and not self.git_repo
             and not self.offline
         ):
-            self.git_repo = get_repo(url=self.git_url)
+            self.git_repo = get_repo(url=self.git_url, sparse_paths=self.sparse_paths)
             self.working_dir_temporary = True
             return True
         return False
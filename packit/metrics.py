@@ -0,0 +1,266 @@
+"""
+A lightweight in-process registry of metrics.
+
+The service exposes the metrics on /metrics in the Prometheus text format,
+the CLI can dump them to a file on exit (`packit --metrics-file FILE ...`).
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], **extra) -> str:
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labels):
+            raise ValueError(
+                f"Metric {self.name} expects labels {self.labels}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError()
+
+    def render(self) -> str:
+        return "\n".join(
+            [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+            + self.samples()
+        )
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {value}"
+            for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (counts per bucket, sum, count)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            counts, total, count = self._values.get(
+                key, ([0] * len(self.buckets), 0.0, 0)
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def get_count(self, **labels: str) -> int:
+        with self._lock:
+            values = self._values.get(self._label_values(labels))
+        return values[2] if values else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(
+                (key, (list(counts), total, count))
+                for key, (counts, total, count) in self._values.items()
+            )
+        lines = []
+        for key, (counts, total, count) in values:
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.labels, key, le=bound)
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            labels = _format_labels(self.labels, key, le="+Inf")
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as {metric.type}")
+            return metric
+
+    def counter(
+        self, name: str, documentation: str, labels: Sequence[str] = ()
+    ) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labels)
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labels)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labels, buckets)
+
+    def render(self) -> str:
+        """ all the metrics in the Prometheus text exposition format """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        return "".join(metric.render() + "\n" for metric in metrics)
+
+    def dump(self, path: Union[str, Path]) -> None:
+        Path(path).write_text(self.render())
+        logger.debug(f"Metrics written to {path}")
+
+
+REGISTRY = Registry()
+
+STAGE_DURATION = REGISTRY.histogram(
+    "packit_stage_duration_seconds",
+    "Time spent in the stages of packit workflows.",
+    labels=["stage"],
+)
+STAGE_FAILURES = REGISTRY.counter(
+    "packit_stage_failures_total", "Stages which raised an exception.", labels=["stage"]
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "packit_cache_requests_total",
+    "Lookups in packit's caches by the result (hit or miss).",
+    labels=["cache", "result"],
+)
+FORGE_API_CALLS = REGISTRY.counter(
+    "packit_forge_api_calls_total",
+    "Calls of the git forge APIs.",
+    labels=["service", "call"],
+)
+COMMAND_DURATION = REGISTRY.histogram(
+    "packit_command_duration_seconds",
+    "Wall time of external commands.",
+    labels=["command"],
+)
+COMMAND_CPU = REGISTRY.counter(
+    "packit_command_cpu_seconds_total",
+    "CPU time (user + system) of external commands.",
+    labels=["command"],
+)
+COMMAND_FAILURES = REGISTRY.counter(
+    "packit_command_failures_total",
+    "External commands which failed or timed out.",
+    labels=["command", "reason"],
+)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """
+    Measure duration of the stage, usable also as a decorator:
+
+        @timed("push")
+        def push_to_fork(...):
+    """
+    start = time.monotonic()
+    try:
+        yield
+    except Exception:
+        STAGE_FAILURES.inc(stage=stage)
+        raise
+    finally:
+        STAGE_DURATION.observe(time.monotonic() - start, stage=stage)
+
+
+def count_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def count_forge_call(project, call: str) -> None:
+    """
+    :param project: ogr project the call is made on, e.g. GithubProject -> "github"
+    :param call: name of the API call
+    """
+    service = type(project).__name__.lower().replace("project", "") or "unknown"
+    FORGE_API_CALLS.inc(service=service, call=call)
+
+
+def observe_command(result) -> None:
+    """
+    :param result: packit.utils.CommandResult
+    """
+    command = os.path.basename(result.cmd[0])
+    COMMAND_DURATION.observe(result.wall_time, command=command)
+    if result.cpu_time is not None:
+        COMMAND_CPU.inc(result.cpu_time, command=command)
+    if result.timed_out:
+        COMMAND_FAILURES.inc(command=command, reason="timeout")
+    elif result.returncode != 0:
+        COMMAND_FAILURES.inc(command=command, reason="exit_code")
@@ -0,0 +1,49 @@
+"""
+Record events received by the bot so that they can be replayed later.
+
+The recording is a file with one JSON document per line:
+{"time": <unix timestamp>, "topic": <fedmsg topic>, "msg": <fedmsg dict>}
+"""
+import json
+import threading
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Union
+
+
+class RecordedEvent(NamedTuple):
+    time: float
+    topic: str
+    msg: dict
+
+
+class EventRecorder:
+    """
+    Append received events to a file
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def record(self, topic: str, msg: dict) -> None:
+        line = json.dumps({"time": time.time(), "topic": topic, "msg": msg})
+        with self._lock:
+            with self.path.open("a") as recording:
+                recording.write(line + "\n")
+
+
+def load_recording(path: Union[str, Path]) -> List[RecordedEvent]:
+    """
+    :return: list of the recorded events sorted by the time of arrival
+    """
+    events = []
+    with Path(path).open() as recording:
+        for line in recording:
+            if not line.strip():
+                continue
+            raw = json.loads(line)
+            events.append(
+                RecordedEvent(time=raw["time"], topic=raw["topic"], msg=raw["msg"])
+            )
+    return sorted(events, key=lambda e: e.time)
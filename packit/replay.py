@@ -0,0 +1,340 @@
+"""
+Replay recorded events to measure how the bot performs.
+
+The functions measured and the services replaced by local stand-ins are
+patched for the duration of the replay, this module is meant to be used
+by `packit replay-events` only.
+"""
+import importlib
+import logging
+import math
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Tuple
+
+from tabulate import tabulate
+
+from packit.dispatcher import Dispatcher
+from packit.exceptions import PackitException
+from packit.recording import RecordedEvent
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """ nearest-rank percentile, pct is in <0; 100> """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(math.ceil(pct / 100 * len(ordered))), 1)
+    return ordered[rank - 1]
+
+
+# stage name -> (object, attribute) which is timed
+DEFAULT_STAGES: Dict[str, Tuple[str, str]] = {
+    "get_config": ("packit.bot_api", "get_packit_config_from_repo"),
+    "checkout_release": ("packit.upstream.Upstream", "checkout_release"),
+    "checkout_pr": ("packit.upstream.Upstream", "checkout_pr"),
+    "create_patches": ("packit.upstream.Upstream", "create_patches"),
+    "update_branch": ("packit.distgit.DistGit", "update_branch"),
+    "sync_files": ("packit.distgit.DistGit", "sync_files"),
+    "lookaside_check": ("packit.distgit.DistGit", "is_archive_in_lookaside_cache"),
+    "download_archive": ("packit.distgit.DistGit", "download_upstream_archive"),
+    "upload_archive": ("packit.distgit.DistGit", "upload_to_lookaside_cache"),
+    "commit": ("packit.distgit.DistGit", "commit"),
+    "push": ("packit.distgit.DistGit", "push_to_fork"),
+    "create_pull": ("packit.distgit.DistGit", "create_pull"),
+}
+
+
+def _patch(stack: ExitStack, obj: Any, attr: str, replacement: Any) -> None:
+    """ set obj.attr to replacement, the original is restored when the stack is closed """
+    missing = object()
+    # take it from __dict__: getattr would give us an inherited or a bound attribute
+    original = vars(obj).get(attr, missing)
+    setattr(obj, attr, replacement)
+    if original is missing:
+        stack.callback(delattr, obj, attr)
+    else:
+        stack.callback(setattr, obj, attr, original)
+
+
+def _resolve(target: str) -> Any:
+    """ "packit.distgit.DistGit" -> the DistGit class, "packit.bot_api" -> the module """
+    try:
+        return importlib.import_module(target)
+    except ImportError:
+        module_name, _, attr = target.rpartition(".")
+        return getattr(importlib.import_module(module_name), attr)
+
+
+class StageTimer:
+    """
+    Measure time spent in the selected functions while the context is active
+    """
+
+    def __init__(self, stages: Dict[str, Tuple[str, str]] = None) -> None:
+        self.stages = DEFAULT_STAGES if stages is None else stages
+        self.durations: Dict[str, List[float]] = {name: [] for name in self.stages}
+        self._lock = threading.Lock()
+        self._stack = ExitStack()
+
+    def _timed(self, name: str, func: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            start = time.monotonic()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.durations[name].append(time.monotonic() - start)
+
+        return wrapper
+
+    def __enter__(self) -> "StageTimer":
+        for name, (target, attr) in self.stages.items():
+            obj = _resolve(target)
+            _patch(self._stack, obj, attr, self._timed(name, getattr(obj, attr)))
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stack.close()
+
+
+class ReplayReport(NamedTuple):
+    events: int
+    failures: int
+    wall_time: float
+    latencies: List[float]
+    stages: Dict[str, List[float]]
+
+    @property
+    def throughput(self) -> float:
+        """ processed events per second """
+        return self.events / self.wall_time if self.wall_time else 0.0
+
+    def format(self) -> str:
+        summary = [
+            ["events", self.events],
+            ["failures", self.failures],
+            ["wall time [s]", f"{self.wall_time:.3f}"],
+            ["throughput [events/s]", f"{self.throughput:.3f}"],
+        ] + [
+            [f"latency p{pct} [s]", f"{percentile(self.latencies, pct):.3f}"]
+            for pct in (50, 90, 99, 100)
+        ]
+        stages = [
+            [
+                name,
+                len(durations),
+                f"{sum(durations):.3f}",
+                f"{sum(durations) / len(durations):.3f}",
+                f"{percentile(durations, 90):.3f}",
+            ]
+            for name, durations in self.stages.items()
+            if durations
+        ]
+        return (
+            tabulate(summary, tablefmt="plain")
+            + "\n\n"
+            + tabulate(
+                stages, headers=["Stage", "Calls", "Total [s]", "Mean [s]", "p90 [s]"]
+            )
+        )
+
+
+class EventReplayer:
+    """
+    Feed recorded events into the dispatcher preserving (scaled) gaps between them
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        speedup: float = 1.0,
+        stages: Dict[str, Tuple[str, str]] = None,
+    ) -> None:
+        """
+        :param dispatcher: dispatcher with handlers for the recorded topics
+        :param speedup: replay this many times faster than recorded, 0 = no delays
+        :param stages: functions to measure, defaults to DEFAULT_STAGES
+        """
+        self.dispatcher = dispatcher
+        self.speedup = speedup
+        self.stages = stages
+
+    def replay(self, events: List[RecordedEvent]) -> ReplayReport:
+        latencies: List[float] = []
+        failures = []
+        futures = []
+
+        def done(future: Future, scheduled: float) -> None:
+            # latency = time since the event "arrived", includes waiting for a worker
+            latencies.append(time.monotonic() - scheduled)
+            if future.exception():
+                failures.append(future.exception())
+
+        with StageTimer(self.stages) as timer:
+            start = time.monotonic()
+            first = events[0].time if events else 0.0
+            for event in events:
+                if self.speedup:
+                    scheduled = start + (event.time - first) / self.speedup
+                    time.sleep(max(scheduled - time.monotonic(), 0))
+                else:
+                    scheduled = time.monotonic()
+                future = self.dispatcher.dispatch(event.topic, event.msg)
+                if future is None:
+                    continue
+                future.add_done_callback(lambda f, s=scheduled: done(f, s))
+                futures.append(future)
+            # waits also for the done callbacks, unlike concurrent.futures.wait
+            self.dispatcher.shutdown(wait=True)
+            wall_time = time.monotonic() - start
+
+        return ReplayReport(
+            events=len(futures),
+            failures=len(failures),
+            wall_time=wall_time,
+            latencies=latencies,
+            stages=timer.durations,
+        )
+
+
+class StandInProject:
+    """
+    Local stand-in for an ogr project (GitHub or Pagure) backed by a local repo
+    """
+
+    def __init__(self, repo: str = "", namespace: str = "", git_url: str = ""):
+        self.repo = repo
+        self.namespace = namespace
+        self.git_url = git_url
+        self.is_fork = False
+        self.parent = None
+        self.pull_requests: List[dict] = []
+
+    @property
+    def full_repo_name(self) -> str:
+        return f"{self.namespace}/{self.repo}"
+
+    def get_git_urls(self) -> Dict[str, str]:
+        return {"git": self.git_url, "ssh": self.git_url}
+
+    def get_fork(self, create: bool = True) -> "StandInProject":
+        return self
+
+    def fork_create(self) -> None:
+        pass
+
+    def change_token(self, token: str) -> None:
+        pass
+
+    def pr_create(self, title: str, body: str, source_branch: str, target_branch: str):
+        self.pull_requests.append(
+            {"title": title, "source": source_branch, "target": target_branch}
+        )
+        return SimpleNamespace(url=f"stand-in://{self.full_repo_name}/pr/1")
+
+
+@contextmanager
+def local_stand_ins(upstream_path: str, dist_git_path: str) -> Iterator[None]:
+    """
+    Replace GitHub, Pagure, the lookaside cache and Koji with local stand-ins
+
+    Every event works in fresh clones of the local upstream and dist-git
+    repositories, the same way the bot clones the remote repositories.
+
+    :param upstream_path: path to a local upstream git repo with a packit config
+    :param dist_git_path: path to a local dist-git repo
+    """
+    from packit.config import get_local_package_config
+    from packit.distgit import DistGit
+    from packit.upstream import Upstream
+    from packit.utils import run_command
+
+    workdirs: List[str] = []
+    lookaside: set = set()
+    lock = threading.Lock()
+
+    def get_config(sourcegit_project, ref):
+        workdir = tempfile.mkdtemp(prefix="packit-replay-")
+        with lock:
+            workdirs.append(workdir)
+        upstream = str(Path(workdir) / "upstream")
+        dist_git = str(Path(workdir) / "dist-git")
+        run_command(["git", "clone", "-q", upstream_path, upstream])
+        run_command(["git", "clone", "-q", dist_git_path, dist_git])
+        package_config = get_local_package_config(upstream)
+        # we need to be able to parse namespace and repo name from the upstream URL
+        run_command(
+            [
+                "git",
+                "remote",
+                "set-url",
+                "origin",
+                f"https://github.com/stand-in/{package_config.downstream_package_name}",
+            ],
+            cwd=upstream,
+        )
+        package_config.upstream_project_url = upstream
+        package_config.downstream_project_url = dist_git
+        return package_config
+
+    def get_project(service, repo=None, namespace=None, **_):
+        return StandInProject(repo=repo, namespace=namespace)
+
+    def checkout_pr(up, pr_id):
+        # there are no pull request refs in the local repo: use the current HEAD
+        head = up.local_project.git_repo.create_head(f"pull/{pr_id}")
+        head.checkout()
+
+    def is_archive_in_lookaside_cache(dg, archive_path):
+        with lock:
+            return Path(archive_path).name in lookaside
+
+    def upload_to_lookaside_cache(dg, archive_path):
+        with lock:
+            lookaside.add(Path(archive_path).name)
+
+    def download_upstream_archive(dg):
+        archive = Path(dg.local_project.working_dir) / dg.upstream_archive_name
+        archive.write_text("stand-in archive\n")
+        return str(archive)
+
+    patches = [
+        ("packit.bot_api", "get_packit_config_from_repo", get_config),
+        ("ogr.services.github.GithubService", "get_project", get_project),
+        ("ogr.services.pagure.PagureService", "get_project", get_project),
+        (DistGit, "is_archive_in_lookaside_cache", is_archive_in_lookaside_cache),
+        (DistGit, "upload_to_lookaside_cache", upload_to_lookaside_cache),
+        (DistGit, "download_upstream_archive", download_upstream_archive),
+        (DistGit, "push_to_fork", lambda dg, *args, **kwargs: None),
+        # koji
+        (DistGit, "build", lambda dg, scratch=False: None),
+        (Upstream, "checkout_pr", checkout_pr),
+        (Upstream, "get_latest_released_version", lambda up: up.get_specfile_version()),
+    ]
+    with ExitStack() as stack:
+        for target, attr, replacement in patches:
+            obj = _resolve(target) if isinstance(target, str) else target
+            _patch(stack, obj, attr, replacement)
+        try:
+            yield
+        finally:
+            for workdir in workdirs:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+
+def check_recording(events: List[RecordedEvent], dispatcher: Dispatcher) -> None:
+    """ fail early if the recording contains events nobody can process """
+    unknown = {e.topic for e in events if dispatcher.route(e.topic) is None}
+    if unknown:
+        raise PackitException(
+            f"No handlers for these recorded topics: {', '.join(sorted(unknown))}"
+        )
@@ -0,0 +1,203 @@
+"""
+Cheap checks of incoming webhooks, done before anything is enqueued.
+
+* the payload has to be signed with the shared secret (X-Hub-Signature-256)
+* deliveries which GitHub retries (same X-GitHub-Delivery) are processed once
+* every repository can trigger at most `burst` jobs at once,
+  refilled at `rate` jobs per second (token bucket)
+"""
+import hmac
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+Clock = Callable[[], float]
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """
+    Check the signature of the webhook payload
+
+    :param secret: the secret shared with the sender
+    :param body: raw request body
+    :param signature: value of X-Hub-Signature-256 ("sha256=...")
+                      or X-Hub-Signature ("sha1=...")
+    """
+    if not signature or "=" not in signature:
+        return False
+    algorithm, _, digest = signature.partition("=")
+    if algorithm not in ("sha256", "sha1"):
+        return False
+    expected = hmac.new(secret.encode(), body, algorithm).hexdigest()
+    return hmac.compare_digest(expected, digest)
+
+
+class DeliveryCache:
+    """
+    Ids of the deliveries seen in the last `ttl` seconds
+    """
+
+    def __init__(
+        self, ttl: float = 3600, max_size: int = 100_000, clock: Clock = time.monotonic
+    ) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        # delivery id -> expiration, ordered by the expiration
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, delivery_id: str) -> bool:
+        """
+        :return: True if the delivery is new, False if we've seen it already
+        """
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            if delivery_id in self._seen:
+                return False
+            self._seen[delivery_id] = now + self.ttl
+            if len(self._seen) > self.max_size:
+                self._seen.popitem(last=False)
+            return True
+
+    def discard(self, delivery_id: str) -> None:
+        """ forget the delivery, e.g. when it was not processed after all """
+        with self._lock:
+            self._seen.pop(delivery_id, None)
+
+    def _expire(self, now: float) -> None:
+        while self._seen:
+            delivery_id, expiration = next(iter(self._seen.items()))
+            if expiration > now:
+                break
+            del self._seen[delivery_id]
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int, clock: Clock = time.monotonic) -> None:
+        """
+        :param rate: tokens added per second
+        :param burst: maximum number of tokens
+        """
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+
+    def take(self) -> bool:
+        """
+        :return: True if there was a token to take
+        """
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    @property
+    def full(self) -> bool:
+        elapsed = self.clock() - self.updated
+        return self.tokens + elapsed * self.rate >= self.burst
+
+
+class RateLimiter:
+    """
+    A token bucket per key (repository)
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        max_keys: int = 10_000,
+        clock: Clock = time.monotonic,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> bool:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._forget_full_buckets()
+                bucket = self._buckets[key] = TokenBucket(
+                    rate=self.rate, burst=self.burst, clock=self.clock
+                )
+            return bucket.take()
+
+    def _forget_full_buckets(self) -> None:
+        # a full bucket is the same as a new one
+        for key in [key for key, bucket in self._buckets.items() if bucket.full]:
+            del self._buckets[key]
+
+
+class Rejection(Exception):
+    """ the webhook should not be processed """
+
+    def __init__(self, message: str, status: int) -> None:
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class WebhookIngestion:
+    """
+    Checks done for every webhook before a job is enqueued
+    """
+
+    def __init__(
+        self,
+        secret: str = None,
+        delivery_ttl: float = 3600,
+        rate: float = 10 / 60,
+        burst: int = 10,
+        clock: Clock = time.monotonic,
+    ) -> None:
+        """
+        :param secret: webhook secret, signatures are not checked if not set
+        :param delivery_ttl: how long [s] we remember the delivery ids
+        :param rate: jobs per second a repository can trigger in the long run
+        :param burst: jobs a repository can trigger at once
+        """
+        self.secret = secret
+        if not secret:
+            logger.warning("Webhook secret is not set, signatures are not checked.")
+        self.deliveries = DeliveryCache(ttl=delivery_ttl, clock=clock)
+        self.rate_limiter = RateLimiter(rate=rate, burst=burst, clock=clock)
+
+    def check_signature(self, body: bytes, signature: Optional[str]) -> None:
+        """
+        :raises Rejection: the signature is missing or wrong
+        """
+        if self.secret and not verify_signature(self.secret, body, signature):
+            raise Rejection("Invalid signature.", 401)
+
+    def admit(self, delivery_id: Optional[str], repository: str) -> None:
+        """
+        Admit the delivery for processing
+
+        :raises Rejection: the delivery is a duplicate or the repository
+                           sends too many events
+        """
+        if delivery_id and not self.deliveries.add(delivery_id):
+            logger.info(f"Delivery {delivery_id} was already processed, skipping.")
+            raise Rejection(f"Delivery {delivery_id} already accepted.", 200)
+        if not self.rate_limiter.allow(repository):
+            logger.warning(f"Rate limit exceeded for {repository}.")
+            if delivery_id:
+                # let the retried delivery in once the repository calms down
+                self.deliveries.discard(delivery_id)
+            raise Rejection(f"Too many events for {repository}.", 429)
@@ -0,0 +1,150 @@
+"""
+Jobs accepted by the service and processed in the background.
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from packit.metrics import REGISTRY
+from packit.service.logs import JobLogBuffer, JobLogRouter, get_log_router
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+
+JOBS = REGISTRY.counter(
+    "packit_jobs_total", "Jobs processed by the service.", labels=["state"]
+)
+JOBS_QUEUED = REGISTRY.gauge("packit_jobs_queued", "Jobs waiting for a worker.")
+JOBS_RUNNING = REGISTRY.gauge("packit_jobs_running", "Jobs being processed.")
+WORKERS = REGISTRY.gauge("packit_workers", "Workers available to process jobs.")
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+class Job:
+    """
+    A unit of work: a function call and its state
+    """
+
+    def __init__(
+        self, name: str, func: Callable, *args, job_id: str = None, **kwargs
+    ) -> None:
+        self.id = job_id or new_job_id()
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.state = QUEUED
+        self.error: Optional[str] = None
+        self.created: float = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.log_buffer: Optional[JobLogBuffer] = None
+
+    @property
+    def logs(self) -> str:
+        return self.log_buffer.getvalue() if self.log_buffer else ""
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "state": self.state,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "logs": self.logs,
+        }
+
+
+class JobQueue:
+    """
+    Run jobs in a pool of workers and keep track of them
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        keep_finished: int = 1000,
+        log_router: JobLogRouter = None,
+    ) -> None:
+        """
+        :param workers: number of jobs running in parallel
+        :param keep_finished: how many finished jobs we remember
+        :param log_router: captures logs of the jobs, defaults to the shared one
+        """
+        self.workers = workers
+        self.keep_finished = keep_finished
+        self.log_router = log_router or get_log_router()
+        WORKERS.inc(workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="packit-job"
+        )
+        self._jobs: Dict[str, Job] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(
+        self, name: str, func: Callable, *args, job_id: str = None, **kwargs
+    ) -> Job:
+        """
+        Enqueue func(*args, **kwargs)
+
+        :param job_id: id of the job, logs already captured for it are kept
+        :return: the job, it is queued
+        """
+        job = Job(name, func, *args, job_id=job_id, **kwargs)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._forget_old_jobs()
+        logger.info(f"Job {job.id} accepted: {name}")
+        JOBS_QUEUED.inc()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+        WORKERS.dec(self.workers)
+
+    def _run(self, job: Job) -> None:
+        JOBS_QUEUED.dec()
+        JOBS_RUNNING.inc()
+        job.state = RUNNING
+        job.started = time.time()
+        with self.log_router.capture(job.id) as log_buffer:
+            job.log_buffer = log_buffer
+            try:
+                job.func(*job.args, **job.kwargs)
+                job.state = FINISHED
+            except Exception as ex:
+                logger.error(f"Job {job.id} failed: {ex!r}")
+                job.error = repr(ex)
+                job.state = FAILED
+            finally:
+                job.finished = time.time()
+                JOBS_RUNNING.dec()
+                JOBS.inc(state=job.state)
+
+    def _forget_old_jobs(self) -> None:
+        finished = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.state in (FINISHED, FAILED)
+        ]
+        for job_id in finished[: max(len(finished) - self.keep_finished, 0)]:
+            del self._jobs[job_id]
+            self.log_router.discard(job_id)
@@ -0,0 +1,148 @@
+"""
+Capture logs of the individual jobs.
+
+A single handler is installed on the root logger; it routes every record
+to the buffer of the job which is active in the current context.
+"""
+import logging
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Deque, Dict, Iterator, Optional
+
+current_job_id: ContextVar[Optional[str]] = ContextVar("current_job_id", default=None)
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class JobLogBuffer:
+    """
+    Logs of a single job, at most `max_bytes` are kept in memory
+
+    If `spill_path` is set, logs which don't fit into memory are written there,
+    otherwise the oldest lines are dropped.
+    """
+
+    def __init__(self, max_bytes: int = 1024 * 1024, spill_path: Path = None) -> None:
+        self.max_bytes = max_bytes
+        self.spill_path = Path(spill_path) if spill_path else None
+        self.spilled = False
+        self.dropped_lines = 0
+        self._lines: Deque[str] = deque()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def write(self, line: str) -> None:
+        with self._lock:
+            self._lines.append(line)
+            self._size += len(line)
+            if self._size > self.max_bytes:
+                if self.spill_path:
+                    self._spill()
+                else:
+                    self._drop()
+
+    def getvalue(self) -> str:
+        with self._lock:
+            memory = "".join(self._lines)
+            if self.spilled:
+                return self.spill_path.read_text() + memory
+            if self.dropped_lines:
+                return f"[... {self.dropped_lines} lines dropped ...]\n" + memory
+            return memory
+
+    def _spill(self) -> None:
+        with self.spill_path.open("a") as spill_file:
+            spill_file.writelines(self._lines)
+        self.spilled = True
+        self._lines.clear()
+        self._size = 0
+
+    def _drop(self) -> None:
+        while self._size > self.max_bytes and len(self._lines) > 1:
+            self._size -= len(self._lines.popleft())
+            self.dropped_lines += 1
+
+
+class JobLogRouter(logging.Handler):
+    """
+    Route log records to the buffer of the job running in the current context
+    """
+
+    def __init__(
+        self,
+        level: int = logging.INFO,
+        max_bytes: int = 1024 * 1024,
+        spill_dir: str = None,
+    ) -> None:
+        """
+        :param level: records below this level are not captured
+        :param max_bytes: how much of the logs of a single job is kept in memory
+        :param spill_dir: directory to write logs which don't fit into memory
+        """
+        super().__init__(level=level)
+        self.max_bytes = max_bytes
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self._buffers: Dict[str, JobLogBuffer] = {}
+        self.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    def emit(self, record: logging.LogRecord) -> None:
+        job_id = current_job_id.get()
+        if job_id is None:
+            return
+        buffer = self._buffers.get(job_id)
+        if buffer is None:
+            return
+        try:
+            buffer.write(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
+    @contextmanager
+    def capture(self, job_id: str) -> Iterator[JobLogBuffer]:
+        """
+        Capture logs emitted in the current context into a buffer for the job
+
+        The buffer stays available after the context ends, call `discard` to drop it.
+        Capturing the same job id again (e.g. first the request, then the job)
+        continues in the same buffer.
+        """
+        spill_path = None
+        if self.spill_dir:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            spill_path = self.spill_dir / f"{job_id}.log"
+        buffer = self._buffers.setdefault(
+            job_id, JobLogBuffer(max_bytes=self.max_bytes, spill_path=spill_path)
+        )
+        token = current_job_id.set(job_id)
+        try:
+            yield buffer
+        finally:
+            current_job_id.reset(token)
+
+    def discard(self, job_id: str) -> None:
+        """ forget the logs of the job """
+        buffer = self._buffers.pop(job_id, None)
+        if buffer and buffer.spilled:
+            buffer.spill_path.unlink()
+
+
+_router: Optional[JobLogRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_log_router() -> JobLogRouter:
+    """
+    Provide the shared router, install it on the root logger on the first call
+
+    Logs which don't fit into memory are written to $PACKIT_JOB_LOG_DIR if set.
+    """
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = JobLogRouter(spill_dir=os.getenv("PACKIT_JOB_LOG_DIR"))
+            logging.getLogger().addHandler(_router)
+        return _router
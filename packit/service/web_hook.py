@@ -1,39 +1,110 @@
-from flask import Flask, request
+from flask import Flask, Response, request, jsonify, url_for
 import logging
-from io import StringIO
+import os
 
-from packit.config import Config
+from packit.config import SharedConfig
 from packit.bot_api import PackitBotAPI
+from packit.constants import GH2FED_RELEASE_TOPIC
+from packit.metrics import REGISTRY
+from packit.recording import EventRecorder
+from packit.service.ingestion import Rejection, WebhookIngestion
+from packit.service.jobs import JobQueue, new_job_id
 
 app = Flask(__name__)
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
+# capture the received payloads for `packit replay-events`
+recording_path = os.getenv("PACKIT_EVENT_RECORDING")
+recorder = EventRecorder(recording_path) if recording_path else None
+
+# shared by all the jobs, reloaded when the config file changes
+config = SharedConfig()
+
+jobs = JobQueue(workers=int(os.getenv("PACKIT_SERVICE_WORKERS", "2")))
+
+ingestion = WebhookIngestion(
+    secret=os.getenv("PACKIT_WEBHOOK_SECRET"),
+    # every repository can trigger 10 jobs at once and then one job per minute
+    rate=float(os.getenv("PACKIT_WEBHOOK_RATE", 1 / 60)),
+    burst=int(os.getenv("PACKIT_WEBHOOK_BURST", "10")),
+)
+
+
+def sync_release(msg: dict):
+    api = PackitBotAPI(config.get())
+    # Using fedmsg since the fields are the same
+    api.sync_upstream_release_with_fedmsg({"msg": msg})
+
 
 @app.route("/github_release", methods=["POST"])
 def github_release():
-    msg = request.get_json()
+    job_id = new_job_id()
+    # logs emitted while handling the request become part of the job's logs
+    with jobs.log_router.capture(job_id):
+        response, status = accept_release(job_id)
+    if not jobs.get(job_id):
+        # rejected or ignored, there is no job to keep the logs for
+        jobs.log_router.discard(job_id)
+    return response, status
 
-    buffer = StringIO()
-    logHandler = logging.StreamHandler(buffer)
-    logHandler.setLevel(logging.INFO)
-    formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    )
-    logHandler.setFormatter(formatter)
-    logger.addHandler(logHandler)
 
-    logger.debug(
-        f"Received release event: "
-        f"{msg['repository']['owner']}/{msg['repository']['name']} - {msg['release']['tag_name']}"
+def accept_release(job_id: str):
+    try:
+        ingestion.check_signature(
+            request.get_data(),
+            request.headers.get("X-Hub-Signature-256")
+            or request.headers.get("X-Hub-Signature"),
+        )
+    except Rejection as ex:
+        return jsonify({"error": ex.message}), ex.status
+
+    event = request.headers.get("X-GitHub-Event")
+    if event != "release":
+        return jsonify({"error": f"Not a github release event: {event}."}), 400
+
+    msg = request.get_json(silent=True)
+    action = msg.get("action") if isinstance(msg, dict) else None
+    if action != "published":
+        logger.debug(f"Ignoring release event with action {action!r}.")
+        return jsonify({"message": f"Release action {action!r} ignored."}), 202
+
+    try:
+        full_name = (
+            f"{msg['repository']['owner']['login']}/{msg['repository']['name']}"
+        )
+        tag_name = msg["release"]["tag_name"]
+    except (KeyError, TypeError):
+        return jsonify({"error": "Not a github release event."}), 400
+
+    logger.debug(f"Received release event: {full_name} - {tag_name}")
+
+    try:
+        ingestion.admit(request.headers.get("X-GitHub-Delivery"), full_name)
+    except Rejection as ex:
+        key = "error" if ex.status >= 400 else "message"
+        return jsonify({key: ex.message}), ex.status
+
+    if recorder:
+        recorder.record(GH2FED_RELEASE_TOPIC, {"msg": msg})
+
+    job = jobs.submit(
+        f"release {full_name} {tag_name}", sync_release, msg, job_id=job_id
+    )
+    return (
+        jsonify({"job_id": job.id, "url": url_for("job_status", job_id=job.id)}),
+        202,
     )
 
-    config = Config()
-    api = PackitBotAPI(config)
-    # Using fedmsg since the fields are the same
-    api.sync_upstream_release_with_fedmsg({"msg": msg})
 
-    logger.removeHandler(logHandler)
-    buffer.flush()
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": f"Job {job_id} not found."}), 404
+    return jsonify(job.to_dict())
+
 
-    return buffer.getvalue()
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
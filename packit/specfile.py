@@ -0,0 +1,694 @@
+"""
+A lightweight model of a spec file.
+
+The spec is tokenized once into sections and tags; every tag knows where its value
+is in the content, so it can be changed in place without touching the rest of the file.
+Macros are expanded only when asked to, natively with the macros defined in the spec
+or, if requested, by rpm itself.
+"""
+import datetime
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import (
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import requests
+
+from packit import metrics
+from packit.exceptions import PackitException
+from packit.utils import (
+    atomic_write,
+    atomic_write_json,
+    read_json_cache,
+    run_command,
+)
+
+logger = logging.getLogger(__name__)
+
+# name of the section with the tags of the main package
+PREAMBLE = "%package"
+
+SECTION_RE = re.compile(
+    r"^%(package|description|prep|generate_buildrequires|conf|build|install|check"
+    r"|clean|files|changelog|pretrans|pre|posttrans|post|preun|postun|verifyscript"
+    r"|triggerprein|triggerin|triggerun|triggerpostun|filetriggerin|filetriggerun"
+    r"|filetriggerpostun|transfiletriggerin|transfiletriggerun|transfiletriggerpostun"
+    r"|sourcelist|patchlist)(?=\s|$)(.*)$"
+)
+TAG_RE = re.compile(
+    r"^(?P<name>[A-Za-z][A-Za-z0-9]*(?:\([^)]*\))?)[ \t]*:[ \t]*(?P<value>.*?)[ \t]*$"
+)
+MACRO_DEFINITION_RE = re.compile(
+    r"^%(?:global|define)[ \t]+(?P<name>\w+)[ \t]+(?P<body>.*?)[ \t]*$"
+)
+MACRO_RE = re.compile(
+    r"%%|%\{(?P<flags>[?!]*)(?P<name>\w+)(?::(?P<alternative>[^{}]*))?\}"
+    r"|%(?P<bare>[A-Za-z_]\w*)"
+)
+# the tags which rpm defines as macros
+TAG_MACROS = ("name", "version", "release", "epoch", "summary", "url")
+# what's left of macros, shell and expression expansions
+UNEXPANDED_RE = re.compile(r"%[{(\[]")
+# rpm refuses localized names of days and months in %changelog
+DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun")
+MONTHS += ("Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+MAX_EXPANSION_DEPTH = 64
+
+# (start, end, replacement) -- content[start:end] is replaced
+Edit = Tuple[int, int, str]
+# the file changed on the disk when any of these changed
+FileStat = Tuple[int, int, int, int]
+# (entry, author, evr, date)
+ChangelogEntry = Tuple[str, str, Optional[str], Optional[datetime.date]]
+
+
+class Section(NamedTuple):
+    # e.g. "%package" (the preamble), "%description devel", "%changelog"
+    name: str
+    # offset of the line with the section header (0 for the preamble)
+    start: int
+    # offset of the first line after the header
+    body_start: int
+    # offset of the header of the next section (or the end of the content)
+    end: int
+
+
+class Tag(NamedTuple):
+    # as written in the spec, e.g. "Source0" or "Requires(post)"
+    name: str
+    # raw value, macros are not expanded
+    value: str
+    # name of the section the tag is in
+    section: str
+    # offsets of the value in the content
+    start: int
+    end: int
+
+
+class Specfile:
+    """
+    Spec file tokenized into sections, tags and macro definitions.
+
+    Reading and changing the content doesn't run anything,
+    nothing is written to the disk until save() is called
+    or a transaction() ends.
+    """
+
+    def __init__(self, path: str, content: str = None):
+        self.path = path
+        self._stat: Optional[FileStat] = None
+        if content is None:
+            self._stat = self._get_stat()
+            content = Path(path).read_text()
+        self.content = content
+        self.sections: List[Section] = []
+        self.tags: List[Tag] = []
+        self.macros: Dict[str, str] = {}
+        self._parse()
+
+    def __repr__(self):
+        return f"Specfile(path={self.path!r})"
+
+    def _get_stat(self) -> Optional[FileStat]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns
+
+    def refresh(self) -> None:
+        """ load the spec again if the file was changed on the disk in the meantime """
+        if self._stat is None:
+            return
+        stat = self._get_stat()
+        if stat is not None and stat != self._stat:
+            logger.debug(f"{self.path} was changed on the disk, loading it again.")
+            self._stat = stat
+            self.content = Path(self.path).read_text()
+            self._parse()
+
+    def _parse(self) -> None:
+        """ tokenize the content into sections, tags and macro definitions """
+        sections, tags, macros = [], [], {}
+        name, start, body_start = PREAMBLE, 0, 0
+        offset = 0
+        for line in self.content.splitlines(keepends=True):
+            text = line.rstrip("\r\n")
+            header = SECTION_RE.match(text)
+            if header:
+                sections.append(Section(name, start, body_start, offset))
+                name = f"%{header.group(1)} {header.group(2).strip()}".strip()
+                start, body_start = offset, offset + len(line)
+            elif name.startswith(PREAMBLE) and not text.startswith("#"):
+                tag = TAG_RE.match(text)
+                if tag:
+                    tags.append(
+                        Tag(
+                            name=tag.group("name"),
+                            value=tag.group("value"),
+                            section=name,
+                            start=offset + tag.start("value"),
+                            end=offset + tag.end("value"),
+                        )
+                    )
+            definition = MACRO_DEFINITION_RE.match(text.lstrip())
+            if definition:
+                # conditionals are not evaluated, the last definition wins
+                macros[definition.group("name")] = definition.group("body")
+            offset += len(line)
+        sections.append(Section(name, start, body_start, offset))
+        self.sections, self.tags, self.macros = sections, tags, macros
+
+    def get_section(self, name: str) -> Optional[Section]:
+        for section in self.sections:
+            if section.name == name:
+                return section
+        return None
+
+    def get_section_content(self, name: str) -> Optional[str]:
+        section = self.get_section(name)
+        if section is None:
+            return None
+        start, end = section.body_start, section.end
+        return self.content[start:end]
+
+    def get_tag(self, name: str, section: str = PREAMBLE) -> Optional[Tag]:
+        """ tag names are case insensitive, the same as for rpm """
+        name = name.lower()
+        for tag in self.tags:
+            if tag.section == section and tag.name.lower() == name:
+                return tag
+        return None
+
+    def _get_tags(self, prefix: str) -> List[Tag]:
+        pattern = re.compile(rf"{prefix}\d*", re.IGNORECASE)
+        return [
+            tag
+            for tag in self.tags
+            if tag.section == PREAMBLE and pattern.fullmatch(tag.name)
+        ]
+
+    @property
+    def sources(self) -> List[Tag]:
+        return self._get_tags("source")
+
+    @property
+    def patches(self) -> List[Tag]:
+        return self._get_tags("patch")
+
+    @property
+    def version(self) -> Optional[str]:
+        tag = self.get_tag("Version")
+        return tag.value if tag else None
+
+    @version.setter
+    def version(self, value: str) -> None:
+        self.set_tag("Version", value)
+
+    @property
+    def release(self) -> Optional[str]:
+        tag = self.get_tag("Release")
+        return tag.value if tag else None
+
+    @release.setter
+    def release(self, value: str) -> None:
+        self.set_tag("Release", value)
+
+    @property
+    def changelog(self) -> List[str]:
+        """ entries of %changelog, the newest first """
+        entries: List[List[str]] = []
+        for line in (self.get_section_content("%changelog") or "").splitlines():
+            if line.startswith("*"):
+                entries.append([line])
+            elif entries:
+                entries[-1].append(line)
+        return ["\n".join(entry).strip() for entry in entries]
+
+    def get_version(self) -> str:
+        """ version with the macros expanded """
+        return self.expand(self.version or "")
+
+    def get_archive(self) -> str:
+        """
+        :return: name of the archive (Source0), e.g. sen-0.6.1.tar.gz
+        """
+        source = self.get_tag("Source0") or self.get_tag("Source")
+        if source is None:
+            raise PackitException(f"There is no Source0 in {self.path}.")
+        return self._get_source_file_name(self.expand(source.value))
+
+    @staticmethod
+    def _get_source_file_name(source: str) -> str:
+        # spectool and packit respect the name after #/ in the URL
+        _, _, fragment = source.partition("#/")
+        return fragment or os.path.basename(source)
+
+    def _get_macros(self) -> Dict[str, str]:
+        macros = dict(self.macros)
+        for name in TAG_MACROS:
+            tag = self.get_tag(name)
+            if tag is not None:
+                macros[name] = tag.value
+        return macros
+
+    def expand(self, text: str, use_rpm: bool = False) -> str:
+        """
+        Expand the macros in the text.
+
+        Natively, only the macros defined in the spec and the tags rpm defines as macros
+        (name, version, url, ...) are expanded and conditionals on undefined macros
+        expand to nothing. If anything else is left (e.g. %{pypi_source}), rpm is asked.
+
+        :param use_rpm: expand the macros by rpm right away (macros from the system
+                        and all macro constructs are available)
+        :raises PackitException: when the macros can't be expanded
+        """
+        macros = self._get_macros()
+        if not use_rpm:
+            expanded = self._expand(text, macros, depth=0)
+            if not UNEXPANDED_RE.search(expanded.replace("%%", "")):
+                return expanded.replace("%%", "%")
+            logger.debug(f"Expanding {text!r} by rpm, it uses other than spec macros.")
+
+        cmd = ["rpm"]
+        for name, body in macros.items():
+            cmd += ["--define", f"{name} {body}"]
+        try:
+            expanded = run_command(cmd + ["--eval", text], output=True).rstrip("\n")
+        except (PackitException, OSError) as ex:
+            raise PackitException(f"Cannot expand {text!r} by rpm: {ex!r}") from ex
+        # rpm leaves the unknown macros as they are
+        if UNEXPANDED_RE.search(expanded.replace("%%", "")):
+            raise PackitException(
+                f"Cannot expand {text!r}, {expanded!r} contains unknown macros."
+            )
+        return expanded
+
+    def _expand(self, text: str, macros: Dict[str, str], depth: int) -> str:
+        if depth > MAX_EXPANSION_DEPTH:
+            raise PackitException(f"Too deep recursion when expanding {text!r}.")
+
+        def replace(match) -> str:
+            if match.group(0) == "%%":
+                return "%%"
+            name = match.group("name") or match.group("bare")
+            flags = match.group("flags") or ""
+            defined = name in macros
+            if "?" not in flags:
+                if not defined:
+                    return match.group(0)
+                return self._expand(macros[name], macros, depth + 1)
+            if defined == ("!" in flags):
+                return ""
+            alternative = match.group("alternative")
+            if alternative is None:
+                return self._expand(macros[name], macros, depth + 1)
+            return self._expand(alternative, macros, depth + 1)
+
+        return MACRO_RE.sub(replace, text)
+
+    def _apply(self, edits: Sequence[Edit]) -> None:
+        """ apply the edits of the original content in one pass and tokenize it again """
+        if not edits:
+            return
+        chunks = []
+        position = 0
+        for start, end, replacement in sorted(edits, key=lambda edit: edit[:2]):
+            if start < position:
+                raise PackitException(f"Overlapping edits of {self.path}.")
+            chunks += [self.content[position:start], replacement]
+            position = end
+        chunks.append(self.content[position:])
+        self.content = "".join(chunks)
+        self._parse()
+
+    def _set_tag_edit(self, name: str, value: str) -> Edit:
+        tag = self.get_tag(name)
+        if tag is None:
+            raise PackitException(f"There is no {name} tag in {self.path}.")
+        return tag.start, tag.end, value
+
+    def set_tag(self, name: str, value: str) -> None:
+        self._apply([self._set_tag_edit(name, value)])
+
+    def _get_evr(self, version: str = None, release: str = None) -> str:
+        """ [epoch:]version-release, expanded; version and release override the spec """
+        version = self.expand(version or self.version or "")
+        evr = f"{version}-{self.expand(release or self.release or '')}"
+        epoch = self.get_tag("Epoch")
+        if epoch is not None:
+            evr = f"{self.expand(epoch.value)}:{evr}"
+        return evr
+
+    def _get_line_end(self, offset: int) -> int:
+        """ offset of the line following the one with the offset """
+        end = self.content.find("\n", offset)
+        return len(self.content) if end == -1 else end + 1
+
+    def _add_changelog_entry_edit(
+        self,
+        entry: str,
+        author: str,
+        evr: str = None,
+        date: datetime.date = None,
+    ) -> Edit:
+        date = date or datetime.date.today()
+        evr = evr or self._get_evr()
+        lines = [
+            line if line.startswith("-") else f"- {line}"
+            for line in entry.strip().splitlines()
+        ]
+        header = (
+            f"* {DAYS[date.weekday()]} {MONTHS[date.month - 1]} {date.day:02d} "
+            f"{date.year} {author} - {evr}"
+        )
+        text = "\n".join([header] + lines) + "\n\n"
+        section = self.get_section("%changelog")
+        if section is None:
+            separator = "" if self.content.endswith("\n") else "\n"
+            text = f"{separator}\n%changelog\n{text.rstrip()}\n"
+            return len(self.content), len(self.content), text
+        return section.body_start, section.body_start, text
+
+    def add_changelog_entry(
+        self,
+        entry: str,
+        author: str,
+        evr: str = None,
+        date: datetime.date = None,
+    ) -> None:
+        """
+        Add a new entry to the top of %changelog.
+
+        :param entry: text of the entry, lines which don't start with "-" get one
+        :param author: e.g. "John Doe <jdoe@example.com>"
+        :param evr: [epoch:]version-release, defaults to the one in the spec
+        :param date: defaults to today
+        """
+        self._apply([self._add_changelog_entry_edit(entry, author, evr, date)])
+
+    def download_remote_sources(self, directory: str = None) -> None:
+        """
+        Download the sources which are URLs and are not present in the directory yet.
+
+        :param directory: defaults to the directory of the spec file
+        """
+        directory = directory or os.path.dirname(self.path)
+        for source in self.sources:
+            url = self.expand(source.value)
+            if "://" not in url:
+                continue
+            path = os.path.join(directory, self._get_source_file_name(url))
+            if os.path.exists(path):
+                logger.debug(f"{path} is already downloaded.")
+                continue
+            logger.info(f"Downloading {url} to {path}")
+            try:
+                with requests.get(url, stream=True) as response:
+                    response.raise_for_status()
+                    with open(path, "wb") as output:
+                        for chunk in response.iter_content(chunk_size=2 ** 16):
+                            output.write(chunk)
+            except requests.exceptions.RequestException as ex:
+                if os.path.exists(path):
+                    os.remove(path)
+                raise PackitException(f"Failed to download {url}: {ex}")
+
+    @contextmanager
+    def transaction(self, save: bool = True) -> Iterator["SpecTransaction"]:
+        """
+        Batch edits of the spec:
+
+            with specfile.transaction() as spec:
+                spec.set_version("1.2.3")
+                spec.add_changelog_entry("New upstream release", author=packager)
+
+        The edits are applied in one pass when the block ends and the file
+        is written once; if the block raises, nothing is changed.
+
+        :param save: write the spec to the disk at the end of the block
+        """
+        self.refresh()
+        transaction = SpecTransaction(self)
+        yield transaction
+        self._apply(transaction.get_edits())
+        if save:
+            self.save()
+
+    def save(self) -> None:
+        """
+        Write the spec atomically: readers see either the old or the new content.
+        """
+        atomic_write(self.path, self.content, keep_mode=True)
+        self._stat = self._get_stat()
+
+
+class SpecTransaction:
+    """
+    Edits of a Specfile collected by Specfile.transaction().
+
+    All the edits are made against the content at the start of the transaction,
+    the changelog entry uses the version and release set in the same transaction.
+    """
+
+    def __init__(self, specfile: Specfile):
+        self.specfile = specfile
+        # lowercase name -> (name, value)
+        self._tags: Dict[str, Tuple[str, str]] = {}
+        self._changelog_entries: List[ChangelogEntry] = []
+        self._sources: List[str] = []
+        self._patches: List[Tuple[str, str]] = []
+
+    def set_tag(self, name: str, value: str) -> None:
+        self._tags[name.lower()] = (name, value)
+
+    def set_version(self, version: str) -> None:
+        self.set_tag("Version", version)
+
+    def set_release(self, release: str) -> None:
+        self.set_tag("Release", release)
+
+    def _get_pending_value(self, name: str) -> Optional[str]:
+        if name.lower() in self._tags:
+            return self._tags[name.lower()][1]
+        tag = self.specfile.get_tag(name)
+        return tag.value if tag else None
+
+    def bump_release(self, reset: bool = False) -> None:
+        """
+        Increase the number at the start of Release, e.g. 2%{?dist} -> 3%{?dist}
+
+        :param reset: set the number to 1 instead (new version)
+        """
+        release = self._get_pending_value("Release") or ""
+        match = re.match(r"^(\d+)(.*)$", release)
+        if not match:
+            raise PackitException(f"Don't know how to bump release {release!r}.")
+        number = 1 if reset else int(match.group(1)) + 1
+        self.set_release(f"{number}{match.group(2)}")
+
+    def add_changelog_entry(
+        self,
+        entry: str,
+        author: str,
+        evr: str = None,
+        date: datetime.date = None,
+    ) -> None:
+        """ see Specfile.add_changelog_entry """
+        self._changelog_entries.append((entry, author, evr, date))
+
+    def add_sources(self, sources: List[str]) -> None:
+        """ add Source tags with the next free numbers after the last Source tag """
+        self._sources += sources
+
+    def add_patches(self, patches: List[Tuple[str, str]]) -> None:
+        """
+        Add Patch tags, each with the commented message, after the last Source
+        (or Patch) tag, numbered after the existing patches.
+
+        :param patches: [(patch_name, msg)]
+        """
+        self._patches += patches
+
+    @staticmethod
+    def _get_next_number(tags: List[Tag]) -> int:
+        numbers = [int(re.sub(r"\D", "", tag.name) or 0) for tag in tags]
+        return max(numbers) + 1 if numbers else 0
+
+    def get_edits(self) -> List[Edit]:
+        spec = self.specfile
+        edits = [spec._set_tag_edit(name, value) for name, value in self._tags.values()]
+        for entry, author, evr, date in reversed(self._changelog_entries):
+            evr = evr or spec._get_evr(
+                self._get_pending_value("Version"), self._get_pending_value("Release")
+            )
+            edits.append(spec._add_changelog_entry_edit(entry, author, evr, date))
+
+        sources, patches = spec.sources, spec.patches
+        if (self._sources or self._patches) and not sources:
+            raise PackitException(f"There is no Source tag in {spec.path}.")
+        if self._sources:
+            number = self._get_next_number(sources)
+            text = "".join(
+                f"Source{number + i}: {source}\n"
+                for i, source in enumerate(self._sources)
+            )
+            position = spec._get_line_end(sources[-1].end)
+            edits.append((position, position, text))
+        if self._patches:
+            # patch numbers are shared by the PatchN and the %patchN macros
+            number = max(self._get_next_number(patches), 1)
+            text = "\n\n# PATCHES FROM SOURCE GIT:\n"
+            for i, (patch, msg) in enumerate(self._patches):
+                text += "\n# " + "\n# ".join(msg.split("\n")) + "\n"
+                text += f"Patch{number + i:04d}: {patch}\n"
+            last = max(sources + patches, key=lambda tag: tag.end)
+            position = spec._get_line_end(last.end)
+            edits.append((position, position, text))
+        return edits
+
+
+class SpecMetadata(NamedTuple):
+    """ what packit needs to know about a spec, the macros are expanded """
+
+    name: str
+    version: str
+    release: str
+    # name of the archive (Source0), None if there is no Source0
+    archive: Optional[str]
+    sources: Tuple[str, ...]
+    patches: Tuple[str, ...]
+
+    @classmethod
+    def from_specfile(cls, specfile: Specfile) -> "SpecMetadata":
+        name = specfile.get_tag("Name")
+        try:
+            archive: Optional[str] = specfile.get_archive()
+        except PackitException:
+            archive = None
+        return cls(
+            name=specfile.expand(name.value) if name else "",
+            version=specfile.get_version(),
+            release=specfile.expand(specfile.release or ""),
+            archive=archive,
+            sources=tuple(specfile.expand(tag.value) for tag in specfile.sources),
+            patches=tuple(specfile.expand(tag.value) for tag in specfile.patches),
+        )
+
+
+def get_blob_id(content: bytes) -> str:
+    """ the same id `git hash-object` gives to the content """
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+class SpecMetadataCache:
+    """
+    Metadata of spec files by the git blob id of their content
+
+    The same spec is parsed over and over again: in every branch of dist-git,
+    by upstream and dist-git, in every job of the bot. The content of a blob
+    never changes, so the entries are valid for good; the least recently used
+    ones are evicted. With a cache_dir, the metadata are kept on the disk as well.
+    """
+
+    # bump when SpecMetadata (or the way it's computed) changes
+    DISK_FORMAT = 2
+
+    def __init__(self, max_size: int = 512) -> None:
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, SpecMetadata]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_path(self, cache_dir: Optional[str], blob_id: str) -> Optional[Path]:
+        if not cache_dir:
+            return None
+        return Path(cache_dir) / f"specfile-v{self.DISK_FORMAT}" / f"{blob_id}.json"
+
+    def get(self, blob_id: str, cache_dir: str = None) -> Optional[SpecMetadata]:
+        with self._lock:
+            metadata = self._entries.get(blob_id)
+            if metadata is not None:
+                self._entries.move_to_end(blob_id)
+        path = self._get_path(cache_dir, blob_id)
+        data = read_json_cache(path) if metadata is None and path else None
+        if data is not None:
+            try:
+                metadata = SpecMetadata(
+                    **{
+                        key: tuple(value) if isinstance(value, list) else value
+                        for key, value in data.items()
+                    }
+                )
+            except (AttributeError, TypeError):
+                logger.warning(f"Corrupted cache entry {path}, ignoring.")
+            else:
+                self._remember(blob_id, metadata)
+        metrics.count_cache_lookup("spec_metadata", hit=metadata is not None)
+        return metadata
+
+    def _remember(self, blob_id: str, metadata: SpecMetadata) -> None:
+        with self._lock:
+            self._entries[blob_id] = metadata
+            self._entries.move_to_end(blob_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def put(self, blob_id: str, metadata: SpecMetadata, cache_dir: str = None) -> None:
+        self._remember(blob_id, metadata)
+        path = self._get_path(cache_dir, blob_id)
+        if path is not None:
+            atomic_write_json(path, metadata._asdict())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+spec_metadata_cache = SpecMetadataCache()
+
+
+def get_spec_metadata(
+    path: str,
+    blob_id: str = None,
+    read_content: Callable[[], bytes] = None,
+    cache_dir: str = None,
+) -> SpecMetadata:
+    """
+    Metadata of the spec, parsed only if the same content wasn't parsed before
+
+    :param path: path to the spec file
+    :param blob_id: git blob id of the content if it's known,
+                    the content is not even read if the metadata are cached
+    :param read_content: returns the content of the spec (e.g. a blob from git),
+                         defaults to reading the path
+    :param cache_dir: directory with the persistent cache (Config.cache_dir)
+    """
+    read_content = read_content or Path(path).read_bytes
+    content = None
+    if blob_id is None:
+        content = read_content()
+        blob_id = get_blob_id(content)
+    metadata = spec_metadata_cache.get(blob_id, cache_dir=cache_dir)
+    if metadata is None:
+        if content is None:
+            content = read_content()
+        specfile = Specfile(path, content=content.decode("utf-8", errors="replace"))
+        metadata = SpecMetadata.from_specfile(specfile)
+        spec_metadata_cache.put(blob_id, metadata, cache_dir=cache_dir)
+    return metadata
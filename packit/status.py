@@ -46,19 +46,13 @@ class Status:
         """
         branches = self.dg.local_project.git_project.get_branches()
         for branch in branches:
+            # the specs are read from git, the checkout of dist-git stays as it is
+            # and the same content (common across branches) is parsed only once
             try:
-                self.dg.create_branch(
-                    branch, base=f"remotes/origin/{branch}", setup_tracking=False
-                )
-                self.dg.checkout_branch(branch)
-            except Exception as ex:
-                logger.debug(f"Branch {branch} is not present: {ex}")
-                continue
-            try:
-                logger.info(f"{branch}: {self.dg.specfile.get_version()}")
-            except PackitException:
-                logger.debug(f"Can't figure out the version of branch: {branch}")
-        self.dg.checkout_branch("master")
+                metadata = self.dg.get_specfile_metadata(f"remotes/origin/{branch}")
+                logger.info(f"{branch}: {metadata.version}")
+            except PackitException as ex:
+                logger.debug(f"Can't figure out the version of branch {branch}: {ex}")
 
     def get_up_releases(self, number_of_releases: int = 5) -> None:
         """
@@ -0,0 +1,208 @@
+"""
+Nested timing spans of packit workflows.
+
+    with span("sync_release", version="1.0"):
+        with span("clone"):
+            ...
+
+Once the outermost span (the trace) ends, it is passed to the registered exporters.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    def __init__(self, name: str, parent: "Span" = None, **attributes: Any) -> None:
+        self.name = name
+        self.parent = parent
+        self.attributes: Dict[str, Any] = attributes
+        self.trace_id: str = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id: str = os.urandom(8).hex()
+        self.start: float = time.time()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+        self.children: List["Span"] = []
+        self._lock = threading.Lock()
+        self._start_monotonic = time.monotonic()
+
+    @property
+    def duration(self) -> float:
+        """ [s], up to now if the span is not finished """
+        if self.end is None:
+            return time.monotonic() - self._start_monotonic
+        return self.end - self.start
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def finish(self) -> None:
+        # wall clock for the timestamps, monotonic clock for the duration
+        self.end = self.start + time.monotonic() - self._start_monotonic
+
+    def add_child(self, child: "Span") -> None:
+        # children can be started in other threads
+        with self._lock:
+            self.children.append(child)
+
+    def walk(self, depth: int = 0) -> Iterator[tuple]:
+        """ (depth, span) for this span and all its descendants, depth first """
+        yield depth, self
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "error": self.error,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Exporter:
+    def export(self, trace: Span) -> None:
+        raise NotImplementedError()
+
+
+class LogSummaryExporter(Exporter):
+    """ log a tree of the spans with their durations """
+
+    def __init__(self, level: int = logging.INFO) -> None:
+        self.level = level
+
+    def export(self, trace: Span) -> None:
+        lines = [f"Timing of {trace.name}:"]
+        for depth, span in trace.walk():
+            failed = " (failed)" if span.error else ""
+            lines.append(f"{'  ' * depth}{span.name}: {span.duration:.3f}s{failed}")
+        logger.log(self.level, "\n".join(lines))
+
+
+class JsonFileExporter(Exporter):
+    """ append every trace as a JSON document (one per line) to a file """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def export(self, trace: Span) -> None:
+        with self._lock, self.path.open("a") as out:
+            out.write(json.dumps(trace.to_dict()) + "\n")
+
+
+class OtlpJsonExporter(JsonFileExporter):
+    """
+    Traces in the OpenTelemetry protocol JSON encoding (one request per line),
+    they can be sent to any OpenTelemetry collector
+    """
+
+    def __init__(self, path: Union[str, Path], service_name: str = "packit") -> None:
+        super().__init__(path)
+        self.service_name = service_name
+
+    @staticmethod
+    def _attribute(key: str, value: Any) -> dict:
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        return {"key": key, "value": typed}
+
+    def _span(self, span: Span) -> dict:
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            # SPAN_KIND_INTERNAL
+            "kind": 1,
+            "startTimeUnixNano": str(int(span.start * 1e9)),
+            "endTimeUnixNano": str(int((span.start + span.duration) * 1e9)),
+            "attributes": [self._attribute(k, v) for k, v in span.attributes.items()],
+            # STATUS_CODE_ERROR / STATUS_CODE_OK
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent:
+            otlp_span["parentSpanId"] = span.parent.span_id
+        return otlp_span
+
+    def export(self, trace: Span) -> None:
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            self._attribute("service.name", self.service_name)
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "packit"},
+                            "spans": [self._span(s) for _, s in trace.walk()],
+                        }
+                    ],
+                }
+            ]
+        }
+        with self._lock, self.path.open("a") as out:
+            out.write(json.dumps(request) + "\n")
+
+
+_exporters: List[Exporter] = []
+
+
+def add_exporter(exporter: Exporter) -> None:
+    _exporters.append(exporter)
+
+
+def remove_exporter(exporter: Exporter) -> None:
+    _exporters.remove(exporter)
+
+
+def _export(trace: Span) -> None:
+    for exporter in list(_exporters):
+        try:
+            exporter.export(trace)
+        except Exception as ex:
+            logger.warning(f"Exporting trace {trace.name} failed: {ex!r}")
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Measure a part of a workflow, nested in the span active in the current context
+
+    Usable also as a decorator.
+    """
+    parent = current_span.get()
+    new_span = Span(name, parent=parent, **attributes)
+    if parent:
+        parent.add_child(new_span)
+    token = current_span.set(new_span)
+    try:
+        yield new_span
+    except BaseException as ex:
+        new_span.error = repr(ex)
+        raise
+    finally:
+        new_span.finish()
+        current_span.reset(token)
+        if parent is None:
+            _export(new_span)
@@ -7,15 +7,15 @@ from typing import Optional, List, Tuple
 from packaging import version
 
 import git
-import github
 from ogr.services.github import GithubService
-from rebasehelper.exceptions import RebaseHelperError
-from rebasehelper.specfile import SpecFile
-from rebasehelper.versioneer import versioneers_runner
 
+from packit import git_describe, metrics
 from packit.config import Config, PackageConfig
 from packit.exceptions import PackitException
+from packit.github_tokens import get_github_token
 from packit.local_project import LocalProject
+from packit.specfile import Specfile, get_spec_metadata
+from packit.upstream_versions import upstream_versions
 from packit.utils import run_command
 
 logger = logging.getLogger(__name__)
@@ -52,31 +52,11 @@ class Upstream:
     def local_project(self):
         """ return an instance of LocalProject """
         if self._local_project is None:
-            # TODO: ogr should have a method, something like this:
-            #       get_github_service(token, app_id, inst_id, cert_path) -> GithubService
-            #       the logic below should be the function
-            #       I want to leave this code here up the end of this sprint
             # TODO: in order to support any git forge here, ogr should also have a method like this:
             #       get_github_service_from_url(url, **kwargs):
             #       ogr should guess the forge based on the url; kwargs should be passed to the
             #       constructor in order to support the above
-            if (
-                self.config.github_app_id
-                and self.config.github_app_cert_path
-                and self.config.github_app_installation_id
-            ):
-                logger.info("Authenticating with Github using a Githab app.")
-                private_key = Path(self.config.github_app_cert_path).read_text()
-                integration = github.GithubIntegration(
-                    self.config.github_app_id, private_key
-                )
-                token = integration.get_access_token(
-                    self.config.github_app_installation_id
-                )
-                gh_service = GithubService(token=token)
-            else:
-                logger.debug("Authenticating with Github using a token.")
-                gh_service = GithubService(token=self.github_token)
+            gh_service = GithubService(token=get_github_token(self.config))
             self._local_project = LocalProject(
                 path_or_url=self.upstream_project_url,
                 repo_name=self.package_name,
@@ -85,13 +65,12 @@ class Upstream:
         return self._local_project
 
     @property
-    def specfile(self):
+    def specfile(self) -> Specfile:
         if self._specfile is None:
-            self._specfile = SpecFile(
-                path=self.specfile_path,
-                sources_location=self.local_project.working_dir,
-                changelog_entry=None,
-            )
+            self._specfile = Specfile(self.specfile_path)
+        else:
+            # e.g. a different ref was checked out
+            self._specfile.refresh()
         return self._specfile
 
     def checkout_pr(self, pr_id: int) -> None:
@@ -207,6 +186,7 @@ class Upstream:
             commit_args += ["-m", msg]
         self.local_project.git_repo.git.commit(*commit_args)
 
+    @metrics.timed("push")
     def push(
         self,
         branch_name: str,
@@ -234,6 +214,7 @@ class Upstream:
                     project = self.local_project.git_project
                 else:
                     # ogr is awesome! if you want to fork your own repo, you'll get it!
+                    metrics.count_forge_call(self.local_project.git_project, "get_fork")
                     project = self.local_project.git_project.get_fork(create=True)
                 fork_urls = project.get_git_urls()
 
@@ -267,6 +248,7 @@ class Upstream:
             raise PackitException(msg)
         return str(branch_name)
 
+    @metrics.timed("create_pull")
     def create_pull(
         self, pr_title: str, pr_description: str, source_branch: str, target_branch: str
     ) -> None:
@@ -284,6 +266,7 @@ class Upstream:
             source_branch = f"{project.namespace}:{source_branch}"
             project = self.local_project.git_project.parent
 
+        metrics.count_forge_call(project, "pr_create")
         try:
             upstream_pr = project.pr_create(
                 title=pr_title,
@@ -297,6 +280,7 @@ class Upstream:
         else:
             logger.info(f"PR created: {upstream_pr.url}")
 
+    @metrics.timed("create_patches")
     def create_patches(
         self, upstream: str = None, destination: str = None
     ) -> List[Tuple[str, str]]:
@@ -349,17 +333,16 @@ class Upstream:
 
         :return: the version string (e.g. "1.0.0")
         """
-        version = versioneers_runner.run(
-            versioneer=None,
-            package_name=self.package_config.downstream_package_name,
-            category=None,
+        return upstream_versions.get_latest_version(
+            self.package_config.downstream_package_name,
+            cache_dir=self.config.cache_dir,
         )
-        logger.info(f"Version in upstream registries is {version!r}.")
-        return version
 
     def get_specfile_version(self) -> str:
         """ provide version from specfile """
-        version = self.specfile.get_version()
+        version = get_spec_metadata(
+            self.specfile_path, cache_dir=self.config.cache_dir
+        ).version
         logger.info(f"Version in spec file is {version!r}.")
         return version
 
@@ -413,9 +396,17 @@ class Upstream:
         if action_output:
             return action_output
 
-        ver = run_command(
-            self.package_config.current_version_command, output=True
-        ).strip()
+        command = self.package_config.current_version_command
+        ver = None
+        if len(command) == 5 and command[:4] == ["git", "describe", "--tags", "--match"]:
+            # the default command, no need to run git for it
+            ver = git_describe.describe(
+                self.local_project.working_dir, match=command[4]
+            )
+        if ver is None:
+            ver = run_command(
+                command, output=True, cwd=self.local_project.working_dir
+            ).strip()
         logger.debug("version = %s", ver)
         # FIXME: this might not work when users expect the dashes
         #  but! RPM refuses dashes in version/release
@@ -425,20 +416,26 @@ class Upstream:
 
     def bump_spec(self, version: str = None, changelog_entry: str = None):
         """
-        Run rpmdev-bumpspec on the upstream spec file: it enables
-        changing version and adding a changelog entry
+        Bump the upstream spec file the same way rpmdev-bumpspec does it:
+        set the version and reset the release, or bump the release,
+        and add a changelog entry
 
         :param version: new version which should be present in the spec
         :param changelog_entry: new changelog entry (just the comment)
         """
-        cmd = ["rpmdev-bumpspec"]
-        if version:
-            # 1.2.3-4 means, version = 1.2.3, release = 4
-            cmd += ["--new", version]
-        if changelog_entry:
-            cmd += ["--comment", changelog_entry]
-        cmd.append(self.specfile_path)
-        run_command(cmd)
+        with self.specfile.transaction() as spec:
+            if version:
+                # 1.2.3-4 means, version = 1.2.3, release = 4
+                version, _, release = version.partition("-")
+                spec.set_version(version)
+                if release:
+                    spec.set_release(release)
+                else:
+                    spec.bump_release(reset=True)
+            else:
+                spec.bump_release()
+            if changelog_entry:
+                spec.add_changelog_entry(changelog_entry, author=self.get_packager())
 
     def set_spec_version(self, version: str, changelog_entry: str):
         """
@@ -447,20 +444,23 @@ class Upstream:
         :param version: new version
         :param changelog_entry: accompanying changelog entry
         """
-        try:
-            # also this code adds 3 rpmbuild dirs into the upstream repo,
-            # we should ask rebase-helper not to do that
-            self.specfile.set_version(version=version)
-            self.specfile.changelog_entry = changelog_entry
-            # https://github.com/rebase-helper/rebase-helper/blob/643dab4a864288327289f34e023124d5a499e04b/rebasehelper/application.py#L446-L448
-            new_log = self.specfile.get_new_log()
-            new_log.extend(self.specfile.spec_content.sections["%changelog"])
-            self.specfile.spec_content.sections["%changelog"] = new_log
-            self.specfile.save()
-        except RebaseHelperError as ex:
-            logger.error(f"rebase-helper failed to change the spec file: {ex!r}")
-            raise PackitException("rebase-helper didn't do the job")
+        with self.specfile.transaction() as spec:
+            spec.set_version(version)
+            spec.add_changelog_entry(changelog_entry, author=self.get_packager())
+
+    def get_packager(self) -> str:
+        """
+        The same as rpmdev-packager: $RPM_PACKAGER or the user from git config
+        """
+        packager = os.getenv("RPM_PACKAGER")
+        if packager:
+            return packager
+        git_config = self.local_project.git_repo.config_reader()
+        name = git_config.get_value("user", "name", "Packit")
+        email = git_config.get_value("user", "email", "")
+        return f"{name} <{email}>" if email else name
 
+    @metrics.timed("create_archive")
     def create_archive(self):
         """
         Create archive, using `git archive` by default, from the content of the upstream
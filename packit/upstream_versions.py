@@ -0,0 +1,234 @@
+"""
+Latest versions of projects in the upstream registries.
+
+The version of a Fedora package is looked up in release-monitoring.org (Anitya),
+the other registries (PyPI, npm, ...) are asked via rebase-helper if Anitya doesn't
+know the package. The versions are cached for a while, in memory and optionally
+on the disk (shared by all the workers), and refreshed with conditional requests.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, NamedTuple, Optional
+
+import requests
+
+from packit import metrics
+from packit.utils import (
+    atomic_write_json,
+    make_retrying_session,
+    read_json_cache,
+    submit_in_context,
+)
+
+logger = logging.getLogger(__name__)
+
+ANITYA_URL = "https://release-monitoring.org/api/project/Fedora/{package_name}"
+
+
+class RegistryEntry(NamedTuple):
+    # None if no registry knows the package
+    version: Optional[str]
+    # time.time() of the last check, the disk cache is shared by processes
+    checked: float
+    # validators for the conditional requests
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class UpstreamVersions:
+    """
+    Latest versions of packages in the upstream registries, cached for `ttl` seconds
+
+    With cache_dir, the versions are stored on the disk as well, so all
+    the processes (bot workers) share them.
+    """
+
+    def __init__(
+        self,
+        url: str = ANITYA_URL,
+        ttl: float = 60 * 60,
+        timeout: float = 30,
+        retries: int = 3,
+        max_workers: int = 8,
+        max_size: int = 1024,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """
+        :param url: url template with {package_name} placeholder
+        :param ttl: how long a version is considered current [s]
+        :param timeout: timeout of a single request [s]
+        :param retries: how many times a failed request is retried
+        :param max_workers: how many packages are refreshed in parallel
+        :param max_size: how many packages are kept in memory
+        :param clock: wall clock, the entries on the disk are shared by processes
+        """
+        self.url = url
+        self.ttl = ttl
+        self.timeout = timeout
+        self.retries = retries
+        self.max_workers = max_workers
+        self.max_size = max_size
+        self.clock = clock
+        self._entries: "OrderedDict[str, RegistryEntry]" = OrderedDict()
+        # one lookup of a package at a time, the others wait for its result
+        self._package_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            self._session = make_retrying_session(
+                retries=self.retries, pool_size=self.max_workers
+            )
+        return self._session
+
+    def get_latest_version(
+        self, package_name: str, cache_dir: str = None
+    ) -> Optional[str]:
+        """
+        :param package_name: name of the package in Fedora
+        :param cache_dir: directory with the persistent cache (Config.cache_dir)
+        :return: the latest version or None if no registry knows the package
+        """
+        return self._get_entry(package_name, cache_dir, force=False).version
+
+    def refresh(
+        self, package_names: Iterable[str], cache_dir: str = None, force: bool = False
+    ) -> Dict[str, Optional[str]]:
+        """
+        Look up the latest versions of many packages, at most `max_workers` at once
+
+        :param force: check even the versions which are still current
+        :return: package name -> version
+        """
+        package_names = list(package_names)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                name: submit_in_context(
+                    executor, self._get_entry, name, cache_dir, force
+                )
+                for name in package_names
+            }
+            return {name: future.result().version for name, future in futures.items()}
+
+    def _get_entry(
+        self, package_name: str, cache_dir: Optional[str], force: bool
+    ) -> RegistryEntry:
+        with self._lock:
+            package_lock = self._package_locks.setdefault(package_name, threading.Lock())
+        with package_lock:
+            entry = self._load(package_name, cache_dir)
+            fresh = entry is not None and self.clock() - entry.checked < self.ttl
+            metrics.count_cache_lookup("upstream_version", hit=fresh and not force)
+            if fresh and not force:
+                return entry
+            new_entry = self._fetch(package_name, entry)
+            if new_entry is not entry:
+                self._store(package_name, new_entry, cache_dir)
+            return new_entry
+
+    def _fetch(
+        self, package_name: str, entry: Optional[RegistryEntry]
+    ) -> RegistryEntry:
+        """
+        Ask Anitya (conditionally if we know the version already), then the others
+        """
+        headers = {}
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        url = self.url.format(package_name=package_name)
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.exceptions.RequestException as ex:
+            logger.warning(f"Cannot get the latest version of {package_name}: {ex!r}")
+            if entry is not None:
+                # better a stale version than none
+                return entry
+            return RegistryEntry(self._run_versioneers(package_name), self.clock())
+
+        if response.status_code == 304 and entry is not None:
+            logger.debug(f"The latest version of {package_name} didn't change.")
+            return entry._replace(checked=self.clock())
+        version = None
+        if response.ok:
+            try:
+                version = response.json().get("version")
+            except (ValueError, AttributeError) as ex:
+                # e.g. an HTML error page or an empty body
+                logger.warning(f"Invalid response about {package_name}: {ex!r}")
+        if not version:
+            version = self._run_versioneers(package_name)
+        logger.info(f"Version in upstream registries is {version!r}.")
+        return RegistryEntry(
+            version=version,
+            checked=self.clock(),
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+
+    @staticmethod
+    def _run_versioneers(package_name: str) -> Optional[str]:
+        # rebase-helper is slow to import, it's needed only for the other registries
+        from rebasehelper.versioneer import versioneers_runner
+
+        return versioneers_runner.run(
+            versioneer=None, package_name=package_name, category=None
+        )
+
+    def _cache_path(self, package_name: str, cache_dir: Optional[str]) -> Optional[Path]:
+        if not cache_dir:
+            return None
+        digest = hashlib.sha256(package_name.encode("utf-8")).hexdigest()
+        return Path(cache_dir) / "upstream-versions" / f"{digest}.json"
+
+    def _load(
+        self, package_name: str, cache_dir: Optional[str]
+    ) -> Optional[RegistryEntry]:
+        with self._lock:
+            entry = self._entries.get(package_name)
+            if entry is not None:
+                self._entries.move_to_end(package_name)
+        path = self._cache_path(package_name, cache_dir)
+        data = read_json_cache(path) if path else None
+        if data is None:
+            return entry
+        try:
+            on_disk = RegistryEntry(**data)
+        except TypeError:
+            logger.warning(f"Corrupted cache entry {path}, ignoring.")
+            return entry
+        # another worker may have checked the version recently
+        if entry is None or on_disk.checked > entry.checked:
+            self._remember(package_name, on_disk)
+            return on_disk
+        return entry
+
+    def _remember(self, package_name: str, entry: RegistryEntry) -> None:
+        with self._lock:
+            self._entries[package_name] = entry
+            self._entries.move_to_end(package_name)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _store(
+        self, package_name: str, entry: RegistryEntry, cache_dir: Optional[str]
+    ) -> None:
+        self._remember(package_name, entry)
+        path = self._cache_path(package_name, cache_dir)
+        if path is not None:
+            atomic_write_json(path, entry._asdict())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+upstream_versions = UpstreamVersions()
@@ -1,17 +1,47 @@
+import asyncio
+import contextvars
 import json
 import logging
+import os
 import shlex
+import shutil
+import signal
 import subprocess
+import sys
 import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Tuple
-
-import git
-
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from packit import metrics
 from packit.exceptions import PackitException
 
+if TYPE_CHECKING:
+    # GitPython is slow to import, the CLI imports it only when it's needed
+    import git
+    import requests
+
 logger = logging.getLogger(__name__)
 
+# how much of stderr of a command we keep to log it
+STDERR_TAIL_LINES = 200
+# longest line of output run_command_async can process [B]
+ASYNC_LINE_LIMIT = 2 ** 20
+
 
 def get_rev_list_kwargs(opt_list):
     """
@@ -33,45 +63,351 @@ def get_rev_list_kwargs(opt_list):
     return result
 
 
-# TODO: we should use run_cmd from conu
-def run_command(cmd, error_message=None, cwd=None, fail=True, output=False):
+class CommandResult(NamedTuple):
+    """ what a command did, passed to the command listeners """
+
+    cmd: List[str]
+    cwd: str
+    returncode: int
+    # [s]
+    wall_time: float
+    # user + system [s], None if not available
+    cpu_time: Optional[float]
+    # peak resident set size [KiB], None if not available
+    max_rss: Optional[int]
+    timed_out: bool
+
+
+CommandListener = Callable[[CommandResult], None]
+LineCallback = Callable[[str], None]
+
+_command_listeners: List[CommandListener] = [metrics.observe_command]
+
+
+def add_command_listener(listener: CommandListener) -> None:
+    """ call listener(CommandResult) after every command run by run_command """
+    _command_listeners.append(listener)
+
+
+def remove_command_listener(listener: CommandListener) -> None:
+    _command_listeners.remove(listener)
+
+
+def _notify_command_listeners(result: CommandResult) -> None:
+    for listener in list(_command_listeners):
+        try:
+            listener(result)
+        except Exception as ex:
+            logger.warning(f"Command listener {listener!r} failed: {ex!r}")
+
+
+def _read_lines(stream: IO[str], callbacks: List[LineCallback]) -> None:
+    with stream:
+        for line in stream:
+            for callback in callbacks:
+                callback(line)
+
+
+async def _read_lines_async(
+    stream: asyncio.StreamReader, callbacks: List[LineCallback]
+) -> None:
+    while True:
+        raw_line = await stream.readline()
+        if not raw_line:
+            return
+        line = raw_line.decode(errors="replace")
+        for callback in callbacks:
+            callback(line)
+
+
+def _exit_code(status: int) -> int:
+    """ the same as Popen.returncode: negative signal number if killed """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _prepare_command(cmd, cwd) -> Tuple[List[str], str]:
     logger.debug("cmd = %s", cmd)
     if not isinstance(cmd, list):
         logger.debug("cmd = '%s'", " ".join(cmd))
         cmd = shlex.split(cmd)
+    return cmd, cwd or str(Path.cwd())
+
+
+class _CollectedOutput:
+    """ what run_command keeps from the output of the command """
+
+    def __init__(
+        self,
+        output: bool,
+        stdout_callback: LineCallback = None,
+        stderr_callback: LineCallback = None,
+    ) -> None:
+        self.output = output
+        self.stdout_lines: List[str] = []
+        # keep only the end of stderr, it can be long and the end is what matters
+        self.stderr_tail: Deque[str] = deque(maxlen=STDERR_TAIL_LINES)
+        self.stdout_callbacks: List[LineCallback] = [
+            self.stdout_lines.append
+            if output
+            else lambda line: logger.debug("%s", line.rstrip())
+        ]
+        self.stderr_callbacks: List[LineCallback] = [self.stderr_tail.append]
+        if stdout_callback:
+            self.stdout_callbacks.append(stdout_callback)
+        if stderr_callback:
+            self.stderr_callbacks.append(stderr_callback)
+
+
+def _finish_command(
+    result: CommandResult,
+    collected: _CollectedOutput,
+    error_message: str = None,
+    fail: bool = True,
+    timeout: float = None,
+):
+    """ report the result and turn it into the return value of run_command """
+    usage = (
+        f" (cpu {result.cpu_time:.3f}s, max rss {result.max_rss} KiB)"
+        if result.cpu_time is not None
+        else ""
+    )
+    logger.debug(f"Command {result.cmd[0]!r} finished in {result.wall_time:.3f}s{usage}")
+    _notify_command_listeners(result)
+
+    stderr = "".join(collected.stderr_tail).strip()
+    if stderr:
+        logger.error("%s", stderr)
+
+    error_message = error_message or result.cmd[0]
+    if result.returncode != 0:
+        logger.error("Command %s failed", result.cmd)
+        logger.error("%s", error_message)
+        if fail:
+            if result.timed_out:
+                raise PackitException(
+                    f"Command {result.cmd!r} timed out after {timeout}s: {error_message}"
+                )
+            raise PackitException(f"Command {result.cmd!r} failed: {error_message}")
+        success = False
+    else:
+        success = True
+
+    if not collected.output:
+        return success
+
+    return "".join(collected.stdout_lines)
 
-    cwd = cwd or str(Path.cwd())
-    error_message = error_message or cmd[0]
 
-    shell = subprocess.run(
+# TODO: we should use run_cmd from conu
+def run_command(
+    cmd,
+    error_message=None,
+    cwd=None,
+    fail=True,
+    output=False,
+    timeout: float = None,
+    stdout_callback: LineCallback = None,
+    stderr_callback: LineCallback = None,
+):
+    """
+    Run the command, stdout and stderr are processed line by line as they come
+
+    :param cmd: list or str, the command
+    :param error_message: logged and raised if the command fails
+    :param cwd: working directory, defaults to the current one
+    :param fail: raise PackitException if the command fails or times out
+    :param output: return stdout instead of logging it
+    :param timeout: [s] kill the command (and its children) after this time
+    :param stdout_callback: called with every line of stdout
+    :param stderr_callback: called with every line of stderr
+    :return: stdout if output is set, else whether the command succeeded
+    """
+    cmd, cwd = _prepare_command(cmd, cwd)
+    collected = _CollectedOutput(output, stdout_callback, stderr_callback)
+
+    start = time.monotonic()
+    shell = subprocess.Popen(
         cmd,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         shell=False,
         cwd=cwd,
         universal_newlines=True,
+        # a process group of its own so that we can kill the whole group on timeout
+        start_new_session=timeout is not None,
     )
+    readers = [
+        threading.Thread(
+            target=_read_lines, args=(shell.stdout, collected.stdout_callbacks)
+        ),
+        threading.Thread(
+            target=_read_lines, args=(shell.stderr, collected.stderr_callbacks)
+        ),
+    ]
+    for reader in readers:
+        reader.start()
+
+    timed_out = threading.Event()
+    reaped = threading.Lock()
+
+    def kill():
+        with reaped:
+            if shell.returncode is not None:
+                return
+            timed_out.set()
+            logger.error(f"Command {cmd!r} timed out after {timeout}s, killing it.")
+            try:
+                os.killpg(shell.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
 
-    if not output:
-        # output is returned, let the caller process it
-        logger.debug("%s", shell.stdout)
-    stderr = shell.stderr.strip()
-    if stderr:
-        logger.error("%s", shell.stderr)
+    timer = threading.Timer(timeout, kill) if timeout is not None else None
+    if timer:
+        timer.start()
+    try:
+        # unlike Popen.wait, wait4 provides resource usage of the process
+        _, status, rusage = os.wait4(shell.pid, 0)
+    except BaseException:
+        # e.g. KeyboardInterrupt: don't leave the process behind
+        shell.kill()
+        shell.wait()
+        raise
+    finally:
+        if timer:
+            timer.cancel()
+    with reaped:
+        shell.returncode = _exit_code(status)
+    for reader in readers:
+        reader.join()
+
+    result = CommandResult(
+        cmd=cmd,
+        cwd=cwd,
+        returncode=shell.returncode,
+        wall_time=time.monotonic() - start,
+        cpu_time=rusage.ru_utime + rusage.ru_stime,
+        max_rss=rusage.ru_maxrss,
+        timed_out=timed_out.is_set(),
+    )
+    return _finish_command(
+        result, collected, error_message=error_message, fail=fail, timeout=timeout
+    )
 
-    if shell.returncode != 0:
-        logger.error("Command %s failed", shell.args)
-        logger.error("%s", error_message)
-        if fail:
-            raise PackitException(f"Command {shell.args!r} failed: {error_message}")
-        success = False
-    else:
-        success = True
 
-    if not output:
-        return success
+async def run_command_async(
+    cmd,
+    error_message=None,
+    cwd=None,
+    fail=True,
+    output=False,
+    timeout: float = None,
+    stdout_callback: LineCallback = None,
+    stderr_callback: LineCallback = None,
+):
+    """
+    The same as run_command, but the command runs in the asyncio event loop
+    so that more commands can run concurrently:
+
+        results = run_concurrently(
+            run_command_async(["git", "fetch"], cwd=upstream),
+            run_command_async(["git", "fetch"], cwd=dist_git),
+        )
+
+    CPU time and peak RSS of the command are not available in the CommandResult,
+    asyncio reaps the process.
+
+    On Python < 3.8 the child processes can be watched only by a loop
+    running in the main thread.
+    """
+    cmd, cwd = _prepare_command(cmd, cwd)
+    collected = _CollectedOutput(output, stdout_callback, stderr_callback)
+
+    start = time.monotonic()
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=cwd,
+        start_new_session=timeout is not None,
+        limit=ASYNC_LINE_LIMIT,
+    )
+    communicate = asyncio.gather(
+        _read_lines_async(process.stdout, collected.stdout_callbacks),
+        _read_lines_async(process.stderr, collected.stderr_callbacks),
+        process.wait(),
+    )
+    timed_out = False
+    try:
+        await asyncio.wait_for(asyncio.shield(communicate), timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+        logger.error(f"Command {cmd!r} timed out after {timeout}s, killing it.")
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await communicate
+    except BaseException:
+        # e.g. the task was cancelled: don't leave the process behind
+        if process.returncode is None:
+            process.kill()
+        await process.wait()
+        raise
+
+    result = CommandResult(
+        cmd=cmd,
+        cwd=cwd,
+        returncode=process.returncode,
+        wall_time=time.monotonic() - start,
+        cpu_time=None,
+        max_rss=None,
+        timed_out=timed_out,
+    )
+    return _finish_command(
+        result, collected, error_message=error_message, fail=fail, timeout=timeout
+    )
 
-    return shell.stdout
+
+def run_concurrently(*awaitables: Awaitable) -> list:
+    """
+    Run the awaitables (e.g. run_command_async(...)) concurrently in a new event loop
+    and wait for all of them.
+
+    :return: list of their results in the same order
+    :raises: the first exception raised by any of them (after all of them finished)
+    """
+
+    async def gather():
+        # gather has to be created inside the loop which runs it
+        return await asyncio.gather(*awaitables, return_exceptions=True)
+
+    loop = asyncio.new_event_loop()
+    previous_loop = None
+    if sys.version_info < (3, 8):
+        # before 3.8, the child watcher reports the exit of subprocesses
+        # only to the current loop it is attached to
+        try:
+            previous_loop = asyncio.get_event_loop()
+        except RuntimeError:
+            # no current loop in this thread
+            pass
+        asyncio.set_event_loop(loop)
+        asyncio.get_child_watcher().attach_loop(loop)
+    try:
+        results = loop.run_until_complete(gather())
+        loop.run_until_complete(loop.shutdown_asyncgens())
+    finally:
+        if sys.version_info < (3, 8):
+            asyncio.set_event_loop(previous_loop)
+            if previous_loop is not None and not previous_loop.is_closed():
+                asyncio.get_child_watcher().attach_loop(previous_loop)
+        loop.close()
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
 
 
 class PackitFormatter(logging.Formatter):
@@ -118,6 +454,104 @@ def set_logging(
             logger.addHandler(handler)
 
 
+def submit_in_context(executor: Executor, func, *args, **kwargs) -> Future:
+    """
+    Submit func(*args, **kwargs) to the executor, run it in a copy of the current context
+
+    Worker threads don't inherit context variables (e.g. the id of the job
+    the logs belong to), so we pass them explicitly.
+    """
+    return executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+def run_in_parallel(*funcs: Callable) -> list:
+    """
+    Call the functions in parallel threads (in copies of the current context)
+    and wait for all of them.
+
+    :return: list of their results in the same order
+    :raises: the first exception raised by any of them (after all of them finished)
+    """
+    with ThreadPoolExecutor(max_workers=len(funcs)) as executor:
+        futures = [submit_in_context(executor, func) for func in funcs]
+        wait(futures)
+    return [future.result() for future in futures]
+
+
+def make_retrying_session(retries: int = 3, pool_size: int = 10) -> "requests.Session":
+    """
+    requests session which retries failed requests (with a backoff) and rate limited ones
+
+    :param retries: how many times a failed request is retried
+    :param pool_size: how many connections to a host are kept, i.e. parallel requests
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504)
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def atomic_write(path: str, content: str, keep_mode: bool = False) -> None:
+    """
+    Write the file via a temporary one (readable only by the owner) and a rename,
+    so concurrent readers see either the old or the new content, never a partial one.
+
+    :param keep_mode: keep the permissions of the file being replaced
+    """
+    path = os.path.realpath(path)
+    fd, temporary = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w") as temporary_file:
+            temporary_file.write(content)
+        if keep_mode and os.path.exists(path):
+            shutil.copymode(path, temporary)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def atomic_write_json(path: Path, data: Any) -> bool:
+    """
+    Store data to a JSON cache file atomically (see atomic_write).
+
+    Caching is an optimization only: failures are logged, not raised.
+
+    :return: whether the data were stored
+    """
+    try:
+        content = json.dumps(data)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(str(path), content)
+    except (OSError, TypeError, ValueError) as ex:
+        logger.warning(f"Cannot save {path} to the cache: {ex!r}")
+        return False
+    return True
+
+
+def read_json_cache(path: Path) -> Optional[Any]:
+    """
+    :return: data stored by atomic_write_json or None if there are none (or they are corrupted)
+    """
+    try:
+        return json.loads(path.read_text())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as ex:
+        logger.warning(f"Corrupted cache entry {path}, ignoring: {ex!r}")
+        return None
+
+
 def commits_to_nice_str(commits):
     return "\n".join(
         f"{commit.summary}\n"
@@ -147,10 +581,17 @@ def is_git_repo(directory: str) -> bool:
     return Path(directory).joinpath(".git").is_dir()
 
 
-def get_repo(url: str, directory: str = None) -> git.Repo:
+def get_repo(
+    url: str, directory: str = None, sparse_paths: List[str] = None
+) -> "git.Repo":
     """
     Use directory as a git repo or clone repo to the tempdir.
+
+    :param sparse_paths: check out only the files matching these (gitignore-style)
+                         patterns, the content of the other files is not downloaded
     """
+    import git
+
     if not directory:
         tempdir = tempfile.mkdtemp()
         directory = tempdir
@@ -161,11 +602,38 @@ def get_repo(url: str, directory: str = None) -> git.Repo:
         repo = git.repo.Repo(directory)
     else:
         logger.info(f"Cloning repo: {url} -> {directory}")
-        repo = git.repo.Repo.clone_from(url=url, to_path=directory, tags=True)
+        with metrics.timed("clone"):
+            if sparse_paths:
+                repo = _clone_sparse(url, directory, sparse_paths)
+            else:
+                repo = git.repo.Repo.clone_from(url=url, to_path=directory, tags=True)
 
     return repo
 
 
+def _clone_sparse(url: str, directory: str, sparse_paths: List[str]) -> "git.Repo":
+    """ clone without blobs and check out only the sparse paths, or the full repo """
+    import git
+
+    try:
+        repo = git.repo.Repo.clone_from(
+            url=url, to_path=directory, tags=True, filter="blob:none", no_checkout=True
+        )
+        with repo.config_writer() as config:
+            config.set_value("core", "sparseCheckout", "true")
+        Path(repo.git_dir, "info").mkdir(exist_ok=True)
+        Path(repo.git_dir, "info", "sparse-checkout").write_text(
+            "".join(f"{path}\n" for path in sparse_paths)
+        )
+        # the blobs of the checked out files are fetched on demand
+        repo.git.read_tree("-mu", "HEAD")
+    except git.GitCommandError as ex:
+        logger.warning(f"Sparse checkout of {url} failed, cloning all of it: {ex}")
+        shutil.rmtree(directory, ignore_errors=True)
+        repo = git.repo.Repo.clone_from(url=url, to_path=directory, tags=True)
+    return repo
+
+
 def get_namespace_and_repo_name(url: str) -> Tuple[str, str]:
     try:
         if url.endswith(".git"):
@@ -7,6 +7,7 @@ import github
 
 from packit.config import Config, PackageConfig
 from packit.downstream_checks import DownstreamCheck
+from packit.github_tokens import get_github_token
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +21,7 @@ class SourceGitCheckHelper:
         self.config = config
         self.package_config = package_config
         # TODO: Use OGR instead of the PyGitHub directly
-        self.gh = github.Github(login_or_token=self.config.github_token)
+        self.gh = github.Github(login_or_token=get_github_token(self.config))
 
     def set_init_check(self, full_name: str, pr_id: int, check: DownstreamCheck):
         """
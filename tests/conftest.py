@@ -10,24 +10,29 @@ from flexmock import flexmock
 from ogr.abstract import PullRequest, PRStatus
 from ogr.services.github import GithubService
 from ogr.services.pagure import PagureProject, PagureService
-from rebasehelper.specfile import SpecFile
 
 from packit.api import PackitAPI
 from packit.config import get_local_package_config
 from packit.distgit import DistGit
 from packit.upstream import Upstream
 from packit.fedpkg import FedPKG
-from tests.spellbook import prepare_dist_git_repo, get_test_config
+from packit.specfile import Specfile
+from tests.spellbook import Clock, prepare_dist_git_repo, get_test_config
 from .spellbook import TARBALL_NAME, UPSTREAM, git_add_n_commit, DISTGIT
 
 
+@pytest.fixture()
+def clock():
+    return Clock()
+
+
 @pytest.fixture()
 def mock_downstream_remote_functionality(downstream_n_distgit):
     u, d = downstream_n_distgit
 
     flexmock(DistGit, update_branch=lambda *args, **kwargs: "0.0.0")
 
-    def mock_download_remote_sources():
+    def mock_download_remote_sources(directory=None):
         """ mock download of the remote archive and place it into dist-git repo """
         tarball_path = d / TARBALL_NAME
         hops_filename = "hops"
@@ -35,7 +40,7 @@ def mock_downstream_remote_functionality(downstream_n_distgit):
         hops_path.write_text("Cascade\n")
         subprocess.check_call(["tar", "-cf", str(tarball_path), hops_filename], cwd=d)
 
-    flexmock(SpecFile, download_remote_sources=mock_download_remote_sources)
+    flexmock(Specfile, download_remote_sources=mock_download_remote_sources)
 
     pc = get_local_package_config(str(u))
     pc.downstream_project_url = str(d)
@@ -72,7 +77,7 @@ def mock_upstream_remote_functionality(upstream_n_distgit):
         pr_create=mocked_pr_create,
     )
 
-    def mock_download_remote_sources():
+    def mock_download_remote_sources(directory=None):
         """ mock download of the remote archive and place it into dist-git repo """
         tarball_path = d / TARBALL_NAME
         hops_filename = "hops"
@@ -80,7 +85,7 @@ def mock_upstream_remote_functionality(upstream_n_distgit):
         hops_path.write_text("Cascade\n")
         subprocess.check_call(["tar", "-cf", str(tarball_path), hops_filename], cwd=d)
 
-    flexmock(SpecFile, download_remote_sources=mock_download_remote_sources)
+    flexmock(Specfile, download_remote_sources=mock_download_remote_sources)
 
     flexmock(GithubService, get_project=lambda repo, namespace: flexmock())
 
@@ -0,0 +1,41 @@
+"""
+Replay recorded events against local repositories
+"""
+from pathlib import Path
+
+from packit.bot_api import PackitBotAPI
+from packit.constants import GH2FED_RELEASE_TOPIC
+from packit.recording import EventRecorder, load_recording
+from packit.replay import EventReplayer, local_stand_ins
+from tests.spellbook import get_test_config
+
+RELEASE_EVENT = {
+    "msg": {
+        "repository": {
+            "name": "beerware",
+            "owner": {"login": "stand-in"},
+            "html_url": "https://github.com/stand-in/beerware",
+        },
+        "release": {"tag_name": "0.1.0"},
+    }
+}
+
+
+def test_replay_release_with_stand_ins(upstream_n_distgit, tmpdir):
+    u, d = upstream_n_distgit
+    recording = Path(str(tmpdir)) / "events.jsonl"
+    EventRecorder(recording).record(GH2FED_RELEASE_TOPIC, RELEASE_EVENT)
+
+    dispatcher = PackitBotAPI(get_test_config()).get_dispatcher(
+        events=["release"], workers=1
+    )
+    with local_stand_ins(str(u), str(d)):
+        report = EventReplayer(dispatcher, speedup=0).replay(
+            load_recording(recording)
+        )
+
+    assert report.events == 1
+    assert report.failures == 0
+    # the whole sync ran, up to the pull request in the stand-in dist-git
+    assert len(report.stages["upload_archive"]) == 1
+    assert len(report.stages["create_pull"]) == 1
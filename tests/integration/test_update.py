@@ -4,12 +4,12 @@ from os import chdir
 import pytest
 from flexmock import flexmock
 from packit.local_project import LocalProject
-from rebasehelper.specfile import SpecFile
 
 from packit.api import PackitAPI
 from packit.bot_api import PackitBotAPI
 from packit.config import get_local_package_config
 from packit.fed_mes_consume import Consumerino
+from packit.specfile import Specfile
 from tests.spellbook import TARBALL_NAME, get_test_config
 
 
@@ -53,7 +53,7 @@ def test_basic_local_update(upstream_n_distgit, mock_upstream_remote_functionali
     api.sync_release("master", "0.1.0")
 
     assert (d / TARBALL_NAME).is_file()
-    spec = SpecFile(str(d / "beer.spec"), None)
+    spec = Specfile(str(d / "beer.spec"))
     assert spec.get_version() == "0.1.0"
 
 
@@ -72,7 +72,7 @@ def test_basic_local_update_from_downstream(
     api.sync_from_downstream("master", "master", True)
 
     assert (u / "beer.spec").is_file()
-    spec = SpecFile(str(u / "beer.spec"), None)
+    spec = Specfile(str(u / "beer.spec"))
     assert spec.get_version() == "0.0.0"
 
 
@@ -83,7 +83,7 @@ def test_single_message(github_release_fedmsg, mock_upstream_remote_functionalit
     api = PackitBotAPI(conf)
     api.sync_upstream_release_with_fedmsg(github_release_fedmsg)
     assert (d / TARBALL_NAME).is_file()
-    spec = SpecFile(str(d / "beer.spec"), None)
+    spec = Specfile(str(d / "beer.spec"))
     assert spec.get_version() == "0.1.0"
 
 
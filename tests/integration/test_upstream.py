@@ -10,10 +10,10 @@ import github
 import pytest
 from flexmock import flexmock
 from packit.config import Config
-from rebasehelper.versioneer import versioneers_runner
 
 from packit.exceptions import PackitException
-from tests.spellbook import does_bumpspec_know_new
+from packit.github_tokens import github_app_tokens
+from packit.upstream_versions import upstream_versions
 
 
 def test_get_spec_version(upstream_instance):
@@ -38,7 +38,7 @@ def test_get_current_version(upstream_instance):
 )
 def test_get_version(upstream_instance, m_v, exp):
     u, ups = upstream_instance
-    flexmock(versioneers_runner, run=lambda **kw: m_v)
+    flexmock(upstream_versions).should_receive("get_latest_version").and_return(m_v)
 
     assert ups.get_version() == exp
 
@@ -50,10 +50,6 @@ def test_get_version(upstream_instance, m_v, exp):
     assert re.match(r"0\.1\.0\.1\.\w{8}", ups.get_current_version())
 
 
-@pytest.mark.skipif(
-    not does_bumpspec_know_new(),
-    reason="Current version of rpmdev-bumpspec doesn't understand --new option.",
-)
 def test_bumpspec(upstream_instance):
     u, ups = upstream_instance
 
@@ -61,6 +57,7 @@ def test_bumpspec(upstream_instance):
     ups.bump_spec(version=new_ver, changelog_entry="asdqwe")
 
     assert ups.get_specfile_version() == new_ver
+    assert "- asdqwe" in u.joinpath("beer.spec").read_text()
 
 
 def test_set_spec_ver(upstream_instance):
@@ -124,6 +121,7 @@ def test_github_app(upstream_instance, tmpdir):
         str(tmpdir)
     )
     ups.config = Config.get_user_config()
+    github_app_tokens.clear()
 
     def fake_init(github_app_id, private_key):
         assert github_app_id == "qwe"
@@ -131,7 +129,7 @@ def test_github_app(upstream_instance, tmpdir):
 
     def fake_get_access_token(inst_id):
         assert inst_id == "asd"
-        return "good"
+        return flexmock(token="good", expires_at=None)
 
     flexmock(
         github.GithubIntegration,
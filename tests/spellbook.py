@@ -17,6 +17,16 @@ DISTGIT = DATA_DIR / "dist_git"
 TARBALL_NAME = "beerware-0.1.0.tar.gz"
 
 
+class Clock:
+    """ clock for the `clock` parameter of the caches, moved by hand: clock.now += 10 """
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
 def git_set_user_email(directory):
     subprocess.check_call(
         ["git", "config", "user.email", "test@example.com"], cwd=directory
@@ -91,9 +101,3 @@ def call_real_packit(parameters=None, envs=None, cwd=None):
     """ invoke packit in a subprocess """
     cmd = ["python3", "-m", "packit.cli.packit_base"] + parameters
     return subprocess.check_call(cmd, env=envs, cwd=cwd)
-
-
-def does_bumpspec_know_new():
-    """ does rpmdev-bumpspec know --new? """
-    h = subprocess.check_output(["rpmdev-bumpspec", "--help"])
-    return b"--new" in h
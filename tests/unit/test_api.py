@@ -0,0 +1,168 @@
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+from flexmock import flexmock
+
+from packit.api import PackitAPI
+from packit.exceptions import PackitException
+
+
+def test_sync_release_prepares_repos_in_parallel():
+    # both repositories have to be prepared at once to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+
+    def get_version():
+        barrier.wait()
+        return "1.0"
+
+    def update_branch(branch):
+        barrier.wait()
+    up_repo = flexmock(head=flexmock(commit="abcdef"), git=flexmock())
+    up = flexmock(
+        local_project=flexmock(git_repo=up_repo),
+        get_version=get_version,
+        active_branch=flexmock(checkout=lambda: "main"),
+    )
+    up.should_receive("checkout_release").with_args("1.0").once()
+    up_repo.git.should_receive("checkout").with_args("main").once()
+
+    dg = flexmock(local_project=flexmock(working_dir="/dist-git", ref="1.0-f31-update"))
+    dg.should_receive("create_branch").twice()
+    dg.should_receive("update_branch").with_args("f31").replace_with(update_branch)
+    dg.should_receive("checkout_branch").with_args("f31").once().ordered()
+    dg.should_receive("checkout_branch").with_args("1.0-f31-update").once().ordered()
+    dg.should_receive("commit").once()
+
+    api = PackitAPI(
+        config=flexmock(),
+        package_config=flexmock(
+            run_action=lambda **kwargs: None,
+            with_action=lambda action_name: False,
+            has_action=lambda action_name: False,
+        ),
+    )
+    api._up = up
+    api._dg = dg
+    flexmock(api).should_receive("push_and_create_pr").with_args(
+        pr_title="Update to upstream release 1.0",
+        pr_description="Upstream tag: 1.0\nUpstream commit: abcdef\n",
+        dist_git_branch="f31",
+    ).once()
+
+    api.sync_release("f31")
+
+
+def test_sync_release_to_branches(tmpdir):
+    up = flexmock(
+        local_project=flexmock(git_repo=flexmock(head=flexmock(commit="abcdef"))),
+    )
+    up.should_receive("get_version").and_return("1.0").once()
+    up.should_receive("checkout_release").never()
+    up.should_receive("create_patches").never()
+
+    worktrees = {}
+
+    def download_upstream_archive():
+        # the first worktree downloads the archive, the others share it
+        assert not download_upstream_archive.called
+        download_upstream_archive.called = True
+        archive = Path(tempfile.mkdtemp(dir=str(tmpdir))) / "pkg-1.0.tar.gz"
+        archive.write_text("archive")
+        return str(archive)
+
+    download_upstream_archive.called = False
+
+    @contextmanager
+    def worktree(branch_name, base):
+        working_dir = tempfile.mkdtemp(dir=str(tmpdir))
+        dg = flexmock(
+            local_project=flexmock(working_dir=working_dir, ref=branch_name),
+            upstream_archive_name="pkg-1.0.tar.gz",
+            download_upstream_archive=download_upstream_archive,
+        )
+        dg.should_receive("sync_files").once()
+        dg.should_receive("add_patches_to_specfile").with_args([]).once()
+        dg.should_receive("is_archive_in_lookaside_cache").and_return(False)
+        dg.should_receive("upload_to_lookaside_cache").replace_with(
+            lambda archive: Path(archive).is_file() or pytest.fail("no archive")
+        )
+        dg.should_receive("commit").once()
+        worktrees[base] = dg
+        yield dg
+
+    dg = flexmock(local_project=flexmock(), worktree=worktree)
+    dg.should_receive("fetch").once()
+
+    api = PackitAPI(
+        config=flexmock(),
+        package_config=flexmock(
+            run_action=lambda **kwargs: None, has_action=lambda action_name: False
+        ),
+    )
+    api._up = up
+    api._dg = dg
+    pull_requests = []
+    flexmock(api).should_receive("push_and_create_pr").replace_with(
+        lambda dist_git_branch, dg, **kwargs: pull_requests.append(
+            (dist_git_branch, dg.local_project.ref)
+        )
+    )
+
+    api.sync_release_to_branches(["master", "f31"], use_local_content=True)
+
+    assert set(worktrees) == {"origin/master", "origin/f31"}
+    assert sorted(pull_requests) == [
+        ("f31", "1.0-f31-update"),
+        ("master", "1.0-master-update"),
+    ]
+
+
+def test_sync_release_to_branches_with_custom_actions():
+    api = PackitAPI(
+        config=flexmock(),
+        package_config=flexmock(has_action=lambda action_name: action_name == "patch"),
+    )
+    kwargs = dict(
+        use_local_content=False,
+        version="1.0",
+        force_new_sources=False,
+        upstream_ref=None,
+    )
+    flexmock(api).should_receive("sync_release").with_args(
+        "master", **kwargs
+    ).once().ordered()
+    flexmock(api).should_receive("sync_release").with_args(
+        "f31", **kwargs
+    ).once().ordered()
+
+    api.sync_release_to_branches(["master", "f31"], version="1.0")
+
+
+@pytest.mark.parametrize("set_version_fails", (False, True))
+def test_create_srpm_sets_spec_version(set_version_fails):
+    up = flexmock(
+        get_current_version=lambda: "1.0.1.dev3",
+        get_specfile_version=lambda: "1.0",
+        create_archive=lambda: None,
+    )
+    set_spec_version = up.should_receive("set_spec_version").with_args(
+        version="1.0.1.dev3", changelog_entry="- Development snapshot"
+    )
+    if set_version_fails:
+        set_spec_version.and_raise(PackitException).once()
+        up.should_receive("bump_spec").with_args(
+            version="1.0.1.dev3", changelog_entry="Development snapshot"
+        ).once()
+    else:
+        set_spec_version.once()
+        up.should_receive("bump_spec").never()
+    up.should_receive("create_srpm").with_args(srpm_path="out.src.rpm").and_return(
+        Path("out.src.rpm")
+    )
+
+    api = PackitAPI(config=flexmock(), package_config=flexmock())
+    api._up = up
+    assert api.create_srpm(output_file="out.src.rpm") == Path("out.src.rpm")
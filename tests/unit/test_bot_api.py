@@ -0,0 +1,29 @@
+import pytest
+
+from packit.bot_api import get_dist_git_branches
+from packit.config import JobConfig, PackageConfig, TriggerType
+
+
+@pytest.mark.parametrize(
+    "jobs,trigger,branches",
+    [
+        ([], TriggerType.release, ["master"]),
+        (
+            [
+                JobConfig(TriggerType.release, ["master", "f31"], {}),
+                JobConfig(TriggerType.pull_request, ["f30"], {}),
+                JobConfig(TriggerType.release, ["f31", "f30"], {}),
+            ],
+            TriggerType.release,
+            ["master", "f31", "f30"],
+        ),
+        (
+            [JobConfig(TriggerType.release, ["f31"], {})],
+            TriggerType.pull_request,
+            ["master"],
+        ),
+    ],
+)
+def test_get_dist_git_branches(jobs, trigger, branches):
+    package_config = PackageConfig(specfile_path="pkg.spec", jobs=jobs)
+    assert get_dist_git_branches(package_config, trigger) == branches
@@ -1,11 +1,16 @@
+import subprocess
+import sys
+
+import click
 import pytest
 
 from packit.cli.build import build
 from packit.cli.create_update import create_update
-from packit.cli.packit_base import packit_base
+from packit.cli.packit_base import LAZY_SUBCOMMANDS, packit_base
 from packit.cli.packit_base import version as cli_version
 from packit.cli.update import update
 from packit.cli.watch_upstream_release import watch_releases
+from packit import tracing
 from tests.spellbook import call_packit
 
 
@@ -40,9 +45,50 @@ def test_base_subcommand_direct(cmd_function):
 
 
 @pytest.mark.parametrize(
-    "subcommand", ["propose-update", "watch-releases", "build", "create-update"]
+    "subcommand",
+    [
+        "propose-update",
+        "watch-releases",
+        "watch",
+        "replay-events",
+        "build",
+        "create-update",
+    ],
 )
 def test_base_subcommand_help(subcommand):
     result = call_packit(packit_base, parameters=[subcommand, "--help"])
     assert result.exit_code == 0
     assert f"Usage: packit {subcommand} [OPTIONS]" in result.output
+
+
+def test_trace_option(tmpdir):
+    trace = tmpdir / "trace.json"
+    result = call_packit(packit_base, parameters=["--trace", str(trace), "version"])
+    assert result.exit_code == 0
+    # no workflow ran, nothing was traced, but the exporter is gone
+    assert not trace.exists()
+    assert not tracing._exporters
+
+
+@pytest.mark.parametrize("subcommand", sorted(LAZY_SUBCOMMANDS))
+def test_lazy_subcommand_matches_command(subcommand):
+    ctx = click.Context(packit_base)
+    command = packit_base.get_command(ctx, subcommand)
+    assert command.name == subcommand
+    assert command.get_short_help_str(100) == click.Command(
+        subcommand, help=LAZY_SUBCOMMANDS[subcommand].short_help
+    ).get_short_help_str(100)
+
+
+def test_startup_does_not_import_heavy_modules():
+    """ guard the startup time of `packit --help` and `packit version` """
+    heavy = ["git", "ogr", "github", "jsonschema", "rebasehelper", "fedmsg"]
+    code = (
+        "import sys\n"
+        "import packit.cli.packit_base\n"
+        f"print(' '.join(m for m in {heavy!r} if m in sys.modules))"
+    )
+    output = subprocess.check_output(
+        [sys.executable, "-c", code], universal_newlines=True
+    )
+    assert output.split() == []
@@ -12,6 +12,13 @@ from packit.config import (
     TriggerType,
     get_packit_config_from_repo,
     Config,
+    ConfigFileCache,
+    NOT_CACHED,
+    SharedConfig,
+    RepoConfigCache,
+    load_package_config,
+    parsed_config_cache,
+    repo_config_cache,
 )
 
 
@@ -494,3 +501,122 @@ def test_get_user_config(tmpdir):
         None
     )
     assert config.pagure_fork_token == "o"
+
+
+SHA = "a" * 40
+PACKAGE_CONFIG = "specfile_path: packit.spec\nsynced_files: [packit.spec]\n"
+
+
+@pytest.fixture()
+def empty_repo_config_cache():
+    repo_config_cache.clear()
+    yield
+    repo_config_cache.clear()
+
+
+def test_get_packit_config_from_repo_lists_files_once(empty_repo_config_cache):
+    project = flexmock(full_repo_name="org/repo")
+    project.should_receive("get_files").with_args(ref=SHA).and_return(
+        ["README.md", "packit.yaml", ".packit.json"]
+    ).once()
+    project.should_receive("get_file_content").with_args(
+        path=".packit.json", ref=SHA
+    ).and_return('{"specfile_path": "packit.spec", "synced_files": []}').once()
+
+    for _ in range(2):
+        config = get_packit_config_from_repo(sourcegit_project=project, ref=SHA)
+        assert config.specfile_path == "packit.spec"
+
+
+def test_get_packit_config_from_repo_negative_cache(empty_repo_config_cache):
+    project = flexmock(full_repo_name="org/repo")
+    project.should_receive("get_files").and_return(["README.md"]).times(3)
+    project.should_receive("get_file_content").never()
+
+    # a commit doesn't change, neither does the absence of the config
+    assert not get_packit_config_from_repo(sourcegit_project=project, ref=SHA)
+    assert not get_packit_config_from_repo(sourcegit_project=project, ref=SHA)
+    # a branch can change: the config may appear there later
+    assert not get_packit_config_from_repo(sourcegit_project=project, ref="master")
+    assert not get_packit_config_from_repo(sourcegit_project=project, ref="master")
+    assert not get_packit_config_from_repo(sourcegit_project=project, ref="b" * 40)
+
+
+def test_repo_config_cache_expiration():
+    now = [0]
+    cache = RepoConfigCache(max_size=2, negative_ttl=10, clock=lambda: now[0])
+    cache.put("repo", "master", None)
+    cache.put("repo", "master-with-config", ("packit.yaml", PACKAGE_CONFIG))
+    cache.put("repo", SHA, ("packit.yaml", PACKAGE_CONFIG))
+    assert cache.get("repo", "master") is None
+    # only the absence of a config is cached for branches
+    assert cache.get("repo", "master-with-config") is NOT_CACHED
+
+    now[0] = 10
+    assert cache.get("repo", "master") is NOT_CACHED
+    assert cache.get("repo", SHA) == ("packit.yaml", PACKAGE_CONFIG)
+
+    cache.put("repo", "b" * 40, None)
+    cache.put("repo", "c" * 40, None)
+    # the least recently used entry was dropped
+    assert cache.get("repo", SHA) is NOT_CACHED
+
+
+def test_load_package_config_parses_content_once():
+    parsed_config_cache.clear()
+    content = (
+        "specfile_path: packit.spec\n"
+        "synced_files: [packit.spec]\n"
+        "jobs:\n"
+        "- trigger: release\n"
+        "  release_to: [f31]\n"
+    )
+    flexmock(PackageConfig).should_call("validate_dict").once()
+
+    first = load_package_config(content, source="packit.yaml")
+    first.synced_files.append("README.md")
+    second = load_package_config(content, source="packit.yaml")
+
+    # a new instance, not affected by changes of the first one
+    assert second is not first
+    assert second.synced_files == ["packit.spec"]
+    assert second.jobs == [
+        JobConfig(trigger=TriggerType.release, release_to=["f31"], metadata={})
+    ]
+    parsed_config_cache.clear()
+
+
+def test_config_file_cache(tmpdir):
+    path = Path(str(tmpdir)) / "packit.yaml"
+    path.write_text("debug: true\n")
+    cache = ConfigFileCache()
+
+    first = cache.load(path)
+    first["debug"] = False
+    flexmock(Path).should_receive("read_text").never()
+    assert cache.load(path) == {"debug": True}
+
+
+def test_config_file_cache_reload(tmpdir):
+    path = Path(str(tmpdir)) / "packit.yaml"
+    path.write_text("debug: true\n")
+    cache = ConfigFileCache()
+    assert cache.load(path) == {"debug": True}
+
+    # a different size, the file was changed
+    path.write_text("debug: false\n")
+    assert cache.load(path) == {"debug": False}
+
+
+def test_shared_config(tmpdir):
+    path = Path(str(tmpdir)) / ".packit.yaml"
+    path.write_text("fas_user: rambo\n")
+    flexmock(Config).should_receive("get_user_config_path").and_return(path)
+    shared_config = SharedConfig()
+
+    config = shared_config.get()
+    assert config.fas_user == "rambo"
+    assert shared_config.get() is config
+
+    path.write_text("fas_user: john_rambo\n")
+    assert shared_config.get().fas_user == "john_rambo"
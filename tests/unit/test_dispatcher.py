@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+from packit.dispatcher import Dispatcher
+
+
+def test_route_longest_prefix_wins():
+    d = Dispatcher()
+    d.register("org.fedoraproject.prod.github.", lambda t, m: "generic")
+    d.register("org.fedoraproject.prod.github.release", lambda t, m: "release")
+
+    assert d.route("org.fedoraproject.prod.github.release")(None, None) == "release"
+    assert d.route("org.fedoraproject.prod.github.push")(None, None) == "generic"
+    assert d.route("org.fedoraproject.prod.pagure.pull-request.new") is None
+
+
+def test_topics():
+    d = Dispatcher()
+    d.register("a.b.c", lambda t, m: None)
+    d.register("a.b.d.", lambda t, m: None)
+    assert d.topics == ["a.b.c", "a.b.d."]
+
+
+def test_consume():
+    processed = []
+
+    def handler(topic, msg):
+        processed.append((topic, msg["id"]))
+
+    d = Dispatcher(workers=2)
+    d.register("a.b.", handler)
+    d.consume([("a.b.c", {"id": 1}), ("x.y", {"id": 2}), ("a.b.d", {"id": 3})])
+    d.shutdown(wait=True)
+
+    assert sorted(processed) == [("a.b.c", 1), ("a.b.d", 3)]
+
+
+def test_dispatch_failure_does_not_stop_consuming():
+    def handler(topic, msg):
+        if msg["fail"]:
+            raise RuntimeError("handler failed")
+        return msg
+
+    d = Dispatcher()
+    d.register("a.", handler)
+    failing = d.dispatch("a.b", {"fail": True})
+    passing = d.dispatch("a.b", {"fail": False})
+    d.shutdown(wait=True)
+
+    with pytest.raises(RuntimeError):
+        failing.result()
+    assert passing.result() == {"fail": False}
+
+
+def test_dispatch_blocks_when_workers_are_busy():
+    release = threading.Event()
+    d = Dispatcher(workers=1, backlog=1)
+    d.register("a.", lambda t, m: release.wait(5))
+    d.dispatch("a.b", {})
+    d.dispatch("a.b", {})
+
+    third = threading.Thread(target=d.dispatch, args=("a.b", {}))
+    third.start()
+    third.join(0.1)
+    # one message is processed, one is waiting: no room for the third one
+    assert third.is_alive()
+
+    release.set()
+    third.join(5)
+    assert not third.is_alive()
+    d.shutdown(wait=True)
@@ -0,0 +1,136 @@
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+from flexmock import flexmock
+
+import packit.distgit
+import packit.specfile
+import packit.status
+from packit.distgit import DistGit
+from packit.exceptions import PackitException
+from packit.local_project import LocalProject
+from packit.specfile import spec_metadata_cache
+from packit.status import Status
+
+
+@pytest.fixture()
+def distgit(tmpdir):
+    origin = Path(str(tmpdir)) / "origin"
+    origin.mkdir()
+    subprocess.check_call(["git", "init", "-q", "-b", "master"], cwd=origin)
+    for branch in ("master", "f31"):
+        subprocess.check_call(["git", "checkout", "-q", "-B", branch], cwd=origin)
+        (origin / "pkg.spec").write_text(f"Version: {branch}\n")
+        subprocess.check_call(["git", "add", "pkg.spec"], cwd=origin)
+        subprocess.check_call(
+            ["git", "-c", "user.name=a", "-c", "user.email=a@b", "commit", "-qm", branch],
+            cwd=origin,
+        )
+    subprocess.check_call(["git", "checkout", "-q", "master"], cwd=origin)
+    clone = Path(str(tmpdir)) / "clone"
+    subprocess.check_call(["git", "clone", "-q", str(origin), str(clone)])
+
+    dg = DistGit(
+        config=flexmock(
+            github_token=None,
+            pagure_user_token=None,
+            pagure_fork_token=None,
+            fas_user=None,
+            cache_dir=None,
+        ),
+        package_config=flexmock(
+            downstream_package_name="pkg",
+            downstream_project_url=str(clone),
+            synced_files=[],
+            dist_git_namespace="rpms",
+        ),
+    )
+    dg._local_project = LocalProject(
+        working_dir=str(clone), namespace="rpms", repo_name="pkg", offline=True
+    )
+    return dg
+
+
+def test_worktree(distgit):
+    with distgit.worktree("1.0-f31-update", base="origin/f31") as f31:
+        with distgit.worktree("1.0-master-update", base="origin/master") as master:
+            assert Path(f31.specfile_path).read_text() == "Version: f31\n"
+            assert Path(master.specfile_path).read_text() == "Version: master\n"
+            assert str(f31.local_project.ref) == "1.0-f31-update"
+            path = Path(f31.local_project.working_dir)
+
+    assert not path.exists()
+    assert distgit.local_project.git_repo.git.worktree("list").count("\n") == 0
+    # the branches are kept to be pushed
+    assert "1.0-f31-update" in distgit.local_project.git_repo.heads
+    assert Path(distgit.specfile_path).read_text() == "Version: master\n"
+
+
+def test_worktree_missing_branch(distgit):
+    with pytest.raises(PackitException):
+        with distgit.worktree("1.0-f99-update", base="origin/f99"):
+            pass
+
+
+def test_worktree_failed_removal(distgit):
+    git_dir = Path(distgit.local_project.git_repo.git_dir)
+    with pytest.raises(RuntimeError, match="sync failed"):
+        with distgit.worktree("1.0-f31-update", base="origin/f31") as f31:
+            path = Path(f31.local_project.working_dir)
+            # git doesn't know the worktree anymore, removing it fails
+            shutil.rmtree(str(git_dir / "worktrees"))
+            raise RuntimeError("sync failed")
+    assert not path.exists()
+    # the next worktree prunes what's left
+    with distgit.worktree("1.0-f31-update", base="origin/f31"):
+        pass
+
+
+def test_worktree_detached(distgit):
+    with distgit.worktree(None, base="origin/f31") as f31:
+        assert f31.local_project.git_repo.head.is_detached
+        assert Path(f31.specfile_path).read_text() == "Version: f31\n"
+    assert [h.name for h in distgit.local_project.git_repo.heads] == ["master"]
+
+
+def test_status_dg_versions(distgit):
+    # the specs are read from git, the checkout of dist-git is intact
+    distgit.local_project.git_project = flexmock(
+        get_branches=lambda: ["master", "f31", "f99"], service=flexmock()
+    )
+    status = Status.__new__(Status)
+    status.dg = distgit
+
+    flexmock(packit.status.logger).should_receive("info").with_args(
+        "master: master"
+    ).once().ordered()
+    flexmock(packit.status.logger).should_receive("info").with_args(
+        "f31: f31"
+    ).once().ordered()
+
+    status.get_dg_versions()
+    assert str(distgit.local_project.ref) == "master"
+    assert Path(distgit.specfile_path).read_text() == "Version: master\n"
+
+
+def test_specfile_metadata_cached(distgit):
+    spec_metadata_cache.clear()
+    flexmock(packit.specfile.Specfile).should_call("__init__").once()
+    assert distgit.get_specfile_metadata().version == "master"
+    # the same blob in git: neither read nor parsed again
+    assert distgit.get_specfile_metadata("origin/master").version == "master"
+
+
+def test_sparse_paths(distgit):
+    distgit.files_to_sync = ["packit.spec", "/README.md", "files/tmpfiles.conf"]
+    assert distgit.sparse_paths == [
+        "/pkg.spec",
+        "/sources",
+        "/.gitignore",
+        "/*.patch",
+        "/packit.spec",
+        "/README.md",
+        "/tmpfiles.conf",
+    ]
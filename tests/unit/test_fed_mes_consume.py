@@ -0,0 +1,130 @@
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import zmq
+from flexmock import flexmock
+
+from packit.exceptions import PackitException
+from packit.fed_mes_consume import Consumerino, DatagrepperClient
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    # http.server.ThreadingHTTPServer is not available in python 3.6
+    daemon_threads = True
+
+
+def test_iterate_topics():
+    context = zmq.Context.instance()
+    publisher = context.socket(zmq.PUB)
+    port = publisher.bind_to_random_port("tcp://127.0.0.1")
+    config = {"endpoints": {"test": [f"tcp://127.0.0.1:{port}"]}}
+    stop = threading.Event()
+
+    def publish():
+        # zeromq drops messages published before the subscription is set up
+        while not stop.is_set():
+            for topic in ("org.a.release", "org.b.flag.added", "org.c.ignored"):
+                publisher.send_multipart(
+                    [topic.encode(), json.dumps({"topic": topic}).encode()]
+                )
+            time.sleep(0.01)
+
+    messages = Consumerino.iterate_topics(["org.a.", "org.b.flag"], config=config)
+    thread = threading.Thread(target=publish)
+    thread.start()
+    try:
+        received = {topic for topic, _ in itertools.islice(messages, 20)}
+    finally:
+        stop.set()
+        thread.join()
+        messages.close()
+        publisher.close()
+    assert received == {"org.a.release", "org.b.flag.added"}
+
+
+@pytest.fixture()
+def datagrepper_server():
+    """ local stand-in for datagrepper: provides {"msg_id": id} for every id """
+    requested = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            msg_id = parse_qs(urlparse(self.path).query)["id"][0]
+            requested.append(msg_id)
+            if msg_id == "missing":
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = json.dumps({"msg_id": msg_id, "msg": {}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_port}/id?id={{msg_id}}&is_raw=true"
+    yield url, requested
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_many_keeps_order(datagrepper_server):
+    url, requested = datagrepper_server
+    client = DatagrepperClient(url=url, max_workers=4)
+    msg_ids = [f"2019-{i}" for i in range(20)]
+    msgs = client.fetch_many(msg_ids)
+    assert [m["msg_id"] for m in msgs] == msg_ids
+    assert sorted(requested) == sorted(msg_ids)
+
+
+def test_fetch_cached(datagrepper_server, tmpdir):
+    url, requested = datagrepper_server
+    consumerino = Consumerino(url=url, cache_dir=str(tmpdir))
+    assert consumerino.fetch_fedmsg_dict("2019-a")["msg_id"] == "2019-a"
+    assert consumerino.fetch_fedmsg_dicts(["2019-a", "2019-b"]) == [
+        {"msg_id": "2019-a", "msg": {}},
+        {"msg_id": "2019-b", "msg": {}},
+    ]
+    assert requested == ["2019-a", "2019-b"]
+
+    # a new instance (e.g. after restart) uses the cache on disk as well
+    client = DatagrepperClient(url=url, cache_dir=str(tmpdir))
+    assert client.fetch("2019-b")["msg_id"] == "2019-b"
+    assert requested == ["2019-a", "2019-b"]
+
+
+def test_fetch_error(datagrepper_server):
+    url, _ = datagrepper_server
+    client = DatagrepperClient(url=url, retries=0)
+    with pytest.raises(PackitException) as ex:
+        client.fetch("missing")
+    assert "Cannot fetch message missing" in str(ex.value)
+
+
+def test_cache_ids_do_not_collide(datagrepper_server, tmpdir):
+    url, requested = datagrepper_server
+    client = DatagrepperClient(url=url, cache_dir=str(tmpdir))
+    assert client.fetch("2019/a")["msg_id"] == "2019/a"
+    assert client.fetch("2019:a")["msg_id"] == "2019:a"
+    assert requested == ["2019/a", "2019:a"]
+
+
+def test_failed_cache_write_is_cleaned_up(datagrepper_server, tmpdir):
+    url, _ = datagrepper_server
+    client = DatagrepperClient(url=url, cache_dir=str(tmpdir))
+    flexmock(json).should_receive("dump").and_raise(OSError("No space left"))
+    assert client.fetch("2019-a")["msg_id"] == "2019-a"
+    assert not list(Path(str(tmpdir)).glob("**/*.tmp"))
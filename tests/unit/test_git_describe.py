@@ -0,0 +1,103 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+from flexmock import flexmock
+
+from packit import git_describe
+from packit.git_describe import describe
+
+
+def git(repo, *args, date="1551100000"):
+    env = {
+        "GIT_AUTHOR_DATE": f"{date} +0000",
+        "GIT_COMMITTER_DATE": f"{date} +0000",
+        "GIT_AUTHOR_NAME": "a",
+        "GIT_AUTHOR_EMAIL": "a@b",
+        "GIT_COMMITTER_NAME": "a",
+        "GIT_COMMITTER_EMAIL": "a@b",
+        "PATH": "/usr/bin:/bin:/usr/local/bin",
+        "HOME": str(repo),
+    }
+    return subprocess.check_output(
+        ["git", *args], cwd=repo, env=env, universal_newlines=True
+    ).strip()
+
+
+def git_describe_output(repo, match):
+    try:
+        return git(repo, "describe", "--tags", "--match", match)
+    except subprocess.CalledProcessError:
+        return None
+
+
+@pytest.fixture()
+def repo(tmpdir):
+    """
+    o       after merge (master)
+    o       merge
+    |\\
+    o |     more
+    o |     feature (lightweight)
+    | o     another fix: 1.0.1 (lightweight), release-branch
+    | o     fix
+    |/
+    o       1.0 (annotated), v1 (lightweight)
+    o       initial
+    """
+    repo = Path(str(tmpdir)) / "repo"
+    repo.mkdir()
+    git(repo, "init", "-q", "-b", "master")
+    date = 1551100000
+
+    def commit(message):
+        nonlocal date
+        date += 60
+        git(repo, "commit", "-q", "--allow-empty", "-m", message, date=str(date))
+
+    commit("initial")
+    commit("1.0")
+    git(repo, "tag", "-a", "-m", "1.0", "1.0", date=str(date))
+    git(repo, "tag", "v1")
+    git(repo, "checkout", "-q", "-b", "release-branch")
+    commit("fix")
+    commit("another fix")
+    git(repo, "tag", "1.0.1")
+    git(repo, "checkout", "-q", "master")
+    commit("feature")
+    git(repo, "tag", "feature")
+    commit("more")
+    git(repo, "merge", "-q", "--no-ff", "-m", "merge", "release-branch", date=str(date + 1))
+    commit("after merge")
+    return repo
+
+
+@pytest.mark.parametrize("match", ["*.*", "*", "v*", "nothing"])
+@pytest.mark.parametrize(
+    "ref", ["master", "master~1", "master~2", "release-branch", "release-branch~1"]
+)
+def test_describe_is_the_same_as_git(repo, ref, match):
+    git(repo, "checkout", "-q", ref)
+    assert describe(str(repo), match=match) == git_describe_output(repo, match)
+
+
+def test_describe_packed(repo):
+    git(repo, "gc", "-q")
+    git(repo, "tag", "-a", "-m", "2.0", "2.0", date="1551200000")
+    assert describe(str(repo), match="*.*") == "2.0"
+    git(repo, "checkout", "-q", "release-branch")
+    assert describe(str(repo), match="*.*") == git_describe_output(repo, "*.*")
+
+
+def test_describe_is_memoized(repo):
+    assert describe(str(repo), match="*.*") == git_describe_output(repo, "*.*")
+    flexmock(git_describe).should_receive("describe_commit").never()
+    assert describe(str(repo), match="*.*") == git_describe_output(repo, "*.*")
+
+
+def test_describe_shallow(repo, tmpdir):
+    clone = Path(str(tmpdir)) / "shallow"
+    subprocess.check_call(
+        ["git", "clone", "-q", "--depth=1", f"file://{repo}", str(clone)]
+    )
+    assert describe(str(clone)) is None
@@ -0,0 +1,76 @@
+import datetime
+
+import github
+import pytest
+from flexmock import flexmock
+
+from packit.config import Config
+from packit.exceptions import PackitException
+from packit.github_tokens import GithubAppTokens, get_github_token
+
+
+@pytest.fixture()
+def cert(tmpdir):
+    path = tmpdir / "cert.pem"
+    path.write_text("private key", encoding="utf-8")
+    return str(path)
+
+
+def mock_integration(token="good", expires_at=None, times=1):
+    integration = flexmock()
+    integration.should_receive("get_access_token").with_args("456").and_return(
+        flexmock(token=token, expires_at=expires_at)
+    ).times(times)
+    flexmock(github).should_receive("GithubIntegration").with_args(
+        "123", "private key"
+    ).and_return(integration).times(times)
+
+
+def test_token_is_cached_until_it_expires(clock, cert):
+    tokens = GithubAppTokens(margin=60, clock=clock)
+    expires_at = datetime.datetime.fromtimestamp(clock.now + 3600, datetime.timezone.utc)
+    mock_integration(expires_at=expires_at, times=2)
+    assert tokens.get_token("123", "456", cert) == "good"
+    clock.now += 3600 - 61
+    assert tokens.get_token("123", "456", cert) == "good"
+    clock.now += 2
+    assert tokens.get_token("123", "456", cert) == "good"
+
+
+def test_naive_expiration_is_utc(clock, cert):
+    tokens = GithubAppTokens(margin=0, clock=clock)
+    expires_at = datetime.datetime.fromtimestamp(
+        clock.now + 10, datetime.timezone.utc
+    ).replace(tzinfo=None)
+    mock_integration(expires_at=expires_at)
+    tokens.get_token("123", "456", cert)
+    assert tokens._tokens[("123", "456")].expires_at == clock.now + 10
+
+
+def test_token_requested_by_another_worker(clock, cert, tmpdir):
+    cache_dir = str(tmpdir / "cache")
+    expires_at = datetime.datetime.fromtimestamp(clock.now + 600, datetime.timezone.utc)
+    mock_integration(expires_at=expires_at, times=2)
+    worker = GithubAppTokens(margin=60, clock=clock)
+    assert worker.get_token("123", "456", cert, cache_dir=cache_dir) == "good"
+    (cached,) = (tmpdir / "cache" / "github-app-tokens").listdir()
+    # the token is a secret
+    assert cached.stat().mode & 0o077 == 0
+
+    other_worker = GithubAppTokens(margin=60, clock=clock)
+    assert other_worker.get_token("123", "456", cert, cache_dir=cache_dir) == "good"
+    # the token on the disk is about to expire, a new one is requested
+    clock.now += 600 - 60
+    assert other_worker.get_token("123", "456", cert, cache_dir=cache_dir) == "good"
+
+
+def test_missing_certificate(clock, tmpdir):
+    with pytest.raises(PackitException):
+        GithubAppTokens(clock=clock).get_token("123", "456", str(tmpdir / "nope"))
+
+
+def test_get_github_token_without_app():
+    config = Config()
+    config.github_token = "plain"
+    flexmock(github).should_receive("GithubIntegration").never()
+    assert get_github_token(config) == "plain"
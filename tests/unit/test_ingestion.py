@@ -0,0 +1,80 @@
+import hmac
+
+import pytest
+
+from packit.service.ingestion import (
+    DeliveryCache,
+    RateLimiter,
+    Rejection,
+    WebhookIngestion,
+    verify_signature,
+)
+from tests.spellbook import Clock
+
+
+def sign(secret, body, algorithm="sha256"):
+    return f"{algorithm}=" + hmac.new(secret, body, algorithm).hexdigest()
+
+
+@pytest.mark.parametrize(
+    "signature,valid",
+    [
+        (sign(b"secret", b"{}"), True),
+        (sign(b"secret", b"{}", "sha1"), True),
+        (sign(b"other", b"{}"), False),
+        (sign(b"secret", b"{}", "md5"), False),
+        ("garbage", False),
+        (None, False),
+    ],
+)
+def test_verify_signature(signature, valid):
+    assert verify_signature("secret", b"{}", signature) is valid
+
+
+def test_delivery_cache_ttl():
+    clock = Clock()
+    cache = DeliveryCache(ttl=10, clock=clock)
+    assert cache.add("a")
+    assert not cache.add("a")
+    clock.now += 11
+    assert cache.add("a")
+
+
+def test_delivery_cache_max_size():
+    cache = DeliveryCache(max_size=2)
+    for delivery_id in "abc":
+        assert cache.add(delivery_id)
+    # the oldest one was forgotten
+    assert cache.add("a")
+    assert not cache.add("c")
+
+
+def test_rate_limiter():
+    clock = Clock()
+    limiter = RateLimiter(rate=1, burst=2, clock=clock)
+    assert limiter.allow("a/b")
+    assert limiter.allow("a/b")
+    assert not limiter.allow("a/b")
+    # other repositories are not affected
+    assert limiter.allow("c/d")
+    clock.now += 1
+    assert limiter.allow("a/b")
+    assert not limiter.allow("a/b")
+
+
+def test_ingestion():
+    ingestion = WebhookIngestion(secret="secret", burst=1, rate=0)
+    ingestion.check_signature(b"{}", sign(b"secret", b"{}"))
+    with pytest.raises(Rejection) as ex:
+        ingestion.check_signature(b"{}", None)
+    assert ex.value.status == 401
+
+    ingestion.admit("1", "a/b")
+    with pytest.raises(Rejection) as ex:
+        ingestion.admit("1", "a/b")
+    assert ex.value.status == 200
+    with pytest.raises(Rejection) as ex:
+        ingestion.admit("2", "a/b")
+    assert ex.value.status == 429
+    # the rate limited delivery can be retried
+    assert ingestion.deliveries.add("2")
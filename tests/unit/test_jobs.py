@@ -0,0 +1,59 @@
+import logging
+import threading
+
+from packit.service.jobs import JobQueue, FINISHED, FAILED, QUEUED, RUNNING
+
+logger = logging.getLogger("packit.test")
+
+
+def test_job_lifecycle():
+    started = threading.Event()
+    release = threading.Event()
+
+    def work(x):
+        started.set()
+        release.wait(5)
+        logger.info(f"working on {x}")
+
+    queue = JobQueue(workers=1)
+    job = queue.submit("test job", work, 42)
+    assert job.state in (QUEUED, RUNNING)
+    assert queue.get(job.id) is job
+
+    started.wait(5)
+    assert job.state == RUNNING
+    release.set()
+    queue.shutdown(wait=True)
+
+    assert job.state == FINISHED
+    assert job.error is None
+    assert "working on 42" in job.logs
+    assert job.to_dict()["state"] == FINISHED
+
+
+def test_job_failure():
+    def work():
+        raise RuntimeError("no way")
+
+    queue = JobQueue(workers=1)
+    job = queue.submit("failing job", work)
+    queue.shutdown(wait=True)
+
+    assert job.state == FAILED
+    assert "no way" in job.error
+
+
+def test_unknown_job():
+    assert JobQueue().get("nope") is None
+
+
+def test_forget_old_jobs():
+    queue = JobQueue(workers=1, keep_finished=2)
+    ids = []
+    for _ in range(4):
+        job = queue.submit("job", lambda: None)
+        ids.append(job.id)
+        # wait for the job to finish before submitting another one
+        queue._executor.submit(lambda: None).result()
+    assert queue.get(ids[0]) is None
+    assert queue.get(ids[-1]) is not None
@@ -0,0 +1,74 @@
+from packit.dispatcher import Dispatcher
+from packit.journal import EventJournal, DONE, FAILED, RECEIVED
+
+
+def test_record_dedup(tmpdir):
+    journal = EventJournal(str(tmpdir / "journal.db"))
+    assert journal.record("1", "a.b", {"msg_id": "1"})
+    assert not journal.record("1", "a.b", {"msg_id": "1"})
+    assert journal.get_state("1") == RECEIVED
+    assert journal.get_state("2") is None
+
+
+def test_unfinished_survive_restart(tmpdir):
+    path = str(tmpdir / "journal.db")
+    journal = EventJournal(path)
+    journal.record("1", "a.b", {"msg_id": "1", "n": 1})
+    journal.record("2", "a.b", {"msg_id": "2", "n": 2})
+    journal.record("3", "a.b", {"msg_id": "3", "n": 3})
+    journal.mark_done("1")
+    journal.mark_failed("3", error="RuntimeError()")
+    journal.close()
+
+    journal = EventJournal(path)
+    assert [e.msg_id for e in journal.unfinished()] == ["2"]
+    assert journal.unfinished()[0].msg == {"msg_id": "2", "n": 2}
+    assert [e.msg_id for e in journal.unfinished(include_failed=True)] == ["2", "3"]
+    assert journal.get_state("3") == FAILED
+
+
+def test_dispatcher_with_journal(tmpdir):
+    path = str(tmpdir / "journal.db")
+    journal = EventJournal(path)
+    journal.record("0", "a.b", {"msg_id": "0"})
+
+    processed = []
+
+    def handler(topic, msg):
+        if msg.get("fail"):
+            raise RuntimeError("failed")
+        processed.append(msg.get("msg_id", "-"))
+
+    d = Dispatcher(journal=journal)
+    d.register("a.", handler)
+    d.replay()
+    d.consume(
+        [
+            ("a.b", {"msg_id": "1"}),
+            ("a.b", {"msg_id": "1"}),
+            ("a.b", {"msg_id": "2", "fail": True}),
+            ("a.b", {"no": "id"}),
+        ]
+    )
+    d.shutdown(wait=True)
+
+    assert sorted(processed) == ["-", "0", "1"]
+    assert journal.get_state("0") == DONE
+    assert journal.get_state("1") == DONE
+    assert journal.get_state("2") == FAILED
+    assert not journal.unfinished()
+
+
+def test_prune_processed_events(tmpdir):
+    journal = EventJournal(tmpdir / "journal.db", retention=0)
+    journal.record("done", "a.b", {})
+    journal.record("failed", "a.b", {})
+    journal.record("received", "a.b", {})
+    journal.mark_done("done")
+    journal.mark_failed("failed", error="oops")
+
+    assert journal.prune() == 1
+    assert journal.get_state("done") is None
+    assert journal.get_state("failed") == FAILED
+    assert journal.get_state("received") == RECEIVED
+    journal.close()
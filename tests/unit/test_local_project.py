@@ -113,7 +113,7 @@ def test_parse_working_dir_from_git_repo():
 
 def test_parse_git_repo_from_git_url():
     flexmock(local_project).should_receive("get_repo").with_args(
-        "http://some.example/url/reponame"
+        "http://some.example/url/reponame", sparse_paths=None
     ).and_return(flexmock())
 
     project = LocalProject(git_url="http://some.example/url/reponame", refresh=False)
@@ -0,0 +1,83 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from packit.service.logs import JobLogBuffer, JobLogRouter, current_job_id
+from packit.utils import submit_in_context
+
+logger = logging.getLogger("packit.test")
+
+
+def test_buffer_drops_oldest_lines():
+    buffer = JobLogBuffer(max_bytes=10)
+    for i in range(5):
+        buffer.write(f"line {i}\n")
+    assert buffer.getvalue() == "[... 4 lines dropped ...]\nline 4\n"
+
+
+def test_buffer_spills_to_disk(tmpdir):
+    buffer = JobLogBuffer(max_bytes=10, spill_path=tmpdir / "job.log")
+    for i in range(5):
+        buffer.write(f"line {i}\n")
+    assert buffer.spilled
+    assert buffer.getvalue() == "".join(f"line {i}\n" for i in range(5))
+
+
+def test_router_separates_concurrent_jobs():
+    router = JobLogRouter()
+    root_logger = logging.getLogger()
+    root_logger.addHandler(router)
+    barrier = threading.Barrier(2)
+    buffers = {}
+
+    def job(job_id):
+        with router.capture(job_id) as buffer:
+            buffers[job_id] = buffer
+            barrier.wait(5)
+            logger.info(f"hello from {job_id}")
+            barrier.wait(5)
+
+    try:
+        threads = [threading.Thread(target=job, args=(j,)) for j in ("a", "b")]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        logger.info("not captured by anyone")
+    finally:
+        root_logger.removeHandler(router)
+
+    assert "hello from a" in buffers["a"].getvalue()
+    assert "hello from b" not in buffers["a"].getvalue()
+    assert "hello from b" in buffers["b"].getvalue()
+    assert "not captured" not in buffers["b"].getvalue()
+    assert current_job_id.get() is None
+
+
+def test_router_discard(tmpdir):
+    router = JobLogRouter(max_bytes=1, spill_dir=str(tmpdir))
+    with router.capture("a") as buffer:
+        buffer.write("some lines\n")
+        buffer.write("some more lines\n")
+    assert (tmpdir / "a.log").exists()
+    router.discard("a")
+    assert not (tmpdir / "a.log").exists()
+
+
+def test_context_is_passed_to_workers():
+    router = JobLogRouter()
+    root_logger = logging.getLogger()
+    root_logger.addHandler(router)
+    try:
+        with router.capture("a") as buffer:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                futures = [
+                    submit_in_context(executor, logger.info, f"from worker {i}")
+                    for i in range(2)
+                ]
+                for future in futures:
+                    future.result()
+    finally:
+        root_logger.removeHandler(router)
+    assert "from worker 0" in buffer.getvalue()
+    assert "from worker 1" in buffer.getvalue()
@@ -0,0 +1,73 @@
+import pytest
+
+from packit.cli.packit_base import packit_base
+from packit.metrics import REGISTRY, Registry, STAGE_DURATION, STAGE_FAILURES, timed
+from tests.spellbook import call_packit
+
+
+def test_counter_and_gauge():
+    registry = Registry()
+    counter = registry.counter("calls_total", "Calls.", labels=["call"])
+    counter.inc(call="a")
+    counter.inc(2, call="b")
+    gauge = registry.gauge("depth", "Depth.")
+    gauge.inc(3)
+    gauge.dec()
+
+    assert counter.get(call="b") == 2
+    assert registry.render() == (
+        "# HELP calls_total Calls.\n"
+        "# TYPE calls_total counter\n"
+        'calls_total{call="a"} 1\n'
+        'calls_total{call="b"} 2\n'
+        "# HELP depth Depth.\n"
+        "# TYPE depth gauge\n"
+        "depth 2\n"
+    )
+
+
+def test_histogram():
+    registry = Registry()
+    histogram = registry.histogram("duration", "Duration.", buckets=[1, 10])
+    histogram.observe(0.5)
+    histogram.observe(5)
+    assert histogram.get_count() == 2
+    assert registry.render().splitlines()[2:] == [
+        'duration_bucket{le="1"} 1',
+        'duration_bucket{le="10"} 2',
+        'duration_bucket{le="+Inf"} 2',
+        "duration_sum 5.5",
+        "duration_count 2",
+    ]
+
+
+def test_registry_conflicts():
+    registry = Registry()
+    assert registry.counter("a", "A.") is registry.counter("a", "A.")
+    with pytest.raises(ValueError):
+        registry.gauge("a", "A.")
+    with pytest.raises(ValueError):
+        registry.counter("a", "A.").inc(label="x")
+
+
+def test_timed():
+    @timed("test_stage")
+    def stage(fail):
+        if fail:
+            raise RuntimeError("failed")
+
+    count = STAGE_DURATION.get_count(stage="test_stage")
+    stage(False)
+    with pytest.raises(RuntimeError):
+        stage(True)
+    assert STAGE_DURATION.get_count(stage="test_stage") == count + 2
+    assert STAGE_FAILURES.get(stage="test_stage") == 1
+
+
+def test_metrics_file(tmpdir):
+    metrics_file = tmpdir / "metrics.txt"
+    result = call_packit(
+        packit_base, parameters=["--metrics-file", str(metrics_file), "version"]
+    )
+    assert result.exit_code == 0
+    assert metrics_file.read() == REGISTRY.render()
@@ -0,0 +1,94 @@
+import time
+from contextlib import ExitStack
+
+import pytest
+
+from packit.dispatcher import Dispatcher
+from packit.exceptions import PackitException
+from packit.recording import EventRecorder, RecordedEvent, load_recording
+from packit.replay import (
+    EventReplayer,
+    StageTimer,
+    _patch,
+    check_recording,
+    percentile,
+)
+
+
+class Worker:
+    def step(self):
+        time.sleep(0.01)
+
+
+def test_record_and_load(tmpdir):
+    path = str(tmpdir / "events.jsonl")
+    recorder = EventRecorder(path)
+    recorder.record("a.b", {"msg": {"n": 1}})
+    recorder.record("a.c", {"msg": {"n": 2}})
+
+    events = load_recording(path)
+    assert [(e.topic, e.msg["msg"]["n"]) for e in events] == [("a.b", 1), ("a.c", 2)]
+    assert events[0].time <= events[1].time
+
+
+@pytest.mark.parametrize(
+    "values,pct,result",
+    [([], 50, 0.0), ([1.0], 99, 1.0), ([3, 1, 2, 4], 50, 2), ([3, 1, 2, 4], 100, 4)],
+)
+def test_percentile(values, pct, result):
+    assert percentile(values, pct) == result
+
+
+def test_stage_timer():
+    stages = {"step": ("tests.unit.test_replay.Worker", "step")}
+    with StageTimer(stages) as timer:
+        Worker().step()
+        Worker().step()
+    Worker().step()
+    assert len(timer.durations["step"]) == 2
+    assert all(d >= 0.01 for d in timer.durations["step"])
+
+
+def test_replay(tmpdir):
+    def handler(topic, msg):
+        Worker().step()
+        if msg["fail"]:
+            raise RuntimeError("failed")
+
+    d = Dispatcher(workers=2)
+    d.register("a.", handler)
+    events = [
+        RecordedEvent(time=100.0, topic="a.b", msg={"fail": False}),
+        RecordedEvent(time=100.5, topic="a.b", msg={"fail": True}),
+        RecordedEvent(time=101.0, topic="x.y", msg={"fail": False}),
+    ]
+    stages = {"step": ("tests.unit.test_replay.Worker", "step")}
+    start = time.monotonic()
+    report = EventReplayer(d, speedup=10, stages=stages).replay(events)
+
+    # 1 second recorded, replayed 10x faster
+    assert time.monotonic() - start >= 0.1
+    assert report.events == 2
+    assert report.failures == 1
+    assert len(report.latencies) == 2
+    assert len(report.stages["step"]) == 2
+    assert "throughput" in report.format()
+
+
+def test_check_recording():
+    d = Dispatcher()
+    d.register("a.", lambda t, m: None)
+    check_recording([RecordedEvent(time=0, topic="a.b", msg={})], d)
+    with pytest.raises(PackitException):
+        check_recording([RecordedEvent(time=0, topic="x.y", msg={})], d)
+
+
+def test_patch_restores_inherited_attributes():
+    class Child(Worker):
+        pass
+
+    with ExitStack() as stack:
+        _patch(stack, Child, "step", lambda self: "patched")
+        assert Child().step() == "patched"
+    assert "step" not in vars(Child)
+    assert Child.step is Worker.step
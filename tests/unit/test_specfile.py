@@ -0,0 +1,279 @@
+import datetime
+import os
+from pathlib import Path
+
+import pytest
+from flexmock import flexmock
+
+from packit import specfile
+from packit.exceptions import PackitException
+from packit.specfile import (
+    SpecMetadata,
+    SpecMetadataCache,
+    Specfile,
+    get_blob_id,
+    get_spec_metadata,
+    spec_metadata_cache,
+)
+
+SPEC = """\
+%global majorver 0.6
+%global srcname sen
+
+Name:           python-%{srcname}
+Version:        %{majorver}.1
+Release:        2%{?dist}
+Summary:        Terminal user interface for docker engine
+
+License:        MIT
+URL:            https://github.com/TomasTomecek/sen
+Source0:        %{url}/archive/%{version}/%{srcname}-%{version}.tar.gz
+Source1:        sen.conf
+# Patch0:       commented-out.patch
+Patch0:         fix-it.patch
+Patch1:         fix-it-more.patch
+
+%description
+Version: not a tag here
+
+%package -n python3-%{srcname}
+Summary:        %{summary}
+Requires(post): systemd
+
+%prep
+%autosetup -n %{srcname}-%{version}
+
+%files -n python3-%{srcname}
+%license LICENSE
+
+%changelog
+* Fri Mar 01 2019 John Doe <jdoe@example.com> - 0.6.1-2
+- Rebuild
+- for Fedora
+
+* Mon Feb 25 2019 John Doe <jdoe@example.com> - 0.6.1-1
+- Initial package
+"""
+
+
+@pytest.fixture()
+def spec(tmpdir):
+    path = tmpdir / "sen.spec"
+    path.write_text(SPEC, encoding="utf-8")
+    return Specfile(str(path))
+
+
+def test_sections(spec):
+    assert [s.name for s in spec.sections] == [
+        "%package",
+        "%description",
+        "%package -n python3-%{srcname}",
+        "%prep",
+        "%files -n python3-%{srcname}",
+        "%changelog",
+    ]
+    assert spec.get_section_content("%prep") == (
+        "%autosetup -n %{srcname}-%{version}\n\n"
+    )
+    assert spec.get_section("%check") is None
+
+
+def test_tags(spec):
+    assert spec.version == "%{majorver}.1"
+    assert spec.release == "2%{?dist}"
+    assert [t.name for t in spec.sources] == ["Source0", "Source1"]
+    assert [t.value for t in spec.patches] == ["fix-it.patch", "fix-it-more.patch"]
+    assert spec.get_tag("summary").value == "Terminal user interface for docker engine"
+    sub = "%package -n python3-%{srcname}"
+    assert spec.get_tag("Requires(post)", section=sub).value == "systemd"
+    # the offsets point to the value in the content
+    _, value, _, start, end = spec.get_tag("Version")
+    assert spec.content[start:end] == value
+    assert spec.macros == {"majorver": "0.6", "srcname": "sen"}
+
+
+def test_expand(spec):
+    assert spec.get_version() == "0.6.1"
+    assert spec.expand(spec.release) == "2"
+    assert spec.expand("%{?srcname:yes}%{!?srcname:no}") == "yes"
+    assert spec.expand("%{!?nothing:no}%{?nothing}") == "no"
+    assert spec.expand("%name 100%% %%{_libdir}") == "python-sen 100% %{_libdir}"
+    assert spec.expand("%{url}/%{summary}").startswith("https://github.com/")
+    assert spec.get_archive() == "sen-0.6.1.tar.gz"
+
+
+def test_expand_system_macros_by_rpm(spec):
+    spec.set_tag("Source0", "%{pypi_source}")
+
+    def rpm_eval(cmd, output):
+        # the macros of the spec are passed to rpm
+        defines = [cmd[i + 1] for i, arg in enumerate(cmd) if arg == "--define"]
+        assert "srcname sen" in defines
+        assert "version %{majorver}.1" in defines
+        assert cmd[-2:] == ["--eval", "%{pypi_source}"]
+        return "https://files.pythonhosted.org/packages/source/s/sen/sen-0.6.1.tar.gz\n"
+
+    flexmock(specfile).should_receive("run_command").replace_with(rpm_eval).once()
+    assert spec.get_archive() == "sen-0.6.1.tar.gz"
+
+
+@pytest.mark.parametrize(
+    "method,value",
+    [
+        # rpm doesn't know the macro either
+        ("and_return", "%{pypi_source}\n"),
+        # there is no rpm
+        ("and_raise", FileNotFoundError),
+    ],
+)
+def test_expand_unknown_macros(spec, method, value):
+    spec.set_tag("Source0", "%{pypi_source}")
+    getattr(flexmock(specfile).should_receive("run_command"), method)(value)
+    with pytest.raises(PackitException):
+        spec.get_archive()
+
+
+def test_expand_recursion(spec):
+    spec = Specfile(spec.path, content="%global a %{b}\n%global b %{a}\n")
+    with pytest.raises(PackitException):
+        spec.expand("%{a}")
+
+
+def test_archive_name_from_fragment(spec):
+    spec.set_tag("Source0", "%{url}/archive/%{version}.tar.gz#/sen.tar.gz")
+    assert spec.get_archive() == "sen.tar.gz"
+
+
+def test_changelog(spec):
+    assert spec.changelog == [
+        "* Fri Mar 01 2019 John Doe <jdoe@example.com> - 0.6.1-2\n- Rebuild\n- for Fedora",
+        "* Mon Feb 25 2019 John Doe <jdoe@example.com> - 0.6.1-1\n- Initial package",
+    ]
+
+
+def test_set_version_and_changelog(spec):
+    spec.version = "0.7.0"
+    spec.add_changelog_entry(
+        "New upstream release\n- and more",
+        author="Jane Doe <jane@example.com>",
+        date=datetime.date(2019, 4, 1),
+    )
+    assert spec.version == "0.7.0"
+    assert spec.changelog[0] == (
+        "* Mon Apr 01 2019 Jane Doe <jane@example.com> - 0.7.0-2\n"
+        "- New upstream release\n"
+        "- and more"
+    )
+    assert len(spec.changelog) == 3
+    # nothing else changed and nothing was written yet
+    assert spec.content.replace("0.7.0", "%{majorver}.1", 1).replace(
+        spec.changelog[0] + "\n\n", ""
+    ) == SPEC
+    assert open(spec.path).read() == SPEC
+
+    spec.save()
+    assert Specfile(spec.path).get_version() == "0.7.0"
+
+
+def test_changelog_section_is_added(spec):
+    spec = Specfile(spec.path, content="Name: beer\nVersion: 1\nRelease: 1\n")
+    spec.add_changelog_entry("First", author="Me", date=datetime.date(2019, 4, 1))
+    assert spec.content.endswith("\n%changelog\n* Mon Apr 01 2019 Me - 1-1\n- First\n")
+    assert spec.changelog == ["* Mon Apr 01 2019 Me - 1-1\n- First"]
+
+
+def test_set_missing_tag(spec):
+    with pytest.raises(PackitException):
+        spec.set_tag("Epoch", "1")
+
+
+def test_transaction(spec):
+    flexmock(Specfile).should_call("save").once()
+    with spec.transaction() as transaction:
+        transaction.set_version("0.7.0")
+        transaction.bump_release(reset=True)
+        transaction.add_changelog_entry(
+            "- New upstream release", author="Me", date=datetime.date(2019, 4, 1)
+        )
+        transaction.add_sources(["sen.service"])
+        transaction.add_patches([("0001-fix.patch", "Fix\nAuthor: Me")])
+        # nothing is changed until the transaction ends
+        assert spec.content == SPEC
+    assert spec.version == "0.7.0"
+    assert spec.release == "1%{?dist}"
+    assert spec.changelog[0] == "* Mon Apr 01 2019 Me - 0.7.0-1\n- New upstream release"
+    assert [t.value for t in spec.sources][1:] == ["sen.conf", "sen.service"]
+    assert [t.name for t in spec.patches] == ["Patch0", "Patch1", "Patch0002"]
+    assert (
+        "Patch1:         fix-it-more.patch\n"
+        "\n\n# PATCHES FROM SOURCE GIT:\n"
+        "\n# Fix\n# Author: Me\n"
+        "Patch0002: 0001-fix.patch\n"
+    ) in spec.content
+    assert open(spec.path).read() == spec.content
+
+
+def test_transaction_failed(spec):
+    with pytest.raises(PackitException):
+        with spec.transaction() as transaction:
+            transaction.set_version("0.7.0")
+            transaction.set_tag("Epoch", "1")
+    assert spec.content == SPEC
+    assert open(spec.path).read() == SPEC
+
+
+def test_transaction_reloads_changed_file(spec):
+    Path(spec.path).write_text(SPEC.replace("2%{?dist}", "5%{?dist}"))
+    with spec.transaction() as transaction:
+        transaction.bump_release()
+    assert spec.release == "6%{?dist}"
+    assert "Version:        %{majorver}.1" in Path(spec.path).read_text()
+
+
+def test_spec_metadata(spec, tmpdir):
+    spec_metadata_cache.clear()
+    cache_dir = str(tmpdir / "cache")
+    metadata = get_spec_metadata(spec.path, cache_dir=cache_dir)
+    assert metadata == SpecMetadata(
+        name="python-sen",
+        version="0.6.1",
+        release="2",
+        archive="sen-0.6.1.tar.gz",
+        sources=(
+            "https://github.com/TomasTomecek/sen/archive/0.6.1/sen-0.6.1.tar.gz",
+            "sen.conf",
+        ),
+        patches=("fix-it.patch", "fix-it-more.patch"),
+    )
+    # the same content is not parsed again, not even in a new process
+    spec_metadata_cache.clear()
+    flexmock(Specfile).should_receive("__init__").never()
+    other = tmpdir / "other.spec"
+    other.write_text(SPEC, encoding="utf-8")
+    assert get_spec_metadata(str(other), cache_dir=cache_dir) == metadata
+
+
+def test_spec_metadata_cache_eviction():
+    cache = SpecMetadataCache(max_size=2)
+    metadata = SpecMetadata("a", "1", "1", None, (), ())
+    for blob_id in ("a", "b", "c"):
+        cache.put(blob_id, metadata)
+        cache.get("a")
+    assert cache.get("a") == metadata
+    assert cache.get("b") is None
+    assert cache.get("c") == metadata
+
+
+def test_spec_metadata_cache_failed_write(tmpdir):
+    cache = SpecMetadataCache()
+    metadata = SpecMetadata("a", "1", "1", None, (), ())
+    flexmock(os).should_receive("replace").and_raise(OSError)
+    cache.put("a", metadata, cache_dir=str(tmpdir))
+    # still cached in memory, nothing is left on the disk
+    assert cache.get("a") == metadata
+    assert not any(path.isfile() for path in tmpdir.visit())
+
+
+def test_blob_id():
+    # git hash-object of "hello\n"
+    assert get_blob_id(b"hello\n") == "ce013625030ba8dba906f756967f9e9ca394464a"
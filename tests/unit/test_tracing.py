@@ -0,0 +1,138 @@
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from flexmock import flexmock
+
+from packit import tracing
+from packit.api import PackitAPI
+from packit.tracing import (
+    JsonFileExporter,
+    LogSummaryExporter,
+    OtlpJsonExporter,
+    current_span,
+    span,
+)
+from packit.utils import submit_in_context
+
+
+class Collector(tracing.Exporter):
+    def __init__(self):
+        self.traces = []
+
+    def export(self, trace):
+        self.traces.append(trace)
+
+
+@pytest.fixture()
+def collector():
+    collector = Collector()
+    tracing.add_exporter(collector)
+    yield collector
+    tracing.remove_exporter(collector)
+
+
+def test_nested_spans(collector):
+    @span("push")
+    def push():
+        pass
+
+    with span("sync_release", version="1.0") as root:
+        with span("clone"):
+            pass
+        with pytest.raises(RuntimeError):
+            with span("fetch"):
+                raise RuntimeError("no network")
+        push()
+        # not exported until the whole trace is finished
+        assert not collector.traces
+
+    assert collector.traces == [root]
+    assert current_span.get() is None
+    assert [(d, s.name) for d, s in root.walk()] == [
+        (0, "sync_release"),
+        (1, "clone"),
+        (1, "fetch"),
+        (1, "push"),
+    ]
+    assert root.attributes == {"version": "1.0"}
+    assert "no network" in root.children[1].error
+    assert {child.trace_id for child in root.children} == {root.trace_id}
+    assert root.duration >= sum(child.duration for child in root.children)
+
+
+def test_spans_in_threads(collector):
+    def work(name):
+        with span(name):
+            pass
+
+    with span("root") as root:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            for future in [submit_in_context(executor, work, n) for n in "ab"]:
+                future.result()
+        # a thread without the context starts its own trace
+        thread = threading.Thread(target=work, args=("c",))
+        thread.start()
+        thread.join()
+
+    assert sorted(child.name for child in root.children) == ["a", "b"]
+    assert [trace.name for trace in collector.traces] == ["c", "root"]
+
+
+def test_json_exporters(tmpdir):
+    json_path = tmpdir / "trace.json"
+    otlp_path = tmpdir / "trace.otlp.json"
+    exporters = [JsonFileExporter(json_path), OtlpJsonExporter(otlp_path)]
+    for exporter in exporters:
+        tracing.add_exporter(exporter)
+    try:
+        with span("build", scratch=True):
+            with span("koji_build"):
+                pass
+    finally:
+        for exporter in exporters:
+            tracing.remove_exporter(exporter)
+
+    trace = json.loads(json_path.read())
+    assert trace["name"] == "build"
+    assert trace["children"][0]["name"] == "koji_build"
+
+    request = json.loads(otlp_path.read())
+    spans = request["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [s["name"] for s in spans] == ["build", "koji_build"]
+    assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+    assert spans[0]["attributes"] == [{"key": "scratch", "value": {"boolValue": True}}]
+    assert int(spans[0]["endTimeUnixNano"]) >= int(spans[0]["startTimeUnixNano"])
+
+
+def test_log_summary(caplog):
+    exporter = LogSummaryExporter()
+    tracing.add_exporter(exporter)
+    try:
+        with caplog.at_level(logging.INFO):
+            with span("create_srpm"):
+                with span("rpmbuild"):
+                    pass
+    finally:
+        tracing.remove_exporter(exporter)
+    assert "Timing of create_srpm:" in caplog.text
+    assert "  rpmbuild: " in caplog.text
+
+
+def test_create_srpm_is_traced(collector):
+    api = PackitAPI(config=flexmock(), package_config=flexmock())
+    api._up = flexmock(
+        get_current_version=lambda: "1.0",
+        get_specfile_version=lambda: "1.0",
+        create_archive=lambda: None,
+        create_srpm=lambda srpm_path: "beer-1.0.src.rpm",
+    )
+    assert api.create_srpm() == "beer-1.0.src.rpm"
+    assert [s.name for _, s in collector.traces[0].walk()] == [
+        "create_srpm",
+        "get_version",
+        "create_archive",
+        "rpmbuild",
+    ]
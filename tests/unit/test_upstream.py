@@ -0,0 +1,93 @@
+import re
+
+import pytest
+from flexmock import flexmock
+
+from packit import upstream as upstream_module
+from packit.specfile import Specfile
+from packit.upstream import Upstream
+
+SPEC = """\
+Name:           beer
+Version:        0.1.0
+Release:        3%{?dist}
+Summary:        A tool to make you happy
+
+License:        MIT
+Source0:        %{name}-%{version}.tar.gz
+
+%description
+Beer.
+
+%changelog
+* Mon Feb 25 2019 John Doe <jdoe@example.com> - 0.1.0-3
+- Initial package
+"""
+
+
+@pytest.fixture()
+def upstream(tmpdir, monkeypatch):
+    monkeypatch.setenv("RPM_PACKAGER", "Packit <packit@example.com>")
+    path = tmpdir / "beer.spec"
+    path.write_text(SPEC, encoding="utf-8")
+    ups = Upstream(
+        config=flexmock(github_token="token"),
+        package_config=flexmock(
+            downstream_package_name="beer",
+            upstream_project_url=str(tmpdir),
+            synced_files=[],
+        ),
+    )
+    ups._specfile = Specfile(str(path))
+    return ups
+
+
+def read_spec(upstream):
+    return Specfile(upstream.specfile.path)
+
+
+@pytest.mark.parametrize(
+    "version,expected_version,expected_release",
+    [(None, "0.1.0", "4"), ("1.2.3", "1.2.3", "1"), ("1.2.3-7", "1.2.3", "7")],
+)
+def test_bump_spec(upstream, version, expected_version, expected_release):
+    upstream.bump_spec(version=version, changelog_entry="Development snapshot")
+
+    spec = read_spec(upstream)
+    assert spec.get_version() == expected_version
+    assert spec.expand(spec.release) == expected_release
+    assert re.match(
+        r"\* \w{3} \w{3} \d{2} \d{4} Packit <packit@example.com> - "
+        f"{re.escape(expected_version)}-{expected_release}\n"
+        r"- Development snapshot$",
+        spec.changelog[0],
+    )
+    assert spec.changelog[1].endswith("- Initial package")
+
+
+def test_bump_spec_without_changelog_entry(upstream):
+    upstream.bump_spec()
+
+    spec = read_spec(upstream)
+    assert spec.release == "4%{?dist}"
+    assert len(spec.changelog) == 1
+
+
+@pytest.mark.parametrize(
+    "command",
+    [
+        ["python3", "setup.py", "--version"],
+        # the native describe can't help, e.g. in a shallow clone
+        ["git", "describe", "--tags", "--match", "*"],
+    ],
+)
+def test_get_current_version_runs_in_project(upstream, tmpdir, command):
+    upstream.package_config.current_version_command = command
+    upstream.package_config.get_output_from_action = lambda action_name: None
+    upstream._local_project = flexmock(working_dir=str(tmpdir))
+    flexmock(upstream_module.git_describe).should_receive("describe").and_return(None)
+    flexmock(upstream_module).should_receive("run_command").with_args(
+        command, output=True, cwd=str(tmpdir)
+    ).and_return("1.2-3-gabcdef\n").once()
+
+    assert upstream.get_current_version() == "1.2.3.gabcdef"
@@ -0,0 +1,101 @@
+import pytest
+import requests
+from flexmock import flexmock
+
+from packit.upstream_versions import RegistryEntry, UpstreamVersions
+
+
+def response(status_code=200, version=None, headers=None):
+    return flexmock(
+        status_code=status_code,
+        ok=status_code < 400,
+        headers=headers or {},
+        json=lambda: {"version": version},
+    )
+
+
+@pytest.fixture()
+def versions(clock):
+    return UpstreamVersions(ttl=60, clock=clock)
+
+
+def test_version_is_cached(versions, clock):
+    flexmock(versions.session).should_receive("get").and_return(
+        response(version="1.2.3", headers={"ETag": '"abc"'})
+    ).once()
+    assert versions.get_latest_version("sen") == "1.2.3"
+    clock.now += 59
+    assert versions.get_latest_version("sen") == "1.2.3"
+
+
+def test_stale_version_is_revalidated(versions, clock):
+    session = flexmock(versions.session)
+    session.should_receive("get").and_return(
+        response(version="1.2.3", headers={"ETag": '"abc"'})
+    ).once()
+    assert versions.get_latest_version("sen") == "1.2.3"
+
+    clock.now += 61
+    session.should_receive("get").with_args(
+        str, headers={"If-None-Match": '"abc"'}, timeout=versions.timeout
+    ).and_return(response(status_code=304)).once()
+    assert versions.get_latest_version("sen") == "1.2.3"
+    # the 304 makes the version current again
+    assert versions._entries["sen"].checked == clock.now
+
+
+def test_stale_version_is_used_on_error(versions, clock):
+    versions._entries["sen"] = RegistryEntry("1.0", checked=clock.now - 100)
+    flexmock(versions.session).should_receive("get").and_raise(
+        requests.exceptions.ConnectionError
+    )
+    assert versions.get_latest_version("sen") == "1.0"
+
+
+def invalid_json():
+    raise ValueError("Expecting value: line 1 column 1 (char 0)")
+
+
+@pytest.mark.parametrize(
+    "registry_response",
+    [response(404), flexmock(status_code=200, ok=True, headers={}, json=invalid_json)],
+)
+def test_other_registries(versions, registry_response):
+    flexmock(versions.session).should_receive("get").and_return(registry_response)
+    flexmock(UpstreamVersions).should_receive("_run_versioneers").with_args(
+        "sen"
+    ).and_return("2.0").once()
+    assert versions.get_latest_version("sen") == "2.0"
+    assert versions.get_latest_version("sen") == "2.0"
+
+
+def test_version_checked_by_another_worker(clock, tmpdir):
+    cache_dir = str(tmpdir)
+    worker = UpstreamVersions(ttl=60, clock=clock)
+    flexmock(worker.session).should_receive("get").and_return(
+        response(version="1.2.3", headers={"ETag": '"abc"'})
+    ).once()
+    assert worker.get_latest_version("sen", cache_dir=cache_dir) == "1.2.3"
+
+    # current on the disk: no request at all
+    other_worker = UpstreamVersions(ttl=60, clock=clock)
+    flexmock(other_worker.session).should_receive("get").never()
+    assert other_worker.get_latest_version("sen", cache_dir=cache_dir) == "1.2.3"
+
+    # stale on the disk: the validator from the disk is used
+    clock.now += 61
+    flexmock(other_worker.session).should_receive("get").with_args(
+        str, headers={"If-None-Match": '"abc"'}, timeout=other_worker.timeout
+    ).and_return(response(status_code=304)).once()
+    assert other_worker.get_latest_version("sen", cache_dir=cache_dir) == "1.2.3"
+
+
+def test_refresh(versions):
+    flexmock(versions.session).should_receive("get").replace_with(
+        lambda url, **kwargs: response(version=url.rsplit("/", 1)[-1] + "-1.0")
+    )
+    assert versions.refresh(["sen", "packit", "ogr"]) == {
+        "sen": "sen-1.0",
+        "packit": "packit-1.0",
+        "ogr": "ogr-1.0",
+    }
@@ -1,7 +1,29 @@
+import asyncio
+import os
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import git
 import pytest
+from flexmock import flexmock
+from git import GitCommandError
 from packit.exceptions import PackitException
 
-from packit.utils import get_namespace_and_repo_name
+from packit.utils import (
+    add_command_listener,
+    atomic_write,
+    atomic_write_json,
+    read_json_cache,
+    get_repo,
+    get_namespace_and_repo_name,
+    remove_command_listener,
+    run_command,
+    run_command_async,
+    run_concurrently,
+    run_in_parallel,
+)
 
 
 @pytest.mark.parametrize(
@@ -23,3 +45,189 @@ def test_get_ns_repo_exc():
         get_namespace_and_repo_name(url)
     msg = f"Invalid URL format, can't obtain namespace and repository name: {url}"
     assert msg in str(ex.value)
+
+
+def test_run_command_output():
+    assert run_command(["echo", "hello"], output=True) == "hello\n"
+
+
+def test_run_command_line_callbacks():
+    stdout, stderr = [], []
+    assert run_command(
+        ["sh", "-c", "echo a; echo b >&2; echo c"],
+        stdout_callback=stdout.append,
+        stderr_callback=stderr.append,
+    )
+    assert stdout == ["a\n", "c\n"]
+    assert stderr == ["b\n"]
+
+
+def test_run_command_fail():
+    assert not run_command(["false"], fail=False)
+    with pytest.raises(PackitException) as ex:
+        run_command(["false"], error_message="nope")
+    assert "nope" in str(ex.value)
+
+
+def test_run_command_timeout():
+    start = time.monotonic()
+    with pytest.raises(PackitException) as ex:
+        # the child of the shell has to be killed as well, it holds stdout open
+        run_command(["sh", "-c", "sleep 5; true"], timeout=0.2)
+    assert "timed out" in str(ex.value)
+    assert time.monotonic() - start < 4
+
+
+def test_run_command_listener():
+    results = []
+    add_command_listener(results.append)
+    try:
+        run_command(["true"])
+    finally:
+        remove_command_listener(results.append)
+    run_command(["true"])
+
+    assert len(results) == 1
+    result = results[0]
+    assert result.cmd == ["true"]
+    assert result.returncode == 0
+    assert not result.timed_out
+    assert result.wall_time > 0
+    assert result.max_rss > 0
+
+
+def test_run_command_async():
+    stderr = []
+    start = time.monotonic()
+    out, success = run_concurrently(
+        run_command_async(["sh", "-c", "sleep 0.5; echo a"], output=True),
+        run_command_async(
+            ["sh", "-c", "sleep 0.5; echo b >&2"], stderr_callback=stderr.append
+        ),
+    )
+    assert time.monotonic() - start < 1
+    assert out == "a\n"
+    assert success
+    assert stderr == ["b\n"]
+
+
+def test_run_command_async_fail_and_timeout():
+    with pytest.raises(PackitException) as ex:
+        run_concurrently(
+            run_command_async(["true"]),
+            run_command_async(["sh", "-c", "sleep 5; true"], timeout=0.2),
+        )
+    assert "timed out" in str(ex.value)
+    assert run_concurrently(run_command_async(["false"], fail=False)) == [False]
+
+
+def test_run_concurrently_repeatedly():
+    # a new loop every time, the child watcher has to follow it on py36/py37
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        for _ in range(3):
+            assert run_concurrently(
+                run_command_async(["sh", "-c", "echo a"], output=True)
+            ) == ["a\n"]
+        assert not loop.is_closed()
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def test_run_in_parallel():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def first():
+        barrier.wait()
+        return 1
+
+    def second():
+        # deadlocks (and times out) if the functions don't run in parallel
+        barrier.wait()
+        raise PackitException("second failed")
+
+    with pytest.raises(PackitException):
+        run_in_parallel(first, second)
+    assert run_in_parallel(lambda: 1, lambda: 2) == [1, 2]
+
+
+def test_get_repo_sparse(tmpdir):
+    origin = Path(str(tmpdir)) / "origin"
+    (origin / "tests").mkdir(parents=True)
+    (origin / "pkg.spec").write_text("spec")
+    (origin / "tests" / "fixture").write_text("large")
+    subprocess.check_call(["git", "init", "-q"], cwd=origin)
+    subprocess.check_call(["git", "config", "uploadpack.allowFilter", "true"], cwd=origin)
+    subprocess.check_call(["git", "add", "-A"], cwd=origin)
+    subprocess.check_call(
+        ["git", "-c", "user.name=a", "-c", "user.email=a@b", "commit", "-qm", "init"],
+        cwd=origin,
+    )
+
+    clone = Path(str(tmpdir)) / "clone"
+    repo = get_repo(f"file://{origin}", directory=str(clone), sparse_paths=["/*.spec"])
+
+    assert (clone / "pkg.spec").read_text() == "spec"
+    assert not (clone / "tests").exists()
+    assert not repo.is_dirty()
+    # the blob of the fixture was not even downloaded
+    fixture_blob = repo.git.rev_parse("HEAD:tests/fixture")
+    with pytest.raises(GitCommandError):
+        repo.git.cat_file("-e", fixture_blob, env={"GIT_NO_LAZY_FETCH": "1"})
+
+
+def test_get_repo_sparse_fallback(tmpdir):
+    origin = Path(str(tmpdir)) / "origin"
+    origin.mkdir()
+    (origin / "pkg.spec").write_text("spec")
+    subprocess.check_call(["git", "init", "-q"], cwd=origin)
+    subprocess.check_call(["git", "add", "-A"], cwd=origin)
+    subprocess.check_call(
+        ["git", "-c", "user.name=a", "-c", "user.email=a@b", "commit", "-qm", "init"],
+        cwd=origin,
+    )
+    clone = Path(str(tmpdir)) / "clone"
+    clone_from = git.Repo.clone_from
+
+    def clone_without_filter(**kwargs):
+        # e.g. git too old to know --filter
+        if "filter" in kwargs:
+            raise GitCommandError("clone", 129)
+        return clone_from(**kwargs)
+
+    flexmock(git.Repo).should_receive("clone_from").replace_with(clone_without_filter)
+
+    get_repo(str(origin), directory=str(clone), sparse_paths=["/x"])
+    assert (clone / "pkg.spec").is_file()
+
+
+def test_atomic_write_keeps_mode(tmpdir):
+    path = Path(str(tmpdir)) / "beer.spec"
+    path.write_text("old")
+    path.chmod(0o640)
+    atomic_write(str(path), "new", keep_mode=True)
+    assert path.read_text() == "new"
+    assert path.stat().st_mode & 0o777 == 0o640
+    assert list(path.parent.iterdir()) == [path]
+
+
+def test_json_cache(tmpdir):
+    path = Path(str(tmpdir)) / "cache" / "entry.json"
+    assert read_json_cache(path) is None
+    assert atomic_write_json(path, {"version": "1.0"})
+    assert read_json_cache(path) == {"version": "1.0"}
+    assert path.stat().st_mode & 0o077 == 0
+
+    path.write_text("{corrupted")
+    assert read_json_cache(path) is None
+
+
+def test_json_cache_failed_write(tmpdir):
+    path = Path(str(tmpdir)) / "entry.json"
+    flexmock(os).should_receive("replace").and_raise(OSError)
+    assert not atomic_write_json(path, {"version": "1.0"})
+    # no temporary files are left behind
+    assert list(path.parent.iterdir()) == []
+    assert not atomic_write_json(path, {"not serializable": object()})
@@ -0,0 +1,127 @@
+import time
+
+import pytest
+from flexmock import flexmock
+
+from packit.bot_api import PackitBotAPI
+from packit.service import web_hook
+from packit.service.ingestion import WebhookIngestion
+from packit.service.jobs import FINISHED
+
+HEADERS = {"X-GitHub-Event": "release"}
+RELEASE_EVENT = {
+    "action": "published",
+    "repository": {"name": "packit", "owner": {"login": "packit-service"}},
+    "release": {"tag_name": "0.3.0"},
+}
+
+
+def wait_for_job(job_id, timeout=5):
+    deadline = time.time() + timeout
+    while web_hook.jobs.get(job_id).finished is None and time.time() < deadline:
+        time.sleep(0.01)
+
+
+@pytest.fixture()
+def client():
+    web_hook.app.config["TESTING"] = True
+    return web_hook.app.test_client()
+
+
+def test_github_release_accepted(client):
+    flexmock(PackitBotAPI).should_receive(
+        "sync_upstream_release_with_fedmsg"
+    ).with_args({"msg": RELEASE_EVENT}).once()
+
+    response = client.post("/github_release", json=RELEASE_EVENT, headers=HEADERS)
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+    assert response.get_json()["url"] == f"/jobs/{job_id}"
+
+    wait_for_job(job_id)
+    response = client.get(f"/jobs/{job_id}")
+    assert response.status_code == 200
+    assert response.get_json()["state"] == FINISHED
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"action": "published"},
+        {"action": "published", "repository": {"name": "packit"}},
+        {"action": "published", "release": {"tag_name": "1"}},
+    ],
+)
+def test_github_release_invalid(client, payload):
+    response = client.post("/github_release", json=payload, headers=HEADERS)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("event", [None, "push", "ping"])
+def test_github_release_wrong_event(client, event):
+    flexmock(web_hook.jobs).should_receive("submit").never()
+    headers = {"X-GitHub-Event": event} if event else {}
+    response = client.post("/github_release", json=RELEASE_EVENT, headers=headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("action", ["created", "edited", "deleted", "prereleased"])
+def test_github_release_action_ignored(client, action):
+    flexmock(web_hook.jobs).should_receive("submit").never()
+    payload = dict(RELEASE_EVENT, action=action)
+    response = client.post("/github_release", json=payload, headers=HEADERS)
+    assert response.status_code == 202
+    assert "job_id" not in response.get_json()
+
+
+def test_unknown_job(client):
+    assert client.get("/jobs/123").status_code == 404
+
+
+def test_request_logs_are_part_of_job_logs(client):
+    flexmock(PackitBotAPI).should_receive("sync_upstream_release_with_fedmsg")
+
+    response = client.post("/github_release", json=RELEASE_EVENT, headers=HEADERS)
+    job_id = response.get_json()["job_id"]
+    wait_for_job(job_id)
+    assert f"Job {job_id} accepted" in web_hook.jobs.get(job_id).logs
+
+
+def test_github_release_signature(client, monkeypatch):
+    monkeypatch.setattr(web_hook, "ingestion", WebhookIngestion(secret="secret"))
+    flexmock(web_hook.jobs).should_receive("submit").never()
+    response = client.post(
+        "/github_release",
+        json=RELEASE_EVENT,
+        headers=dict(HEADERS, **{"X-Hub-Signature-256": "sha256=0123"}),
+    )
+    assert response.status_code == 401
+
+
+def test_github_release_duplicate_and_rate_limit(client, monkeypatch):
+    monkeypatch.setattr(web_hook, "ingestion", WebhookIngestion(burst=1, rate=0))
+    flexmock(PackitBotAPI).should_receive("sync_upstream_release_with_fedmsg").once()
+
+    def post(delivery):
+        return client.post(
+            "/github_release",
+            json=RELEASE_EVENT,
+            headers=dict(HEADERS, **{"X-GitHub-Delivery": delivery}),
+        )
+
+    response = post("1")
+    assert response.status_code == 202
+    assert post("1").status_code == 200
+    assert post("2").status_code == 429
+    wait_for_job(response.get_json()["job_id"])
+
+
+def test_metrics(client):
+    flexmock(PackitBotAPI).should_receive("sync_upstream_release_with_fedmsg")
+    response = client.post("/github_release", json=RELEASE_EVENT, headers=HEADERS)
+    wait_for_job(response.get_json()["job_id"])
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert 'packit_jobs_total{state="finished"}' in response.get_data(as_text=True)